@@ -0,0 +1,209 @@
+# backtest.py
+#
+# Historical backtests of the Low/Medium/High baskets. Each basket from dynamic_allocation
+# is replayed over monthly proxy series for its asset classes, from every possible start
+# month at once, with periodic rebalancing. The results are precomputed into a lookup
+# table (BACKTEST_TABLE_FILE) that /calculate-baskets reads at request time.
+#
+# Series live in BACKTEST_DATA_DIR as CSV files with "date,value" rows (any frequency;
+# month-end values are used). Price series are index levels; rate series are annual
+# percentages (FD rates, G-sec / small savings rates) accrued monthly. fixtures/backtest
+# holds small synthetic series in the same layout for tests and benchmark.py.
+#
+#     python backtest.py        # rebuild the lookup table from the series files
+
+import os
+
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+
+BACKTEST_DATA_DIR = os.environ.get(
+    "BACKTEST_DATA_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "backtest_data"))
+BACKTEST_TABLE_FILE = os.environ.get(
+    "BACKTEST_TABLE_FILE", os.path.join(os.path.dirname(os.path.abspath(__file__)), "backtest_table.npz"))
+
+# Basket asset -> (series file, kind)
+ASSET_SERIES = {
+    "stocks": ("nifty50.csv", "price"),
+    "mutualFunds": ("nifty500.csv", "price"),
+    "ETFs": ("gold.csv", "price"),
+    "FDs": ("fd_rate.csv", "rate"),
+    "govtSchemes": ("gsec_10y.csv", "rate"),
+}
+ASSETS = list(ASSET_SERIES)
+
+RISK_CATEGORIES = ("Low", "Medium", "High")
+INVESTMENT_TYPES = ("Lump-Sum", "SIP")
+CAGR_GRID = np.round(np.arange(0, 0.305, 0.01), 2)  # Required CAGR values the table is built for
+MAX_HORIZON_YEARS = 30
+REBALANCE_MONTHS = 12
+
+def load_series(path, kind):
+    """Monthly returns from a "date,value" CSV."""
+    frame = pd.read_csv(path, parse_dates=["date"]).dropna()
+    monthly = frame.set_index("date")["value"].sort_index().resample("ME").last().dropna()
+    if kind == "rate":
+        return (1 + monthly / 100) ** (1 / 12) - 1
+    return monthly.pct_change().dropna()
+
+def load_returns(data_dir=BACKTEST_DATA_DIR):
+    """Monthly return matrix (months x ASSETS) over the period every series covers."""
+    columns = {}
+    for asset, (filename, kind) in ASSET_SERIES.items():
+        columns[asset] = load_series(os.path.join(data_dir, filename), kind)
+    returns = pd.DataFrame(columns).dropna()
+    if returns.empty:
+        raise ValueError("Backtest series have no overlapping months")
+    return returns
+
+def replay(returns, weights, months):
+    """
+    Replay every basket (rows of weights) from every start month over `months` months.
+    Returns per (basket, start): lump-sum multiple, SIP multiple (value of 1 invested at
+    the start of each month) and the maximum drawdown of the basket's unit value.
+    """
+    # (starts, months, assets) view of all rolling windows without copying
+    windows = sliding_window_view(returns, months, axis=0).transpose(0, 2, 1)
+    growth = 1 + windows
+    w = weights[:, None, :]
+    starts = windows.shape[0]
+
+    lump = np.broadcast_to(w, (len(weights), starts, len(ASSETS))).copy()
+    sip = np.zeros_like(lump)
+    peak = np.ones((len(weights), starts))
+    drawdown = np.zeros((len(weights), starts))
+    for t in range(months):
+        sip += w
+        lump *= growth[None, :, t, :]
+        sip *= growth[None, :, t, :]
+        value = lump.sum(axis=2)
+        np.maximum(peak, value, out=peak)
+        np.minimum(drawdown, value / peak - 1, out=drawdown)
+        if (t + 1) % REBALANCE_MONTHS == 0:
+            lump = value[:, :, None] * w
+            sip = sip.sum(axis=2)[:, :, None] * w
+    return lump.sum(axis=2), sip.sum(axis=2), drawdown
+
+def build_table(returns, allocate):
+    """
+    Backtest every (risk category, investment type, required CAGR) basket for every
+    horizon with enough history. allocate is dynamic_allocation from server.py.
+    """
+    keys = [(r, t, c) for r in RISK_CATEGORIES for t in INVESTMENT_TYPES for c in CAGR_GRID]
+    all_weights = np.array([[allocate(r, c, t).get(a, 0) for a in ASSETS] for r, t, c in keys]) / 100
+    # Many required CAGRs map to the same mix, so each distinct basket is replayed once
+    weights, basket_index = np.unique(all_weights.round(6), axis=0, return_inverse=True)
+    matrix = returns[ASSETS].to_numpy()
+
+    horizons = [h for h in range(1, MAX_HORIZON_YEARS + 1) if 12 * h <= len(matrix)]
+    lump_parts, sip_parts = [], []
+    offsets = np.zeros((len(weights), MAX_HORIZON_YEARS + 1, 2), dtype=np.int64)  # (start, end) in flat arrays
+    stats = np.full((len(weights), MAX_HORIZON_YEARS + 1, 5), np.nan)  # CAGR p10/p50/p90, drawdown p50/worst
+    position = 0
+    for h in horizons:
+        lump, sip, drawdown = replay(matrix, weights, 12 * h)
+        cagr = lump ** (1 / h) - 1
+        stats[:, h, :3] = np.percentile(cagr, [10, 50, 90], axis=1).T
+        stats[:, h, 3] = np.median(drawdown, axis=1)
+        stats[:, h, 4] = drawdown.min(axis=1)
+        starts = lump.shape[1]
+        offsets[:, h, 0] = position + np.arange(len(weights)) * starts
+        offsets[:, h, 1] = offsets[:, h, 0] + starts
+        lump_parts.append(lump.ravel())
+        sip_parts.append(sip.ravel())
+        position += lump.size
+
+    return {
+        "basket_index": basket_index.reshape(len(RISK_CATEGORIES), len(INVESTMENT_TYPES), len(CAGR_GRID)),
+        "weights": weights,
+        "offsets": offsets,
+        "stats": stats,
+        "lump": np.concatenate(lump_parts).astype(np.float32) if lump_parts else np.zeros(0, np.float32),
+        "sip": np.concatenate(sip_parts).astype(np.float32) if sip_parts else np.zeros(0, np.float32),
+        "first_month": np.array(str(returns.index[0].date())),
+        "last_month": np.array(str(returns.index[-1].date())),
+    }
+
+class BacktestTable:
+    """Lookup over a precomputed table; every query is a few array slices."""
+
+    def __init__(self, arrays):
+        self.arrays = arrays
+
+    @classmethod
+    def load(cls, path=BACKTEST_TABLE_FILE):
+        if not os.path.exists(path):
+            return None
+        with np.load(path) as data:
+            return cls({key: data[key] for key in data.files})
+
+    def save(self, path=BACKTEST_TABLE_FILE):
+        np.savez_compressed(path, **self.arrays)
+
+    def lookup(self, risk_category, investment_type, required_cagr, years,
+               current_wealth=0.0, monthly_investment=0.0, target_wealth=None):
+        """Realized CAGR, drawdown and goal hit-rate of a basket, or None without enough history."""
+        if risk_category not in RISK_CATEGORIES or not 1 <= years <= MAX_HORIZON_YEARS:
+            return None
+        c = int(np.abs(CAGR_GRID - np.clip(required_cagr, CAGR_GRID[0], CAGR_GRID[-1])).argmin())
+        t = INVESTMENT_TYPES.index(investment_type) if investment_type in INVESTMENT_TYPES else 0
+        basket = self.arrays["basket_index"][RISK_CATEGORIES.index(risk_category), t, c]
+        start, end = self.arrays["offsets"][basket, years]
+        if end <= start:
+            return None
+
+        p10, p50, p90, dd_median, dd_worst = self.arrays["stats"][basket, years]
+        result = {
+            "windows": int(end - start),
+            "period": f'{self.arrays["first_month"]} to {self.arrays["last_month"]}',
+            "cagr": {"p10": round(float(p10) * 100, 2), "median": round(float(p50) * 100, 2),
+                     "p90": round(float(p90) * 100, 2)},
+            "maxDrawdown": {"median": round(float(dd_median) * 100, 2), "worst": round(float(dd_worst) * 100, 2)},
+        }
+        if target_wealth:
+            # Final wealth is linear in the contributions, so any amounts reuse the same paths
+            final = (current_wealth * self.arrays["lump"][start:end]
+                     + monthly_investment * self.arrays["sip"][start:end])
+            result["goalHitRate"] = round(float((final >= target_wealth).mean()) * 100, 2)
+            result["medianFinalWealth"] = round(float(np.median(final)), 2)
+        return result
+
+    def median_cagr(self, risk_category, investment_type, required_cagr, years):
+        """
+        Vectorized lookup of the median realized CAGR (as lookup() rounds it) over arrays of
+        required CAGRs and horizons; NaN where there is not enough history.
+        """
+        required_cagr, years = np.broadcast_arrays(np.asarray(required_cagr, dtype=float), np.asarray(years))
+        years = years.astype(int)
+        c = np.abs(CAGR_GRID - np.clip(required_cagr, CAGR_GRID[0], CAGR_GRID[-1])[..., None]).argmin(axis=-1)
+        t = INVESTMENT_TYPES.index(investment_type) if investment_type in INVESTMENT_TYPES else 0
+        basket = self.arrays["basket_index"][RISK_CATEGORIES.index(risk_category), t, c]
+        valid = (years >= 1) & (years <= MAX_HORIZON_YEARS)
+        h = np.where(valid, years, 0)
+        start, end = self.arrays["offsets"][basket, h, 0], self.arrays["offsets"][basket, h, 1]
+        median = np.round(self.arrays["stats"][basket, h, 1] * 100, 2) / 100
+        return np.where(valid & (end > start), median, np.nan)
+
+_table = {"table": None, "loaded": False}
+
+def get_table():
+    """The lookup table, loaded once; None when it has not been built."""
+    if not _table["loaded"]:
+        _table["table"] = BacktestTable.load()
+        _table["loaded"] = True
+        if _table["table"] is None:
+            print(f"No backtest table at {BACKTEST_TABLE_FILE} (run backtest.py); baskets use assumed returns")
+    return _table["table"]
+
+def main():
+    os.environ.setdefault("REFRESH_SCHEDULER", "0")
+    from server import dynamic_allocation
+
+    returns = load_returns()
+    table = BacktestTable(build_table(returns, dynamic_allocation))
+    table.save()
+    print(f"Backtested {len(table.arrays['weights'])} baskets over {len(returns)} months -> {BACKTEST_TABLE_FILE}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,335 @@
+# benchmark.py
+#
+# Offline benchmark suite for the backend. Every upstream call is served from the
+# payloads in fixtures/ (AMFI NAVAll.txt, NSE quote-equity and snapshot JSON, backtest
+# proxy series) and from seeded OHLCV histories, so runs are repeatable and need no
+# network access.
+#
+#     python benchmark.py                       # all cases at the default scales
+#     python benchmark.py -k portfolio          # cases whose name contains "portfolio"
+#     python benchmark.py --quick               # smallest scale of each case only
+#     python benchmark.py --include-slow        # also run the /predict training and exported-model cases
+#     python benchmark.py --json results.json   # save results to compare between commits
+#
+# Each case reports median and p95 latency, throughput (items per second) and peak
+# Python memory allocated during one run (tracemalloc).
+
+import argparse
+import json
+import os
+import statistics
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+HOLDING_SCALES = (10, 1_000, 100_000)
+BAR_SCALES = (5, 25)  # years of daily bars
+FUND_SCALES = (1_000, 10_000, 40_000)  # AMFI schemes
+TRADING_DAYS = 252
+
+# --------------------------
+# Fixtures
+# --------------------------
+def load_fixture(name):
+    with open(os.path.join(FIXTURES_DIR, name)) as f:
+        return f.read()
+
+def nse_quote(symbol):
+    return json.loads(load_fixture(f"nse_quote_{symbol}.json"))
+
+def scaled_amfi_text(schemes):
+    """Repeat the recorded AMFI sample with fresh scheme codes until it holds `schemes` rows."""
+    lines = load_fixture("amfi_navall_sample.txt").splitlines()
+    header, body = lines[0], lines[1:]
+    rows = [line for line in body if line[:1].isdigit()]
+    out = [header]
+    code = 200000
+    while len(out) - 1 < schemes:
+        for line in rows:
+            fields = line.split(";")
+            fields[0] = str(code)
+            fields[3] = f"{fields[3]} {code}"
+            out.append(";".join(fields))
+            code += 1
+            if len(out) - 1 >= schemes:
+                break
+    return "\n".join(out) + "\n"
+
+def generate_ohlcv(years, seed=0):
+    """Seeded daily OHLCV history shaped like yfinance.download output."""
+    rng = np.random.default_rng(seed)
+    days = years * TRADING_DAYS
+    index = pd.bdate_range(end="2025-10-17", periods=days)
+    close = 100 * np.exp(np.cumsum(rng.normal(0.0004, 0.015, days)))
+    spread = np.abs(rng.normal(0, 0.01, days)) * close
+    return pd.DataFrame({
+        "Open": close + rng.normal(0, 0.3, days),
+        "High": close + spread,
+        "Low": close - spread,
+        "Close": close,
+        "Volume": rng.integers(100_000, 5_000_000, days).astype(float),
+    }, index=index)
+
+def generate_close_panel(symbols, years=2, seed=0):
+    rng = np.random.default_rng(seed)
+    days = years * TRADING_DAYS
+    index = pd.bdate_range(end="2025-10-17", periods=days)
+    returns = rng.normal(0.0004, 0.015, (days, len(symbols)))
+    return pd.DataFrame(100 * np.exp(np.cumsum(returns, axis=0)), index=index, columns=symbols)
+
+def generate_portfolio(holdings, seed=0):
+    """A portfolio in the data.py shape with `holdings` rows spread over every category."""
+    rng = np.random.default_rng(seed)
+    shares = {"Stocks": 0.5, "Mutual Funds": 0.2, "ETF": 0.05,
+              "Fixed Deposits": 0.1, "Recurring Deposits": 0.1, "Government Schemes": 0.05}
+    counts = {category: max(int(holdings * share), 1) for category, share in shares.items()}
+    counts["Stocks"] += holdings - sum(counts.values())
+    distinct_stocks = min(counts["Stocks"], 500)  # Large books repeat instruments across accounts
+
+    assets = {
+        "Stocks": {"holdings": [{"name": f"STOCK{i % distinct_stocks}", "quantity": int(q)}
+                                for i, q in enumerate(rng.integers(1, 500, counts["Stocks"]))]},
+        "Mutual Funds": {"holdings": [{"name": f"Parag Parikh Flexi Cap Fund {200000 + i % 1000}", "units": float(u)}
+                                      for i, u in enumerate(rng.uniform(1, 500, counts["Mutual Funds"]))]},
+        "ETF": {"holdings": [{"type": "Gold" if i % 2 else "Silver", "quantity": int(q)}
+                             for i, q in enumerate(rng.integers(1, 1000, counts["ETF"]))]},
+        "Fixed Deposits": {"holdings": [{"bank": f"Bank {i}", "investment": 100000, "duration": int(d), "interest_rate": 7.0}
+                                        for i, d in enumerate(rng.integers(3, 60, counts["Fixed Deposits"]))]},
+        "Recurring Deposits": {"holdings": [{"bank": f"Bank {i}", "monthly_deposit": 5000, "duration": int(d), "interest_rate": 6.5}
+                                            for i, d in enumerate(rng.integers(6, 60, counts["Recurring Deposits"]))]},
+        "Government Schemes": {"holdings": [{"scheme": "PPF", "investment": 80000, "duration": 15, "interest_rate": 7.1}
+                                            for _ in range(counts["Government Schemes"])]},
+    }
+    return {"assets": assets}
+
+def generate_disclosures(schemes=3_000, securities=20_000, lines=80, seed=0):
+    """Scheme portfolio disclosures in the lookthrough.py shape, named like generate_portfolio's funds."""
+    rng = np.random.default_rng(seed)
+    scheme = np.repeat(np.arange(schemes), lines)
+    security = rng.integers(0, securities, len(scheme))
+    return pd.DataFrame({
+        "scheme_code": (200000 + scheme).astype(str),
+        "scheme_name": [f"Parag Parikh Flexi Cap Fund {200000 + i}" for i in scheme],
+        "symbol": [f"STOCK{i}" for i in security],
+        "security": [f"Stock {i}" for i in security],
+        "sector": [f"Sector {i % 25}" for i in security],
+        "weight": rng.uniform(0.1, 2.5, len(scheme)),
+    })
+
+class OfflineYFinance:
+    """Stands in for the yfinance module inside server.py during the /predict benchmark."""
+
+    def __init__(self, history):
+        self.history = history
+
+    def download(self, *args, **kwargs):
+        return self.history.copy()
+
+    def Ticker(self, symbol):
+        return type("Ticker", (), {"info": {"marketCap": 1e12, "trailingPE": 25.0, "forwardPE": 22.0,
+                                            "priceToBook": 4.0, "dividendYield": 0.01, "beta": 1.0}})()
+
+# --------------------------
+# Harness
+# --------------------------
+class Case:
+    def __init__(self, name, setup, run, items=1, repeat=5, slow=False):
+        self.name = name
+        self.setup = setup  # () -> state
+        self.run = run  # (state) -> None
+        self.items = items
+        self.repeat = repeat
+        self.slow = slow
+
+def measure(case):
+    state = case.setup()
+    case.run(state)  # Warm-up run (imports, lazily built caches)
+
+    timings = []
+    for _ in range(case.repeat):
+        start = time.perf_counter()
+        case.run(state)
+        timings.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    case.run(state)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    median = statistics.median(timings)
+    timings.sort()
+    return {
+        "case": case.name,
+        "median_ms": round(median * 1000, 3),
+        "p95_ms": round(timings[min(int(len(timings) * 0.95), len(timings) - 1)] * 1000, 3),
+        "throughput_per_s": round(case.items / median, 1) if median > 0 else None,
+        "peak_mb": round(peak / 2**20, 2),
+    }
+
+# --------------------------
+# Cases
+# --------------------------
+def build_cases(quick=False):
+    import server
+    import risk
+    import backtest
+    import fund_screener
+    import inference
+    from data import user_portfolios
+    from holdings import holdings_frame, market_symbol
+    from lookthrough import LookThrough
+    from nse_snapshots import SnapshotBook, fixture_fetch
+
+    holding_scales = HOLDING_SCALES[:1] if quick else HOLDING_SCALES
+    bar_scales = BAR_SCALES[:1] if quick else BAR_SCALES
+    fund_scales = FUND_SCALES[:1] if quick else FUND_SCALES
+
+    # Serve every quote from the fixtures
+    quotes = {symbol: nse_quote(symbol) for symbol in ("GOLDBEES", "SILVERBEES")}
+    server.get_quote_nse = lambda symbol, force=False: quotes.get(symbol)
+    server.get_live_price = lambda name, force=False: 100.0 + (hash(name) % 5000) / 10
+    fund_screener.set_fund_universe(fund_screener.build_universe(
+        scaled_amfi_text(1_000), pd.read_csv(os.path.join(FIXTURES_DIR, "fund_metrics_sample.csv"))))
+    server.scheduler.track = lambda *args, **kwargs: None
+    server.snapshot_book = SnapshotBook(fixture_fetch(FIXTURES_DIR), indices=["NIFTY 50"])
+
+    cases = []
+
+    for n in holding_scales:
+        pan = f"BENCH{n}"
+
+        def setup_portfolio(pan=pan, n=n):
+            user_portfolios[pan] = generate_portfolio(n)
+            return pan
+
+        cases.append(Case(f"calculate_portfolio[{n} holdings]", setup_portfolio,
+                          lambda pan: server.calculate_portfolio(pan, force=True),
+                          items=n, repeat=3 if n >= 100_000 else 5))
+
+        def setup_revalue(pan=pan, n=n):
+            user_portfolios[pan] = generate_portfolio(n)
+            portfolio = server.calculate_portfolio(pan, force=True)
+            prices = server.fetch_portfolio_prices(portfolio)
+            return pan, portfolio, prices, list(prices["Stocks"])[:5]
+
+        def revalue(state):
+            pan, portfolio, prices, moved = state
+            for name in moved:
+                prices["Stocks"][name] *= 1.001
+            server.value_portfolio(pan, portfolio, prices, time.time())
+
+        cases.append(Case(f"revalue_portfolio[{n} holdings, 5 prices moved]", setup_revalue, revalue,
+                          items=n, repeat=5))
+
+        def setup_risk(pan=pan, n=n):
+            user_portfolios[pan] = generate_portfolio(n)
+            portfolio = server.calculate_portfolio(pan, force=True)
+            symbols = sorted({market_symbol(c, item) for c, d in portfolio["assets"].items()
+                              for item in d["holdings"]} - {None}) + [risk.NIFTY_SYMBOL]
+            panel = generate_close_panel(list(dict.fromkeys(symbols)))
+            risk.fetch_close_panel = lambda syms, period="1y": panel[[s for s in syms if s in panel.columns]]
+            risk.history_cache.__init__()
+            risk.history_cache.ensure(list(panel.columns))
+            return portfolio
+
+        cases.append(Case(f"calculate_risk_analysis[{n} holdings]", setup_risk,
+                          server.calculate_risk_analysis, items=n, repeat=3 if n >= 100_000 else 5))
+
+    # Baskets are backtested over the proxy series in fixtures/backtest
+    backtest_returns = backtest.load_returns(os.path.join(FIXTURES_DIR, "backtest"))
+    cases.append(Case("backtest_build_table[fixture series]", lambda: backtest_returns,
+                      lambda returns: backtest.build_table(returns, server.dynamic_allocation), repeat=3))
+    backtest._table.update(table=backtest.BacktestTable(backtest.build_table(backtest_returns, server.dynamic_allocation)),
+                           loaded=True)
+
+    client = server.app.test_client()
+    basket_request = {"currentWealth": 500000, "targetWealth": 2000000, "timeFrame": 10, "investmentType": "SIP",
+                      "monthlyInvestment": 10000}
+    cases.append(Case("calculate_baskets[POST /calculate-baskets]", lambda: client,
+                      lambda c: c.post("/calculate-baskets", json=basket_request), repeat=50))
+
+    disclosures = LookThrough(generate_disclosures())
+    for portfolios in (1, 100) if quick else (1, 100, 10_000):
+        def setup_lookthrough(portfolios=portfolios):
+            frames = [holdings_frame(generate_portfolio(50, seed=i)).assign(pan=f"BENCH{i}") for i in range(portfolios)]
+            holdings = pd.concat(frames, ignore_index=True)
+            holdings["total_value"] = np.random.default_rng(0).uniform(1_000, 100_000, len(holdings))
+            return holdings
+
+        cases.append(Case(f"lookthrough_exposures[{portfolios} portfolios x 50 holdings]", setup_lookthrough,
+                          disclosures.exposures, items=portfolios, repeat=3 if portfolios >= 10_000 else 5))
+
+    snapshot_book = SnapshotBook(fixture_fetch(FIXTURES_DIR), indices=["NIFTY 50"])
+    cases.append(Case("nse_snapshot_refresh[NIFTY 50 + ETFs]", lambda: snapshot_book,
+                      lambda book: book.refresh(force=True), items=len(snapshot_book.sources), repeat=20))
+
+    for years in bar_scales:
+        cases.append(Case(f"add_technical_indicators[{years}y bars]",
+                          lambda years=years: generate_ohlcv(years),
+                          server.add_technical_indicators, items=years * TRADING_DAYS))
+
+    for schemes in fund_scales:
+        def setup_funds(schemes=schemes):
+            fund_screener.set_fund_universe(fund_screener.build_universe(
+                scaled_amfi_text(schemes), pd.read_csv(os.path.join(FIXTURES_DIR, "fund_metrics_sample.csv"))))
+            return ["Parag Parikh Flexi Cap", "HDFC Large Cap", "Example Thematic", "No Such Fund"]
+
+        cases.append(Case(f"check_bad_mutual_fund[{schemes} schemes]", setup_funds,
+                          lambda names: [server.check_bad_mutual_fund(name) for name in names], items=4, repeat=20))
+        cases.append(Case(f"parse_amfi_universe[{schemes} schemes]", lambda schemes=schemes: scaled_amfi_text(schemes),
+                          fund_screener.build_universe, items=schemes))
+
+    for years in bar_scales:
+        def setup_predict(years=years):
+            server.yf = OfflineYFinance(generate_ohlcv(years))
+            return years
+
+        cases.append(Case(f"predict_pipeline[{years}y bars]", setup_predict,
+                          lambda _: server.run_prediction("BENCH.NS", 63, retrain=True), repeat=1, slow=True))
+
+        def setup_compiled(years=years):
+            setup_predict(years)
+            if inference.get_model("BENCH.NS", 63) is None:
+                server.run_prediction("BENCH.NS", 63, retrain=True)
+            return years
+
+        cases.append(Case(f"predict_compiled[{years}y bars]", setup_compiled,
+                          lambda _: server.run_prediction("BENCH.NS", 63), repeat=5, slow=True))
+
+    return cases
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline backend benchmarks")
+    parser.add_argument("-k", dest="keyword", help="only run cases whose name contains this text")
+    parser.add_argument("--quick", action="store_true", help="smallest scale of each case only")
+    parser.add_argument("--include-slow", action="store_true", help="include model training cases")
+    parser.add_argument("--json", dest="json_path", help="write results to this file")
+    args = parser.parse_args()
+
+    os.environ.setdefault("REFRESH_SCHEDULER", "0")
+    os.environ.setdefault("MODEL_DIR", os.path.join(tempfile.gettempdir(), "invest360_bench_models"))
+    # revalue_portfolio records valuation snapshots; keep them out of the real history
+    os.environ.setdefault("VALUATION_HISTORY_DIR", os.path.join(tempfile.gettempdir(), "invest360_bench_history"))
+    results = []
+    print(f"{'case':<48}{'median ms':>12}{'p95 ms':>12}{'items/s':>14}{'peak MB':>10}")
+    for case in build_cases(quick=args.quick):
+        if args.keyword and args.keyword not in case.name:
+            continue
+        if case.slow and not args.include_slow:
+            continue
+        result = measure(case)
+        results.append(result)
+        print(f"{result['case']:<48}{result['median_ms']:>12}{result['p95_ms']:>12}"
+              f"{result['throughput_per_s'] or '':>14}{result['peak_mb']:>10}")
+
+    if args.json_path:
+        with open(args.json_path, "w") as f:
+            json.dump(results, f, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,7 @@
 # data.py
 
+import threading
+
 # Sample Portfolio Data (Mock Database)
 user_portfolios = {
     "ABCDE1234F": {
@@ -47,4 +49,86 @@ user_portfolios = {
 }
 
 def get_user_portfolio(pan):
-    return user_portfolios.get(pan)
\ No newline at end of file
+    return user_portfolios.get(pan)
+
+# Key that identifies a holding within its category, used to upsert imported positions
+def holding_key(category, item):
+    if category in ("Stocks", "Mutual Funds"):
+        return item["name"].upper()
+    if category == "ETF":
+        return (item.get("symbol") or item["type"]).upper()
+    if item.get("reference"):
+        return str(item["reference"])
+    return (item.get("bank") or item.get("scheme"), item.get("start_date"),
+            item.get("investment") or item.get("monthly_deposit"))
+
+_holding_index = {}  # (pan, category) -> {holding key: position in the holdings list}
+_holdings_versions = {}  # pan -> number of upserts that touched its holdings
+_portfolio_locks = {}  # pan -> lock held while its holdings are upserted or valued
+_portfolio_locks_guard = threading.Lock()
+
+def portfolio_lock(pan):
+    """The PAN's lock: upsert_holdings and the valuation code never interleave on one portfolio."""
+    with _portfolio_locks_guard:
+        lock = _portfolio_locks.get(pan)
+        if lock is None:
+            lock = _portfolio_locks[pan] = threading.RLock()
+        return lock
+
+def holdings_version(pan):
+    """Changes whenever upsert_holdings touches the PAN's holdings."""
+    return _holdings_versions.get(pan, 0)
+
+def _category_index(pan, category):
+    key = (pan, category)
+    index = _holding_index.get(key)
+    if index is None:
+        holdings = user_portfolios[pan]["assets"][category]["holdings"]
+        index = _holding_index[key] = {holding_key(category, item): i for i, item in enumerate(holdings)}
+    return index
+
+def upsert_holdings(records):
+    """
+    Insert or update a batch of (pan, category, holding) records. An existing holding with
+    the same key is replaced; a holding whose quantity/units is 0 is removed. Touched
+    portfolios lose their valuation timestamp so the next request revalues them.
+    Returns (inserted, updated, removed).
+    """
+    by_pan = {}
+    for pan, category, item in records:
+        by_pan.setdefault(pan, []).append((category, item))
+
+    inserted = updated = removed = 0
+    for pan, pan_records in by_pan.items():
+        with portfolio_lock(pan):
+            # Bumped first: a valuation state built from the old holdings is never current
+            _holdings_versions[pan] = _holdings_versions.get(pan, 0) + 1
+            portfolio = user_portfolios.setdefault(pan, {"assets": {}})
+            portfolio.pop("last_updated", None)
+            closed_positions = {}  # category -> positions to drop once the batch is applied
+            for category, item in pan_records:
+                holdings = portfolio["assets"].setdefault(category, {"holdings": []})["holdings"]
+                index = _category_index(pan, category)
+                key = holding_key(category, item)
+                position = index.get(key)
+                closed = item.get("quantity", item.get("units", 1)) <= 0
+
+                if closed:
+                    if position is not None:
+                        del index[key]
+                        closed_positions.setdefault(category, set()).add(position)
+                        removed += 1
+                elif position is None:
+                    index[key] = len(holdings)
+                    holdings.append(item)
+                    inserted += 1
+                else:
+                    holdings[position] = item
+                    updated += 1
+
+            # One rebuild per category instead of shifting the list for every removal
+            for category, positions in closed_positions.items():
+                holdings = portfolio["assets"][category]["holdings"]
+                holdings[:] = [item for i, item in enumerate(holdings) if i not in positions]
+                _holding_index.pop((pan, category), None)  # Positions have shifted
+    return inserted, updated, removed
@@ -1,11 +1,59 @@
 import json
 
 DATABASE = {}
+VERSIONS = {}
+FINGERPRINTS = {}
+ANALYSIS_CACHE = {}
+REBALANCE_PLANS = {}
 
-def save_user_portfolio(pan, portfolio):
-    """Save portfolio data to the database."""
+def valuation_fingerprint(portfolio):
+    """Values that define a valuation; a new version is only issued when these change."""
+    return (portfolio.get("total_portfolio_value"),) + tuple(
+        item.get("total_value")
+        for details in portfolio["assets"].values()
+        for item in details["holdings"]
+    )
+
+def save_user_portfolio(pan, portfolio, changed=None):
+    """
+    Save portfolio data to the database. A caller that already knows whether any value
+    moved passes `changed`, which skips the O(holdings) fingerprint.
+    """
     DATABASE[pan] = portfolio
 
+    if changed is None:
+        fingerprint = valuation_fingerprint(portfolio)
+        changed = FINGERPRINTS.get(pan) != fingerprint
+        FINGERPRINTS[pan] = fingerprint
+    elif changed:
+        FINGERPRINTS.pop(pan, None)  # Recomputed by the next fingerprinted save
+    if changed:
+        VERSIONS[pan] = VERSIONS.get(pan, 0) + 1
+        ANALYSIS_CACHE.pop(pan, None)  # Risk and recommendations belong to the old valuation
+
 def get_cached_portfolio(pan):
     """Fetch the latest cached portfolio from the database."""
-    return DATABASE.get(pan)
\ No newline at end of file
+    return DATABASE.get(pan)
+
+def get_portfolio_version(pan):
+    """Version of the latest saved valuation for a PAN (0 if never valued)."""
+    return VERSIONS.get(pan, 0)
+
+def save_portfolio_analysis(pan, version, analysis):
+    """Cache risk analysis and recommendations computed from a given valuation version."""
+    ANALYSIS_CACHE[pan] = {"version": version, "analysis": analysis}
+
+def get_cached_analysis(pan, version):
+    """Fetch cached analysis if it was computed from the given valuation version."""
+    entry = ANALYSIS_CACHE.get(pan)
+    if entry and entry["version"] == version:
+        return entry["analysis"]
+    return None
+
+def save_rebalance_plan(pan, plan):
+    """Store the latest rebalance plan (trade list) for a PAN."""
+    REBALANCE_PLANS[pan] = plan
+
+def get_rebalance_plan(pan):
+    """Fetch the latest stored rebalance plan for a PAN."""
+    return REBALANCE_PLANS.get(pan)
@@ -0,0 +1,158 @@
+# fault_stub.py
+#
+# Local stand-in for the NSE quote API with injectable faults, for exercising the
+# resilience layer (resilience.py) without touching real providers. Point the backend at
+# it with NSE_BASE_URL=http://127.0.0.1:8765, or run the built-in drill:
+#
+#     python fault_stub.py --port 8765        # serve quotes
+#     python fault_stub.py --drill            # healthy / slow tail / outage / recovery phases
+#
+# Faults are changed at runtime with POST /faults and a JSON body of any of:
+#     latency       base response delay in seconds
+#     slow_rate     share of requests delayed by slow_latency instead (tail latency)
+#     slow_latency  delay of the slow requests
+#     error_rate    share of requests answered with `status`
+#     status        HTTP status of injected errors (default 503)
+
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import requests
+
+DEFAULT_FAULTS = {"latency": 0.01, "slow_rate": 0.0, "slow_latency": 2.0, "error_rate": 0.0, "status": 503}
+
+class StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 128  # Drill clients open many connections at once
+
+class FaultStub:
+    def __init__(self, host="127.0.0.1", port=0):
+        self.faults = dict(DEFAULT_FAULTS)
+        self.requests = 0
+        self.lock = threading.Lock()
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def _send(self, status, body):
+                payload = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def do_GET(self):
+                url = urlparse(self.path)
+                if url.path == "/faults":
+                    return self._send(200, {**stub.faults, "requests": stub.requests})
+                if url.path != "/api/quote-equity":
+                    return self._send(404, {"error": "not found"})
+                with stub.lock:
+                    stub.requests += 1
+                    faults = dict(stub.faults)
+                slow = random.random() < faults["slow_rate"]
+                time.sleep(faults["slow_latency"] if slow else faults["latency"])
+                if random.random() < faults["error_rate"]:
+                    return self._send(int(faults["status"]), {"error": "injected fault"})
+                symbol = parse_qs(url.query).get("symbol", [""])[0].upper()
+                price = round(100 + sum(map(ord, symbol)) % 900 + random.random(), 2)
+                self._send(200, {"info": {"symbol": symbol}, "priceInfo": {"lastPrice": price}})
+
+            def do_POST(self):
+                if urlparse(self.path).path != "/faults":
+                    return self._send(404, {"error": "not found"})
+                body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+                with stub.lock:
+                    stub.faults.update({k: v for k, v in body.items() if k in DEFAULT_FAULTS})
+                self._send(200, stub.faults)
+
+        self.server = StubServer((host, port), Handler)
+        self.url = f"http://{host}:{self.server.server_address[1]}"
+
+    def set_faults(self, **faults):
+        with self.lock:
+            self.faults = {**DEFAULT_FAULTS, **faults}
+
+    def start(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+def drill(calls=200, workers=16):
+    """Drive quotes through a guarded client over fault phases and report latency and outcomes."""
+    from concurrent.futures import ThreadPoolExecutor
+
+    import numpy as np
+
+    from resilience import SharedRateBudget, Upstream
+
+    stub = FaultStub().start()
+    http = requests.Session()
+    last_known = {}
+
+    def fetch(symbol):
+        response = http.get(f"{stub.url}/api/quote-equity", params={"symbol": symbol}, timeout=5)
+        response.raise_for_status()
+        return response.json()["priceInfo"]["lastPrice"]
+
+    phases = [
+        ("healthy", {}),
+        ("slow tail (3% at 1s)", {"slow_rate": 0.03, "slow_latency": 1.0}),
+        ("outage (100% 503)", {"error_rate": 1.0}),
+        ("recovery", {}),
+        ("recovered", {}),
+    ]
+    for hedge in (False, True):
+        guard = Upstream("nse", SharedRateBudget({"nse": (1000.0, 1000)}, path=None),
+                         threshold=5, reset_timeout=1)
+        print(f"\nhedging {'on' if hedge else 'off'}")
+        for name, faults in phases:
+            stub.set_faults(**faults)
+            if name == "recovery":
+                time.sleep(1.1)  # Let the breaker half-open
+            sent = stub.requests
+
+            def one(i):
+                symbol = f"SYM{i % 20}"
+                start = time.perf_counter()
+                price = guard.call(fetch, symbol, operation="quote", hedge=hedge,
+                                   fallback=lambda: last_known.get(symbol))
+                if price is not None:
+                    last_known[symbol] = price
+                return time.perf_counter() - start
+
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                latencies = np.array(list(pool.map(one, range(calls))))
+            p50, p95, p99 = np.percentile(latencies, [50, 95, 99]) * 1000
+            print(f"  {name:24s} p50 {p50:7.1f} ms  p95 {p95:7.1f} ms  p99 {p99:7.1f} ms  "
+                  f"upstream requests {stub.requests - sent:4d}  breaker {guard.breaker.state}")
+    stub.stop()
+
+def main():
+    parser = argparse.ArgumentParser(description="NSE quote stub with injectable faults")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--drill", action="store_true", help="run the fault drill against an ephemeral stub")
+    args = parser.parse_args()
+    if args.drill:
+        drill()
+        return
+    stub = FaultStub(port=args.port)
+    print(f"Serving fault stub on {stub.url}")
+    try:
+        stub.server.serve_forever()
+    except KeyboardInterrupt:
+        stub.stop()
+
+if __name__ == "__main__":
+    main()
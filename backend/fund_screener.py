@@ -0,0 +1,160 @@
+# fund_screener.py
+
+import io
+import os
+import time
+
+import numpy as np
+import pandas as pd
+import requests
+
+from market_calendar import amfi_is_fresh
+from metrics import cache_lookup, stage
+from resilience import get_upstream
+
+AMFI_NAV_URL = "https://www.amfiindia.com/spages/NAVAll.txt"
+AMFI_CACHE_EXPIRATION = 3600  # 1 hour
+
+# Local expense ratio / AUM dataset. NAVAll.txt only carries NAVs, so these come
+# from a CSV with columns: scheme_code, expense_ratio (%), aum (crore).
+FUND_METRICS_FILE = os.environ.get(
+    "FUND_METRICS_FILE", os.path.join(os.path.dirname(__file__), "fund_metrics.csv"))
+
+# Screening rules
+MIN_NAV = 10
+MAX_EXPENSE_RATIO = 2  # %
+MIN_AUM = 100  # crore
+SCREENING_RULES = {"low_nav": "nav", "high_expense_ratio": "expense_ratio", "low_aum": "aum"}  # rule -> column
+
+AMFI_COLUMNS = ["scheme_code", "isin_growth", "isin_reinvestment", "scheme_name", "nav", "nav_date"]
+
+_universe = {"table": None, "time": 0, "names": {}, "lookups": {}}
+
+def normalize_name(name):
+    return " ".join(name.strip().lower().split())
+
+def parse_amfi_nav(text):
+    """
+    Parse the AMFI NAVAll.txt dump into a typed columnar table.
+    Section headers (fund house / scheme category) and blank lines are dropped.
+    """
+    df = pd.read_csv(io.StringIO(text), sep=";", names=AMFI_COLUMNS, header=None,
+                     dtype=str, skip_blank_lines=True, on_bad_lines="skip", engine="c")
+
+    df["scheme_code"] = pd.to_numeric(df["scheme_code"], errors="coerce")
+    df = df[df["scheme_code"].notna() & df["scheme_name"].notna()].copy()
+
+    df["scheme_code"] = df["scheme_code"].astype("int64")
+    df["scheme_name"] = df["scheme_name"].str.strip()
+    df["nav"] = pd.to_numeric(df["nav"], errors="coerce")
+    df["nav_date"] = pd.to_datetime(df["nav_date"], format="%d-%b-%Y", errors="coerce")
+    df["name_key"] = df["scheme_name"].str.lower().str.split().str.join(" ")
+    return df.reset_index(drop=True)
+
+def load_fund_metrics(path=FUND_METRICS_FILE):
+    """Load the local expense ratio / AUM dataset, or an empty table if it is missing."""
+    if not os.path.exists(path):
+        print(f"Fund metrics file {path} not found; expense ratio / AUM screening is skipped")
+        return pd.DataFrame({"scheme_code": pd.Series(dtype="int64"),
+                             "expense_ratio": pd.Series(dtype="float64"),
+                             "aum": pd.Series(dtype="float64")})
+
+    metrics = pd.read_csv(path, dtype={"scheme_code": "int64"})
+    return metrics[["scheme_code", "expense_ratio", "aum"]].drop_duplicates("scheme_code", keep="last")
+
+def screened_rules(table):
+    """The screening rules whose data is present: a column no scheme has a value for is skipped."""
+    return [rule for rule, column in SCREENING_RULES.items() if table[column].notna().any()]
+
+def screen_universe(table):
+    """Apply the NAV / expense ratio / AUM rules to every scheme at once and rank them."""
+    checks = {
+        "low_nav": table["nav"] < MIN_NAV,
+        "high_expense_ratio": table["expense_ratio"] > MAX_EXPENSE_RATIO,
+        "low_aum": table["aum"] < MIN_AUM,
+    }
+    rules = screened_rules(table)
+    flags = {rule: checks[rule] if rule in rules else False for rule in SCREENING_RULES}
+
+    reason = np.select([checks[rule] for rule in rules], rules, default="") if rules else np.full(len(table), "")
+    table = table.assign(**flags, status=np.where(reason == "", "good", "bad"), reason=reason)
+
+    # Good funds first, then cheapest and largest
+    table = table.sort_values(["status", "expense_ratio", "aum"],
+                              ascending=[False, True, False], na_position="last")
+    return table  # Index keeps the AMFI file order
+
+def build_universe(text, metrics=None):
+    """Build the screened scheme universe from AMFI text and the local metrics dataset."""
+    table = parse_amfi_nav(text)
+    if metrics is None:
+        metrics = load_fund_metrics()
+    table = table.merge(metrics, on="scheme_code", how="left")
+    return screen_universe(table)
+
+def get_fund_universe(force_refresh=False):
+    """
+    Return the screened AMFI universe. NAVAll.txt is refetched after AMFI_CACHE_EXPIRATION,
+    unless the cached copy already holds the latest evening publish.
+    """
+    current_time = time.time()
+    fresh = _universe["table"] is not None and amfi_is_fresh(_universe["time"], AMFI_CACHE_EXPIRATION)
+    cache_lookup("amfi", fresh and not force_refresh)
+    if fresh and not force_refresh:
+        return _universe["table"]
+
+    def fetch():
+        response = requests.get(AMFI_NAV_URL, timeout=30)
+        response.raise_for_status()
+        return response
+
+    # A failed refresh keeps serving the previous table when there is one
+    stale = _universe["table"]
+    response = get_upstream("amfi").call(fetch, operation="navall", retries=1,
+                                         fallback=(lambda: None) if stale is not None else None)
+    if response is None:
+        return stale
+    with stage("amfi_parse"):
+        set_fund_universe(build_universe(response.text), current_time)
+    return _universe["table"]
+
+def set_fund_universe(table, fetched_at=None):
+    """Install a screened universe table and rebuild its name index."""
+    # Keep the first row per name, matching the AMFI file order lookup used to have
+    first_rows = table.sort_index().drop_duplicates("name_key")
+    _universe["names"] = dict(zip(first_rows["name_key"], first_rows.index))
+    _universe["lookups"] = {}
+    _universe["table"] = table
+    _universe["time"] = fetched_at if fetched_at is not None else time.time()
+
+def lookup_fund(mutual_fund_name):
+    """
+    Find a scheme row by name. Exact names are an O(1) dict lookup; other names fall back
+    to a vectorized substring search whose result is memoized until the next refresh.
+    """
+    table = get_fund_universe()
+    key = normalize_name(mutual_fund_name)
+
+    row_id = _universe["names"].get(key)
+    if row_id is None:
+        if key not in _universe["lookups"]:
+            matches = table.index[table["name_key"].str.contains(key, regex=False)]
+            _universe["lookups"][key] = matches.min() if len(matches) else None
+        row_id = _universe["lookups"][key]
+
+    return None if row_id is None else table.loc[row_id]
+
+def screen_funds(query=None, status=None, limit=50):
+    """Return the ranked universe, optionally filtered by name substring and status."""
+    table = get_fund_universe()
+    mask = pd.Series(True, index=table.index)
+    if query:
+        mask &= table["name_key"].str.contains(normalize_name(query), regex=False)
+    if status:
+        mask &= table["status"] == status
+
+    result = table.loc[mask].head(limit)
+    columns = ["scheme_code", "scheme_name", "nav", "nav_date", "expense_ratio", "aum", "status", "reason"]
+    result = result[columns].assign(nav_date=result["nav_date"].dt.strftime("%Y-%m-%d"))
+    return {"total": int(mask.sum()), "rules": screened_rules(table),
+            "funds": result.replace({np.nan: None}).to_dict(orient="records")}
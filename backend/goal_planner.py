@@ -0,0 +1,154 @@
+# goal_planner.py
+#
+# Vectorized goal-planner sweeps. /calculate-baskets evaluates one (target wealth, time
+# frame) point; the planner UI needs the whole feasibility surface, so this module
+# evaluates every (target, time frame, monthly SIP) combination for the Low / Medium /
+# High baskets as array broadcasts. The allocation and return formulas mirror
+# server.dynamic_allocation / compute_expected_return point for point.
+
+import numpy as np
+
+RISK_CATEGORIES = ("Low", "Medium", "High")
+ASSETS = ("stocks", "mutualFunds", "FDs", "ETFs", "govtSchemes")
+RISK_PREMIUM = {"Low": -0.01, "Medium": 0.0, "High": 0.04}
+MAX_SWEEP_POINTS = 250_000  # targets x time frames x SIP amounts
+MAX_AXIS_STEPS = 200
+
+def sweep_axis(spec, name, integer=False):
+    """
+    Values of one sweep axis: a number, a list of numbers, or {"min", "max"} with "steps"
+    (evenly spaced) or "step". Always returned sorted and without repeats.
+    """
+    if isinstance(spec, (int, float)):
+        values = np.array([spec], dtype=float)
+    elif isinstance(spec, list):
+        values = np.array(spec, dtype=float)
+    elif isinstance(spec, dict) and "min" in spec and "max" in spec:
+        lo, hi = float(spec["min"]), float(spec["max"])
+        if hi < lo:
+            raise ValueError(f"{name}: max must not be below min")
+        if spec.get("step"):
+            values = np.arange(lo, hi + float(spec["step"]) / 2, float(spec["step"]))
+        else:
+            values = np.linspace(lo, hi, int(spec.get("steps", 20)))
+    else:
+        raise ValueError(f"{name} must be a number, a list or {{min, max, steps|step}}")
+    values = np.unique(np.round(values) if integer else values)
+    if values.size == 0 or values.size > MAX_AXIS_STEPS:
+        raise ValueError(f"{name} must have between 1 and {MAX_AXIS_STEPS} values")
+    return values
+
+def allocation_grid(risk_category, required_cagr, investment_type):
+    """dynamic_allocation over an array of required CAGRs: (..., ASSETS) percentages."""
+    c = np.asarray(required_cagr, dtype=float)
+    if risk_category == "Low":
+        short = np.maximum(0.08 - c, 0)
+        stocks = np.maximum(5 - short * 20, 0)
+        funds = np.full_like(c, 10)
+        fds = 60 + short * 50
+        etfs = np.maximum(5 - short * 10, 0)
+        govt = 20 + short * 30
+    elif risk_category == "Medium":
+        diff = c - 0.10
+        up, down = diff > 0, np.maximum(-diff, 0)
+        stocks = np.where(up, 30 + diff * 80, np.maximum(30 - down * 40, 0))
+        funds = np.full_like(c, 30)
+        fds = np.where(up, np.maximum(10 - diff * 40, 0), 10 + down * 30)
+        etfs = np.where(up, 20 + diff * 40, np.maximum(20 - down * 20, 0))
+        govt = np.where(up, np.maximum(10 - diff * 20, 0), 10 + down * 10)
+    elif risk_category == "High":
+        diff = c - 0.15
+        up, down = diff > 0, np.maximum(-diff, 0)
+        stocks = np.where(up, 60 + diff * 120, np.maximum(60 - down * 60, 0))
+        funds = np.where(up, np.maximum(25 - diff * 20, 0), 25 + down * 20)
+        fds = np.zeros_like(c)
+        etfs = np.where(up, 10 + diff * 80, np.maximum(10 - down * 30, 0))
+        govt = np.where(up, np.maximum(5 - diff * 10, 0), 5.0)
+    else:
+        raise ValueError(f"Unknown risk category: {risk_category}")
+
+    if investment_type == "SIP":
+        funds = funds + 5
+        fds = np.maximum(fds - 5, 0)
+    weights = np.stack([stocks, funds, fds, etfs, govt], axis=-1)
+    return np.round(weights / weights.sum(axis=-1, keepdims=True) * 100, 2)
+
+def sip_factor(annual_return, years):
+    """Future value of 1 invested at the start of every month for `years` years."""
+    monthly = (1 + annual_return) ** (1 / 12) - 1
+    months = 12 * years
+    with np.errstate(divide="ignore", invalid="ignore"):
+        factor = (1 + monthly) * ((1 + monthly) ** months - 1) / monthly
+    return np.where(np.abs(monthly) < 1e-12, months, factor)
+
+def sweep(current_wealth, targets, years, sips, asset_returns, investment_type="SIP", table=None):
+    """
+    Evaluate the (targets x years x sips) grid for every basket. asset_returns is the
+    dynamic return per ASSETS entry; table is a backtest.BacktestTable whose median
+    realized CAGR replaces the assumed return wherever it has history, as in
+    /calculate-baskets.
+    """
+    if len(targets) * len(years) * len(sips) > MAX_SWEEP_POINTS:
+        raise ValueError(f"Sweep is limited to {MAX_SWEEP_POINTS} points")
+    if np.any(np.diff(years) <= 0):
+        raise ValueError("years must be strictly increasing (see sweep_axis)")  # minTimeFrame takes the first feasible
+    T, Y = np.meshgrid(targets, years, indexing="ij")  # (targets x years)
+    required = (T / current_wealth) ** (1 / Y) - 1
+    asset_returns = np.array([asset_returns[a] for a in ASSETS])
+
+    baskets, summary = {}, {}
+    for risk in RISK_CATEGORIES:
+        weights = allocation_grid(risk, required, investment_type)
+        expected = weights @ asset_returns / 100 + RISK_PREMIUM[risk]
+        if table is not None:
+            realized = table.median_cagr(risk, investment_type, required, Y)
+            expected = np.where(np.isnan(realized), expected, realized)
+
+        lump = np.round(current_wealth * (1 + expected) ** Y, 2)  # finalWealth of /calculate-baskets
+        factor = sip_factor(expected, Y)
+        final = lump[:, :, None] + factor[:, :, None] * sips[None, None, :]
+        feasible = final >= T[:, :, None]
+
+        # Smallest time frame that reaches each target for each SIP amount
+        any_year = feasible.any(axis=1)
+        first_year = years[feasible.argmax(axis=1)]
+        min_years = np.where(any_year, first_year, np.nan)
+        # Smallest monthly SIP that closes the gap, solved exactly rather than on the grid
+        min_sip = np.maximum(T - lump, 0) / factor
+
+        baskets[risk] = {
+            "allocation": weights,
+            "expectedReturn": np.round(expected * 100, 2),
+            "finalWealth": np.round(final, 2),
+            "feasible": feasible,
+            "minTimeFrame": min_years,
+            "minMonthlyInvestment": np.round(min_sip, 2),
+        }
+        summary[risk] = round(float(feasible.mean()) * 100, 2)
+    return {"requiredCAGR": np.round(required * 100, 2), "baskets": baskets, "feasiblePercent": summary}
+
+def to_json(result, targets, years, sips, include_allocation=False):
+    """Nested lists for the response; NaN (no feasible time frame) becomes null."""
+    def nested(array, integer=False):
+        if array.dtype.kind == "f":
+            missing = np.isnan(array)
+            if missing.any():
+                values = np.where(missing, 0, array).astype(int) if integer else array
+                return np.where(missing, None, values).tolist()
+            return (array.astype(int) if integer else array).tolist()
+        return array.tolist()
+
+    baskets = {}
+    for risk, surfaces in result["baskets"].items():
+        baskets[risk] = {key: nested(value, integer=key == "minTimeFrame") for key, value in surfaces.items()
+                         if key != "allocation"}
+        if include_allocation:
+            baskets[risk]["allocation"] = {asset: nested(surfaces["allocation"][..., i])
+                                           for i, asset in enumerate(ASSETS)}
+    return {
+        "axes": {"targetWealth": targets.tolist(), "timeFrame": years.astype(int).tolist(),
+                 "monthlyInvestment": sips.tolist()},
+        "requiredCAGR": nested(result["requiredCAGR"]),
+        "baskets": baskets,
+        "feasiblePercent": result["feasiblePercent"],
+    }
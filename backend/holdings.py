@@ -0,0 +1,74 @@
+# holdings.py
+
+import datetime
+
+import pandas as pd
+
+from screener import to_nse_symbol
+
+NIFTY_SYMBOL = "^NSEI"
+
+# Yahoo Finance tickers used as the market series for ETF holdings
+ETF_SYMBOLS = {"Gold": "GOLDBEES.NS", "Silver": "SILVERBEES.NS"}
+
+# Categories that are valued at maturity and carry no market price risk
+FIXED_INCOME_CATEGORIES = ("Fixed Deposits", "Recurring Deposits", "Government Schemes")
+
+HOLDING_COLUMNS = ["category", "name", "symbol", "quantity", "total_value", "months_to_maturity"]
+
+def holding_name(category, item):
+    """Human readable name of a holding, whatever its category."""
+    if category == "ETF":
+        return item.get("symbol") or item["type"]
+    return item.get("name") or item.get("bank") or item.get("scheme") or category
+
+def etf_symbol(item):
+    """NSE symbol of an ETF holding: its "symbol", or the Gold / Silver ETF for typed holdings."""
+    symbol = item.get("symbol") or ETF_SYMBOLS.get(item.get("type"), "")
+    return symbol.upper().removesuffix(".NS") or None
+
+def market_symbol(category, item):
+    """
+    Yahoo Finance symbol whose price history drives a holding's returns.
+    Mutual funds have no exchange listing, so they are proxied by NIFTY 50.
+    Fixed income holdings return None.
+    """
+    if category == "Stocks":
+        return to_nse_symbol(item["name"])
+    if category == "ETF":
+        if item.get("symbol"):
+            return to_nse_symbol(item["symbol"])
+        return ETF_SYMBOLS.get(item.get("type"))
+    if category == "Mutual Funds":
+        return NIFTY_SYMBOL
+    return None
+
+def months_to_maturity(category, item, today=None):
+    """
+    Months left until a fixed income holding matures. Holdings with a "start_date"
+    (YYYY-MM-DD) count down from it; otherwise the full duration is assumed to remain.
+    """
+    if category not in FIXED_INCOME_CATEGORIES or "duration" not in item:
+        return None
+    if not item.get("start_date"):
+        return item["duration"]
+
+    today = today or datetime.date.today()
+    start = datetime.date.fromisoformat(item["start_date"])
+    elapsed = (today.year - start.year) * 12 + (today.month - start.month)
+    return max(item["duration"] - elapsed, 0)
+
+def holdings_frame(portfolio):
+    """Flatten a valued portfolio (assets -> category -> holdings) into one row per holding."""
+    rows = []
+    for category, details in portfolio["assets"].items():
+        for item in details["holdings"]:
+            rows.append((
+                category,
+                holding_name(category, item),
+                market_symbol(category, item),
+                item.get("quantity", item.get("units", 0)),
+                item.get("total_value", 0) or 0,
+                months_to_maturity(category, item),
+            ))
+    return pd.DataFrame(rows, columns=HOLDING_COLUMNS)
@@ -0,0 +1,283 @@
+# holdings_import.py
+#
+# Streaming import of holdings into the portfolio store (data.user_portfolios).
+#
+# Two input shapes are understood, detected from the header row:
+#   - Broker / back-office position exports: one row per position with a PAN, an
+#     instrument (symbol, ISIN or scheme name) and a quantity. Column names vary between
+#     brokers, so they are matched through COLUMN_ALIASES.
+#   - Consolidated account statement (CAS) transaction exports (CAMS / KFintech, e.g.
+#     as produced by casparser): one row per transaction with a running unit "balance".
+#     The latest balance per PAN and scheme is the holding.
+#
+# The file is parsed in chunks of IMPORT_BATCH_SIZE rows by pandas' C reader; each chunk
+# is normalized and resolved with column operations and upserted as one batch, so memory
+# stays bounded by the chunk size (plus one balance per scheme for CAS files).
+#
+#     python holdings_import.py positions.csv [--format broker|cas]   # parse and report only
+
+import argparse
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from data import upsert_holdings
+
+IMPORT_BATCH_SIZE = 5000
+
+# Canonical field -> accepted header names (compared lower case, spaces and dashes as "_")
+COLUMN_ALIASES = {
+    "pan": ("pan", "client_pan", "pan_number", "investor_pan", "pan_no"),
+    "category": ("category", "asset_class", "instrument_type", "asset_type", "product"),
+    "symbol": ("symbol", "tradingsymbol", "trading_symbol", "scrip", "scrip_code", "ticker", "instrument"),
+    "isin": ("isin", "isin_code", "isin_number"),
+    "name": ("name", "scheme", "scheme_name", "security_name", "company_name", "fund_name"),
+    "amfi": ("amfi", "amfi_code", "scheme_code"),
+    "quantity": ("quantity", "qty", "quantity_available", "holding_quantity", "net_quantity", "units"),
+    "balance": ("balance", "closing_balance", "unit_balance"),
+    "bank": ("bank", "issuer", "institution"),
+    "investment": ("investment", "principal", "amount_invested", "deposit_amount"),
+    "monthly_deposit": ("monthly_deposit", "installment", "instalment"),
+    "duration": ("duration", "tenure", "tenure_months"),
+    "interest_rate": ("interest_rate", "rate", "coupon"),
+    "start_date": ("start_date", "deposit_date", "opening_date"),
+    "reference": ("reference", "account_number", "fd_number", "deposit_number"),
+    "date": ("date", "transaction_date", "txn_date"),
+    "folio": ("folio", "folio_number", "folio_no"),
+}
+
+CATEGORY_ALIASES = {
+    "Stocks": ("stocks", "stock", "equity", "eq", "shares"),
+    "Mutual Funds": ("mutual funds", "mutual fund", "mf", "fund"),
+    "ETF": ("etf", "etfs"),
+    "Fixed Deposits": ("fixed deposits", "fixed deposit", "fd"),
+    "Recurring Deposits": ("recurring deposits", "recurring deposit", "rd"),
+    "Government Schemes": ("government schemes", "government scheme", "govt", "ppf", "nps", "nsc", "ssy", "scss"),
+}
+CATEGORY_LOOKUP = {alias: category for category, aliases in CATEGORY_ALIASES.items() for alias in aliases}
+
+# Precious metal ETFs valued through the Gold/Silver ETF quotes
+METAL_ETFS = {"GOLDBEES": "Gold", "SILVERBEES": "Silver"}
+
+def canonical_header(name):
+    return name.strip().lower().replace(" ", "_").replace("-", "_")
+
+def map_columns(header):
+    """Canonical field -> column position for a header row."""
+    positions = {canonical_header(name): i for i, name in enumerate(header)}
+    mapping = {}
+    for field, aliases in COLUMN_ALIASES.items():
+        for alias in aliases:
+            if alias in positions:
+                mapping[field] = positions[alias]
+                break
+    return mapping
+
+def detect_format(mapping):
+    return "cas" if "folio" in mapping and "balance" in mapping and "date" in mapping else "broker"
+
+def clean_symbol(symbol):
+    """Broker symbols come as RELIANCE, RELIANCE-EQ, NSE:RELIANCE or RELIANCE.NS."""
+    symbol = symbol.strip().upper().split(":")[-1]
+    for suffix in ("-EQ", "-BE", ".NS", ".BO"):
+        if symbol.endswith(suffix):
+            symbol = symbol[:-len(suffix)]
+    return symbol
+
+class InstrumentResolver:
+    """
+    Bulk instrument resolution for one batch: mutual fund ISINs / AMFI codes against the
+    AMFI universe and stock ISINs against the NSE equity list (NSE_EQUITY_LIST_FILE, the
+    EQUITY_L.csv download, optional).
+    """
+
+    def __init__(self, fund_table=None, equity_list_file=None):
+        self.fund_by_isin = {}
+        self.fund_by_code = {}
+        if fund_table is not None and not fund_table.empty:
+            for column in ("isin_growth", "isin_reinvestment"):
+                rows = fund_table[fund_table[column].notna()]
+                self.fund_by_isin.update(zip(rows[column].str.strip(), rows["scheme_name"]))
+            self.fund_by_code = dict(zip(fund_table["scheme_code"].astype(str), fund_table["scheme_name"]))
+
+        self.stock_by_isin = {}
+        path = equity_list_file or os.environ.get("NSE_EQUITY_LIST_FILE", "")
+        if path and os.path.exists(path):
+            equities = pd.read_csv(path, dtype=str)
+            equities.columns = [canonical_header(c) for c in equities.columns]
+            self.stock_by_isin = dict(zip(equities["isin_number"].str.strip(), equities["symbol"].str.strip()))
+
+    def resolve(self, batch):
+        """Fill in "name" for a batch DataFrame of normalized rows, in place."""
+        isin = batch["isin"].str.strip().str.upper()
+        funds = batch["category"].isin(["Mutual Funds"])
+        stocks = batch["category"].isin(["Stocks", "ETF"])
+
+        fund_name = isin.map(self.fund_by_isin).fillna(batch["amfi"].str.strip().map(self.fund_by_code))
+        batch.loc[funds, "name"] = fund_name[funds].fillna(batch.loc[funds, "name"])
+
+        stock_symbol = isin.map(self.stock_by_isin)
+        given = batch["symbol"].map(clean_symbol)
+        given = given.where(given != "")
+        batch.loc[stocks, "name"] = stock_symbol[stocks].fillna(given[stocks]).fillna(batch.loc[stocks, "name"])
+        return batch
+
+def infer_categories(chunk):
+    """Category per row: the explicit column when it names one, else inferred from the instrument."""
+    explicit = chunk["category"].str.strip().str.lower().map(CATEGORY_LOOKUP)
+    symbol = chunk["symbol"].map(clean_symbol)
+    inferred = np.select(
+        [symbol.isin(list(METAL_ETFS)) | symbol.str.endswith("BEES") | symbol.str.contains("ETF"),
+         chunk["isin"].str.upper().str.startswith("INF") | (chunk["amfi"] != ""),
+         (chunk["investment"] != "") | (chunk["monthly_deposit"] != "")],
+        ["ETF", "Mutual Funds", "Fixed Deposits"],
+        default="Stocks")
+    return explicit.fillna(pd.Series(inferred, index=chunk.index))
+
+def to_number(value, default=0.0):
+    try:
+        return float(str(value).replace(",", "")) if value not in (None, "") else default
+    except ValueError:
+        return default
+
+def to_holding(category, row):
+    """A normalized row in the data.py holdings schema."""
+    if category == "Stocks":
+        return {"name": row["name"], "quantity": int(to_number(row.get("quantity")))}
+    if category == "Mutual Funds":
+        return {"name": row["name"], "units": round(to_number(row.get("quantity")), 3)}
+    if category == "ETF":
+        symbol = clean_symbol(row.get("name") or "")
+        item = {"type": METAL_ETFS.get(symbol, symbol), "quantity": int(to_number(row.get("quantity")))}
+        if symbol not in METAL_ETFS:
+            item["symbol"] = symbol
+        return item
+
+    item = {"duration": int(to_number(row.get("duration"))), "interest_rate": to_number(row.get("interest_rate"))}
+    if category == "Recurring Deposits":
+        item["bank"] = row.get("bank") or row.get("name")
+        item["monthly_deposit"] = to_number(row.get("monthly_deposit"))
+    elif category == "Fixed Deposits":
+        item["bank"] = row.get("bank") or row.get("name")
+        item["investment"] = to_number(row.get("investment"))
+    else:
+        item["scheme"] = row.get("name") or row.get("bank")
+        item["investment"] = to_number(row.get("investment"))
+    for field in ("start_date", "reference"):
+        if row.get(field):
+            item[field] = row[field].strip()
+    return item
+
+class ImportStats:
+    def __init__(self):
+        self.rows = 0
+        self.skipped = 0
+        self.inserted = 0
+        self.updated = 0
+        self.removed = 0
+        self.pans = set()
+        self.started = time.perf_counter()
+
+    def as_dict(self):
+        elapsed = time.perf_counter() - self.started
+        return {"rows": self.rows, "skipped": self.skipped, "inserted": self.inserted, "updated": self.updated,
+                "removed": self.removed, "pans": len(self.pans), "seconds": round(elapsed, 3),
+                "rows_per_second": round(self.rows / elapsed) if elapsed > 0 else None}
+
+def normalize_chunk(chunk, mapping):
+    """Rename a raw chunk to canonical fields (missing fields empty) with clean PANs."""
+    columns = {field: chunk.iloc[:, i] for field, i in mapping.items()}
+    chunk = pd.DataFrame({field: columns.get(field, "") for field in COLUMN_ALIASES}, index=chunk.index)
+    chunk["pan"] = chunk["pan"].str.strip().str.upper()
+    chunk["name"] = chunk["name"].where(chunk["name"] != "", chunk["bank"])
+    return chunk
+
+def parse_dates(values):
+    """Statement dates as timestamps: ISO dates, else day-first (28-Dec-2023, 05/04/2024); NaT when unparseable."""
+    iso = pd.to_datetime(values, format="ISO8601", errors="coerce")
+    return iso.fillna(pd.to_datetime(values.where(iso.isna()), dayfirst=True, format="mixed", errors="coerce"))
+
+def upsert_chunk(chunk, resolver, stats, dry_run):
+    """Resolve instruments for one chunk and upsert it as one batch."""
+    missing_pan = chunk["pan"] == ""
+    stats.skipped += int(missing_pan.sum())
+    chunk = chunk[~missing_pan].copy()
+    if chunk.empty:
+        return
+    chunk["category"] = infer_categories(chunk)
+    chunk["name"] = chunk["name"].replace("", np.nan)
+    resolver.resolve(chunk)
+    unresolved = chunk["name"].isna()
+    stats.skipped += int(unresolved.sum())
+
+    records = [(row["pan"], row["category"], to_holding(row["category"], row))
+               for row in chunk[~unresolved].to_dict("records")]
+    stats.pans.update(chunk.loc[~unresolved, "pan"].unique())
+    if not dry_run:
+        inserted, updated, removed = upsert_holdings(records)
+        stats.inserted += inserted
+        stats.updated += updated
+        stats.removed += removed
+
+def import_holdings(stream, file_format=None, batch_size=IMPORT_BATCH_SIZE, resolver=None, dry_run=False):
+    """
+    Stream holdings from a text stream of CSV rows into the portfolio store.
+    Returns import statistics.
+    """
+    chunks = pd.read_csv(stream, dtype=str, keep_default_na=False, chunksize=batch_size)
+    resolver = resolver or InstrumentResolver(current_fund_table())
+    stats = ImportStats()
+    mapping = None
+    latest = None  # CAS: latest row per (PAN, scheme)
+
+    for raw in chunks:
+        if mapping is None:
+            mapping = map_columns(list(raw.columns))
+            file_format = file_format or detect_format(mapping)
+            if file_format == "cas" and "balance" in mapping:
+                mapping["quantity"] = mapping["balance"]  # Units held after the transaction
+            if "pan" not in mapping or "quantity" not in mapping and "investment" not in mapping:
+                raise ValueError("Import file needs PAN and quantity (or investment) columns")
+        stats.rows += len(raw)
+        chunk = normalize_chunk(raw, mapping)
+
+        if file_format == "cas":
+            # Keep the latest running balance per (PAN, scheme); rows arrive in any order
+            chunk["scheme_key"] = chunk["isin"].where(chunk["isin"] != "", chunk["amfi"].where(chunk["amfi"] != "", chunk["name"]))
+            chunk["parsed_date"] = parse_dates(chunk["date"])
+            undated = chunk["parsed_date"].isna()  # A balance we cannot place in time is not imported
+            stats.skipped += int(undated.sum())
+            chunk = chunk[~undated]
+            latest = chunk if latest is None else pd.concat([latest, chunk])
+            latest = latest.sort_values("parsed_date", kind="stable").drop_duplicates(["pan", "scheme_key"], keep="last")
+        else:
+            upsert_chunk(chunk, resolver, stats, dry_run)
+
+    if latest is not None:
+        latest = latest.drop(columns=["scheme_key", "parsed_date"])
+        latest["category"] = latest["category"].where(latest["category"] != "", "Mutual Funds")
+        for start in range(0, len(latest), batch_size):
+            upsert_chunk(latest.iloc[start:start + batch_size], resolver, stats, dry_run)
+    return stats.as_dict()
+
+def current_fund_table():
+    """The screened AMFI universe if it can be loaded, for resolving fund ISINs and codes."""
+    try:
+        from fund_screener import get_fund_universe
+        return get_fund_universe()
+    except Exception as e:
+        print(f"AMFI universe unavailable for import resolution: {e}")
+        return None
+
+def main():
+    parser = argparse.ArgumentParser(description="Parse a holdings export and report what would be imported")
+    parser.add_argument("path")
+    parser.add_argument("--format", choices=("broker", "cas"))
+    args = parser.parse_args()
+    with open(args.path, encoding="utf-8-sig") as f:
+        print(import_holdings(f, args.format, dry_run=True))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,195 @@
+# inference.py
+#
+# TensorFlow-free inference for the /predict models exported by model_export.py. Only
+# NumPy is imported; a loaded model evaluates the stacking ensemble and the LSTM for a
+# whole batch of feature rows in one pass.
+#
+# Concurrent requests go through a BatchPredictor: callers enqueue a feature row and
+# wait, a single worker thread drains everything queued so far, groups it by model and
+# runs one forward pass per model. Nothing waits for a batch to fill - rows that arrive
+# while a pass runs simply ride along in the next one.
+
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+import numpy as np
+
+from model_export import FORMAT_VERSION, MODEL_DIR, model_path
+
+MODEL_MAX_AGE_DAYS = float(os.environ.get("MODEL_MAX_AGE_DAYS", "7"))  # Older exports are retrained
+MAX_BATCH = 256
+
+def sigmoid(x):
+    return 0.5 * (np.tanh(0.5 * x) + 1)  # Overflow-free form
+
+class TreeEnsemble:
+    """Trees packed by model_export.pack_trees, evaluated level by level for all (row, tree) pairs."""
+
+    def __init__(self, arrays, prefix):
+        self.left = arrays[f"{prefix}_left"]
+        self.right = arrays[f"{prefix}_right"]
+        self.feature = arrays[f"{prefix}_feature"]
+        self.threshold = arrays[f"{prefix}_threshold"]
+        self.value = arrays[f"{prefix}_value"]
+        self.roots = arrays[f"{prefix}_roots"]
+        self.depth = int(arrays[f"{prefix}_depth"])
+
+    def leaf_values(self, X):
+        """(rows x trees) leaf values. X is compared in float32 like scikit-learn's trees."""
+        X = X.astype(np.float32)
+        rows = np.arange(len(X))[:, None]
+        nodes = np.broadcast_to(self.roots, (len(X), len(self.roots))).copy()
+        for _ in range(self.depth):
+            go_left = X[rows, self.feature[nodes]] <= self.threshold[nodes]
+            nodes = np.where(go_left, self.left[nodes], self.right[nodes])  # Leaves point to themselves
+        return self.value[nodes]
+
+class CompiledModel:
+    def __init__(self, arrays):
+        if int(arrays["format_version"]) != FORMAT_VERSION:
+            raise ValueError("Model was exported in an unsupported format")
+        self.features = [str(f) for f in arrays["features"]]
+        self.stock = str(arrays["stock"])
+        self.prediction_period = int(arrays["prediction_period"])
+        self.exported_at = float(arrays["exported_at"])
+        self.latest_row = arrays.get("latest_row")  # Older exports have none
+
+        self.impute = arrays["impute"]
+        self.scale_mean = arrays["scale_mean"]
+        self.scale_std = arrays["scale_std"]
+        self.forest = TreeEnsemble(arrays, "rf")
+        self.boosting = TreeEnsemble(arrays, "gbr")
+        self.gbr_init = float(arrays["gbr_init"])
+        self.gbr_rate = float(arrays["gbr_rate"])
+        self.svr_vectors = self._matrix(arrays, "svr_vectors").astype(np.float64)
+        self.svr_norms = (self.svr_vectors ** 2).sum(axis=1)
+        self.svr_dual = arrays["svr_dual"]
+        self.svr_intercept = float(arrays["svr_intercept"])
+        self.svr_gamma = float(arrays["svr_gamma"])
+        self.ridge_coef = arrays["ridge_coef"]
+        self.ridge_intercept = float(arrays["ridge_intercept"])
+        self.final_coef = arrays["final_coef"]
+        self.final_intercept = float(arrays["final_intercept"])
+
+        self.minmax_scale = arrays["minmax_scale"]
+        self.minmax_min = arrays["minmax_min"]
+        self.lstm = [(self._matrix(arrays, f"lstm{i}_kernel"), self._matrix(arrays, f"lstm{i}_recurrent"),
+                      arrays[f"lstm{i}_bias"]) for i in range(int(arrays["lstm_layers"]))]
+        self.dense = [(self._matrix(arrays, f"dense{i}_kernel"), arrays[f"dense{i}_bias"], bool(arrays[f"dense{i}_relu"]))
+                      for i in range(int(arrays["dense_layers"]))]
+
+    @staticmethod
+    def _matrix(arrays, name):
+        """Dequantize a stored weight matrix to float32 once, at load time."""
+        matrix = arrays[name].astype(np.float32)
+        if f"{name}__scale" in arrays:
+            matrix *= arrays[f"{name}__scale"]
+        return matrix
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            return cls({key: data[key] for key in data.files})
+
+    def predict_stacking(self, X):
+        X = (X - self.scale_mean) / self.scale_std
+        rf = self.forest.leaf_values(X).mean(axis=1)
+        gbr = self.gbr_init + self.gbr_rate * self.boosting.leaf_values(X).sum(axis=1)
+        sq_dist = (X ** 2).sum(axis=1)[:, None] + self.svr_norms[None, :] - 2 * X @ self.svr_vectors.T
+        svr = np.exp(-self.svr_gamma * np.maximum(sq_dist, 0)) @ self.svr_dual + self.svr_intercept
+        ridge = X @ self.ridge_coef + self.ridge_intercept
+        return np.column_stack([rf, gbr, svr, ridge]) @ self.final_coef + self.final_intercept
+
+    def predict_lstm(self, X):
+        """One-step sequences, as /predict feeds the LSTM (rows x 1 x features)."""
+        sequence = [(X * self.minmax_scale + self.minmax_min).astype(np.float32)]
+        for kernel, recurrent, bias in self.lstm:
+            units = recurrent.shape[0]
+            h = np.zeros((len(X), units), dtype=np.float32)
+            c = np.zeros_like(h)
+            outputs = []
+            for x in sequence:
+                z = x @ kernel + h @ recurrent + bias
+                i, f, g, o = (z[:, k * units:(k + 1) * units] for k in range(4))
+                c = sigmoid(f) * c + sigmoid(i) * np.tanh(g)
+                h = sigmoid(o) * np.tanh(c)
+                outputs.append(h)
+            sequence = outputs
+        out = sequence[-1]
+        for kernel, bias, relu in self.dense:
+            out = out @ kernel + bias
+            if relu:
+                out = np.maximum(out, 0)
+        return out[:, 0].astype(np.float64)
+
+    def predict(self, X):
+        """Ensemble growth prediction (mean of stacking and LSTM) for each feature row."""
+        X = np.atleast_2d(np.asarray(X, dtype=np.float64))
+        X = np.where(np.isnan(X), self.impute, X)  # Median imputation, for both models
+        return (self.predict_stacking(X) + self.predict_lstm(X)) / 2
+
+_models = {}
+_models_lock = threading.Lock()
+
+def get_model(stock, prediction_period, model_dir=MODEL_DIR):
+    """Loaded model for a stock, or None when there is no fresh export. Reloaded when the file changes."""
+    path = model_path(stock, prediction_period, model_dir)
+    try:
+        mtime = os.path.getmtime(path)
+    except OSError:
+        return None
+    with _models_lock:
+        cached = _models.get(path)
+        if cached is None or cached[0] != mtime:
+            cached = _models[path] = (mtime, CompiledModel.load(path))
+    model = cached[1]
+    if time.time() - model.exported_at > MODEL_MAX_AGE_DAYS * 86400:
+        return None
+    return model
+
+class BatchPredictor:
+    def __init__(self, max_batch=MAX_BATCH):
+        self.max_batch = max_batch
+        self.queue = queue.SimpleQueue()
+        self.thread = None
+        self.lock = threading.Lock()
+
+    def _ensure_worker(self):
+        with self.lock:
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = threading.Thread(target=self._run, name="batch-predictor", daemon=True)
+                self.thread.start()
+
+    def submit(self, model, row):
+        future = Future()
+        self._ensure_worker()
+        self.queue.put((model, np.asarray(row, dtype=np.float64), future))
+        return future
+
+    def predict(self, model, row, timeout=None):
+        return self.submit(model, row).result(timeout)
+
+    def _run(self):
+        while True:
+            batch = [self.queue.get()]
+            while len(batch) < self.max_batch:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            groups = {}
+            for item in batch:
+                groups.setdefault(id(item[0]), []).append(item)
+            for items in groups.values():
+                try:
+                    results = items[0][0].predict(np.vstack([row for _, row, _ in items]))
+                    for (_, _, future), value in zip(items, results):
+                        future.set_result(float(value))
+                except Exception as e:
+                    for _, _, future in items:
+                        future.set_exception(e)
+
+predictor = BatchPredictor()
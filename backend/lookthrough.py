@@ -0,0 +1,246 @@
+# lookthrough.py
+#
+# Mutual fund look-through. Scheme portfolio disclosures (the monthly holdings lists AMCs
+# publish) are loaded from local CSV files into a sparse (schemes x securities) weight
+# matrix, so a portfolio's underlying stock and sector exposure - direct holdings plus
+# everything held through its funds - is one sparse matrix-vector product.
+#
+# Disclosure files live in PORTFOLIO_DISCLOSURE_DIR (every *.csv, optionally gzipped),
+# with columns: scheme_code, scheme_name, symbol (NSE symbol, blank for debt / cash
+# lines), security, sector, weight (% of the scheme's net assets).
+
+import glob
+import os
+
+import numpy as np
+import pandas as pd
+
+from fund_screener import normalize_name
+from holdings import holdings_frame
+
+PORTFOLIO_DISCLOSURE_DIR = os.environ.get(
+    "PORTFOLIO_DISCLOSURE_DIR", os.path.join(os.path.dirname(__file__), "disclosures"))
+
+DISCLOSURE_COLUMNS = ["scheme_code", "scheme_name", "symbol", "security", "sector", "weight"]
+UNCLASSIFIED = "Unclassified"
+EXPOSURE_COLUMNS = ["pan", "symbol", "name", "sector", "direct", "via_funds"]
+
+def load_disclosures(path=PORTFOLIO_DISCLOSURE_DIR):
+    """Every disclosure file under `path` (a directory or one file), or an empty table."""
+    files = sorted(glob.glob(os.path.join(path, "*.csv*"))) if os.path.isdir(path) else [path]
+    files = [f for f in files if os.path.exists(f)]
+    if not files:
+        return pd.DataFrame({column: pd.Series(dtype="float64" if column == "weight" else "object")
+                             for column in DISCLOSURE_COLUMNS})
+    disclosures = pd.concat([pd.read_csv(f, dtype={"scheme_code": str, "symbol": str}) for f in files],
+                            ignore_index=True)
+    disclosures["weight"] = pd.to_numeric(disclosures["weight"], errors="coerce")
+    return disclosures[disclosures["weight"].notna() & disclosures["scheme_name"].notna()][DISCLOSURE_COLUMNS]
+
+class LookThrough:
+    """
+    Disclosures in CSR form: the securities of scheme s are indices[indptr[s]:indptr[s + 1]]
+    and their share of the scheme's net assets is in data at the same positions. Holdings
+    are multiplied through by gathering the held rows and summing per (PAN, security) with
+    np.bincount, so the cost follows the held schemes' disclosure rows, not the matrix size.
+    """
+
+    def __init__(self, disclosures):
+        disclosures = disclosures.reset_index(drop=True)
+        scheme_keys = disclosures["scheme_name"].astype(str).map(normalize_name)
+        scheme_ids, scheme_index = pd.factorize(scheme_keys)
+        symbols = disclosures["symbol"].fillna("").astype(str).str.strip().str.upper()
+        # Debt and cash lines have no symbol and are keyed by their description
+        security_keys = symbols.where(symbols != "", disclosures["security"].astype(str).str.strip().str.upper())
+        security_ids, security_index = pd.factorize(security_keys)
+
+        order = np.argsort(scheme_ids, kind="stable")
+        self.indptr = np.concatenate([[0], np.cumsum(np.bincount(scheme_ids, minlength=len(scheme_index)))])
+        self.indices = security_ids[order].astype(np.int64)
+        self.data = disclosures["weight"].to_numpy(dtype=float)[order] / 100
+
+        first = ~security_keys.duplicated()  # factorize numbers securities in order of first appearance
+        self.symbols = security_keys[first].to_numpy()
+        self.names = disclosures.loc[first, "security"].astype(str).to_numpy()
+        self.sectors = disclosures.loc[first, "sector"].fillna(UNCLASSIFIED).astype(str).to_numpy()
+        self.unlisted = set(security_keys[first & (symbols == "")])  # Debt and cash lines
+        self.security_index = {symbol: i for i, symbol in enumerate(self.symbols)}
+
+        self.scheme_keys = pd.Index(scheme_index)
+        self.scheme_names = disclosures.loc[~scheme_keys.duplicated(), "scheme_name"].astype(str).to_numpy()
+        self.scheme_index = {key: i for i, key in enumerate(scheme_index)}
+        self.lookups = {}
+
+    @property
+    def shape(self):
+        return len(self.scheme_names), len(self.symbols)
+
+    def scheme_id(self, fund_name):
+        """
+        Disclosure row of a held fund: an exact name, else the first scheme whose name
+        contains it, else the longest scheme name it contains (plan / option suffixes).
+        Non-exact matches are memoized.
+        """
+        key = normalize_name(fund_name)
+        scheme = self.scheme_index.get(key)
+        if scheme is not None:
+            return scheme
+        if key not in self.lookups:
+            keys = self.scheme_keys
+            matches = np.flatnonzero(keys.str.contains(key, regex=False)) if len(keys) else []
+            if len(matches):
+                self.lookups[key] = int(matches[0])
+            else:
+                contained = [(len(k), i) for i, k in enumerate(keys) if k in key]
+                self.lookups[key] = max(contained)[1] if contained else None
+        return self.lookups[key]
+
+    def expand(self, schemes, values):
+        """
+        Rows of the sparse product values @ W[schemes]: (position in `schemes`, security,
+        amount) for every disclosure line of every held scheme.
+        """
+        starts = self.indptr[schemes]
+        lengths = self.indptr[schemes + 1] - starts
+        offsets = np.cumsum(lengths) - lengths
+        positions = np.repeat(starts - offsets, lengths) + np.arange(lengths.sum())
+        owners = np.repeat(np.arange(len(schemes)), lengths)
+        return owners, self.indices[positions], values[owners] * self.data[positions]
+
+    def exposures(self, holdings):
+        """
+        Underlying exposure of a holdings table with a "pan" column (holdings.holdings_frame)
+        covering one or many portfolios, as rows of (pan, symbol, name, sector, direct,
+        via_funds) in rupees. Returns (exposures, unmatched fund holdings).
+        """
+        pan_codes, pans = pd.factorize(holdings["pan"])
+        values = holdings["total_value"].to_numpy(dtype=float)
+        category = holdings["category"].to_numpy()
+
+        funds = np.flatnonzero(category == "Mutual Funds")
+        fund_names = holdings["name"].to_numpy()[funds]
+        scheme_of = {name: self.scheme_id(name) for name in pd.unique(fund_names)}
+        schemes = np.array([-1 if scheme_of[n] is None else scheme_of[n] for n in fund_names], dtype=np.int64)
+        matched = schemes >= 0
+        owners, fund_cols, fund_amounts = self.expand(schemes[matched], values[funds][matched])
+        fund_rows = pan_codes[funds][matched][owners]
+
+        # Direct stocks outside every disclosure get ids past the disclosed securities
+        stocks = np.flatnonzero(category == "Stocks")
+        stock_symbols = pd.Series(holdings["symbol"].to_numpy()[stocks], dtype=object).fillna("")
+        stock_symbols = stock_symbols.str.upper().str.removesuffix(".NS").to_numpy()
+        stock_cols = np.array([self.security_index.get(s, -1) for s in stock_symbols], dtype=np.int64)
+        unknown = stock_cols < 0
+        extra_codes, extra_symbols = pd.factorize(stock_symbols[unknown])
+        stock_cols[unknown] = len(self.symbols) + extra_codes
+        extra_names = pd.Series(holdings["name"].to_numpy()[stocks][unknown]).groupby(extra_codes).first()
+        extra_names = extra_names.to_numpy(dtype=object)
+
+        n_cols = len(self.symbols) + len(extra_symbols)
+        keys = np.concatenate([pan_codes[stocks] * n_cols + stock_cols, fund_rows * n_cols + fund_cols])
+        cells, inverse = np.unique(keys, return_inverse=True)
+        n_direct = len(stocks)
+        direct = np.bincount(inverse[:n_direct], weights=values[stocks], minlength=len(cells))
+        via_funds = np.bincount(inverse[n_direct:], weights=fund_amounts, minlength=len(cells))
+
+        cols = cells % n_cols
+        symbols = np.concatenate([self.symbols, np.asarray(extra_symbols, dtype=object)])
+        names = np.concatenate([self.names, extra_names])
+        sectors = np.concatenate([self.sectors, np.full(len(extra_symbols), UNCLASSIFIED, dtype=object)])
+        exposures = pd.DataFrame({
+            "pan": np.asarray(pans, dtype=object)[cells // n_cols],
+            "symbol": symbols[cols],
+            "name": names[cols],
+            "sector": sectors[cols],
+            "direct": direct,
+            "via_funds": via_funds,
+        }, columns=EXPOSURE_COLUMNS)
+        unmatched = holdings.iloc[funds[~matched]][["pan", "name", "total_value"]]
+        return exposures, unmatched
+
+    def exposure_weights(self, holdings):
+        """
+        Security and sector exposure as a share of each portfolio's total value, with a
+        "level" column ("security" / "sector"), for the look-through recommendation rules.
+        Sector rows cover listed, classified securities only: debt / cash lines and
+        Unclassified holdings are not a sector.
+        """
+        exposures, _ = self.exposures(holdings)
+        if exposures.empty:
+            return pd.DataFrame(columns=["pan", "level", "name", "sector", "weight", "via_funds"])
+        sectored = exposures[~exposures["symbol"].isin(self.unlisted) & (exposures["sector"] != UNCLASSIFIED)]
+        by_sector = (sectored.groupby(["pan", "sector"], as_index=False, sort=False)[["direct", "via_funds"]].sum()
+                     .assign(name=lambda df: df["sector"], level="sector"))
+        rows = pd.concat([exposures.assign(level="security"), by_sector], ignore_index=True)
+        totals = holdings.groupby("pan")["total_value"].sum()
+        rows["weight"] = (rows["direct"] + rows["via_funds"]) / rows["pan"].map(totals).where(lambda t: t > 0)
+        return rows.dropna(subset=["weight"])[["pan", "level", "name", "sector", "weight", "via_funds"]]
+
+def summarize(exposures, unmatched, holdings, top=25):
+    """Per-PAN report: top securities, every sector, overlaps and fund coverage."""
+    totals = holdings.groupby("pan", sort=False)["total_value"].sum()
+    fund_values = holdings[holdings["category"] == "Mutual Funds"].groupby("pan")["total_value"].sum()
+    unmatched_values = unmatched.groupby("pan")["total_value"].sum()
+    unmatched_names = unmatched.groupby("pan")["name"].unique()
+
+    def weighted(frame):
+        frame = frame.assign(total=frame["direct"] + frame["via_funds"])
+        total = frame["pan"].map(totals)
+        frame["weight_pct"] = np.where(total > 0, frame["total"] / total.where(total > 0, 1) * 100, 0.0)
+        frame = frame.sort_values(["pan", "total"], ascending=[True, False], kind="stable")
+        return frame.round({"direct": 2, "via_funds": 2, "total": 2, "weight_pct": 2})
+
+    securities = weighted(exposures)
+    sectors = weighted(exposures.groupby(["pan", "sector"], as_index=False, sort=False)[["direct", "via_funds"]].sum())
+    sections = {
+        "securities": securities.groupby("pan", sort=False).head(top),
+        "sectors": sectors,
+        "overlap": securities[(securities["direct"] > 0) & (securities["via_funds"] > 0)],
+    }
+    looked_through = exposures.groupby("pan")["via_funds"].sum()
+
+    reports = {}
+    for pan, total in totals.items():
+        fund_value = float(fund_values.get(pan, 0))
+        reports[pan] = {
+            "total_value": round(float(total), 2),
+            "fund_value": round(fund_value, 2),
+            "looked_through_value": round(float(looked_through.get(pan, 0)), 2),
+            "fund_coverage_pct": round((1 - float(unmatched_values.get(pan, 0)) / fund_value) * 100, 2)
+                                 if fund_value > 0 else None,
+            "unmatched_funds": list(unmatched_names.get(pan, [])),
+            "securities": [], "sectors": [], "overlap": [],
+        }
+    for section, frame in sections.items():
+        for row in frame.to_dict(orient="records"):
+            reports[row.pop("pan")][section].append(row)
+    return reports
+
+_lookthrough = None
+
+def get_lookthrough():
+    """Load the disclosure matrix once per process."""
+    global _lookthrough
+    if _lookthrough is None:
+        disclosures = load_disclosures()
+        if disclosures.empty:
+            print(f"No portfolio disclosures under {PORTFOLIO_DISCLOSURE_DIR}; look-through rules are skipped")
+        _lookthrough = LookThrough(disclosures)
+    return _lookthrough
+
+def lookthrough_exposure(holdings):
+    """Exposure weights for the look-through rules, or None when no disclosures are loaded."""
+    lookthrough = get_lookthrough()
+    if lookthrough.shape[0] == 0:
+        return None
+    return lookthrough.exposure_weights(holdings)
+
+def lookthrough(portfolio_data, pan="", top=25):
+    """Look-through report for a single valued portfolio."""
+    return lookthrough_bulk({pan: portfolio_data}, top)[pan]
+
+def lookthrough_bulk(portfolios, top=25):
+    """Look-through reports for many valued portfolios ({pan: portfolio}) in one product."""
+    holdings = pd.concat([holdings_frame(p).assign(pan=pan) for pan, p in portfolios.items()], ignore_index=True)
+    exposures, unmatched = get_lookthrough().exposures(holdings)
+    return summarize(exposures, unmatched, holdings, top)
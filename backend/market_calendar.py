@@ -0,0 +1,99 @@
+# market_calendar.py
+
+import datetime
+import json
+import os
+
+IST = datetime.timezone(datetime.timedelta(hours=5, minutes=30))
+
+# NSE equity session (IST)
+SESSION_OPEN = datetime.time(9, 15)
+SESSION_CLOSE = datetime.time(15, 30)
+
+# AMFI publishes the day's NAVs in NAVAll.txt by 11 PM IST on business days
+AMFI_PUBLISH_TIME = datetime.time(23, 0)
+
+# Exchange holidays: a JSON list of "YYYY-MM-DD" dates from the NSE holiday circular
+NSE_HOLIDAYS_FILE = os.environ.get(
+    "NSE_HOLIDAYS_FILE", os.path.join(os.path.dirname(__file__), "nse_holidays.json"))
+
+def load_holidays(path=NSE_HOLIDAYS_FILE):
+    """
+    Holiday dates from the file. A missing file, or one with no dates for the current
+    year, is reported at startup: the calendar would treat those holidays as sessions.
+    """
+    if not os.path.exists(path):
+        print(f"WARNING: NSE holiday file {path} not found; every weekday is treated as a trading day")
+        return set()
+    with open(path) as f:
+        holidays = {datetime.date.fromisoformat(day) for day in json.load(f)}
+    year = datetime.datetime.now(IST).year
+    if not any(day.year == year for day in holidays):
+        print(f"WARNING: {path} lists no NSE holidays for {year}; add them from the NSE holiday circular")
+    return holidays
+
+HOLIDAYS = load_holidays()
+
+def now_ist():
+    return datetime.datetime.now(IST)
+
+def to_ist(timestamp):
+    return datetime.datetime.fromtimestamp(timestamp, IST)
+
+def is_trading_day(day):
+    return day.weekday() < 5 and day not in HOLIDAYS
+
+def is_market_open(now=None):
+    now = now or now_ist()
+    return is_trading_day(now.date()) and SESSION_OPEN <= now.time() < SESSION_CLOSE
+
+def previous_trading_day(day):
+    day -= datetime.timedelta(days=1)
+    while not is_trading_day(day):
+        day -= datetime.timedelta(days=1)
+    return day
+
+def next_trading_day(day):
+    day += datetime.timedelta(days=1)
+    while not is_trading_day(day):
+        day += datetime.timedelta(days=1)
+    return day
+
+def last_session_close(now=None):
+    """Close of the most recent session that ended at or before now."""
+    now = now or now_ist()
+    day = now.date()
+    if not (is_trading_day(day) and now.time() >= SESSION_CLOSE):
+        day = previous_trading_day(day)
+    return datetime.datetime.combine(day, SESSION_CLOSE, IST)
+
+def next_session_open(now=None):
+    """Open of the next session that starts after now."""
+    now = now or now_ist()
+    day = now.date()
+    if not (is_trading_day(day) and now.time() < SESSION_OPEN):
+        day = next_trading_day(day)
+    return datetime.datetime.combine(day, SESSION_OPEN, IST)
+
+def last_amfi_publish(now=None):
+    """Time the most recent NAVAll.txt was due to be published."""
+    now = now or now_ist()
+    day = now.date()
+    if not (is_trading_day(day) and now.time() >= AMFI_PUBLISH_TIME):
+        day = previous_trading_day(day)
+    return datetime.datetime.combine(day, AMFI_PUBLISH_TIME, IST)
+
+def quote_is_fresh(fetched_at, ttl, now=None):
+    """
+    A quote is fresh within its TTL, and for the whole time the market stays closed
+    once it was fetched after the last session close (prices cannot move until the next open).
+    """
+    now = now or now_ist()
+    if now.timestamp() - fetched_at < ttl:
+        return True
+    return not is_market_open(now) and fetched_at >= last_session_close(now).timestamp()
+
+def amfi_is_fresh(fetched_at, ttl, now=None):
+    """The NAV file is fresh within its TTL or if fetched after the last publish."""
+    now = now or now_ist()
+    return now.timestamp() - fetched_at < ttl or fetched_at >= last_amfi_publish(now).timestamp()
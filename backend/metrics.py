@@ -0,0 +1,165 @@
+# metrics.py
+#
+# Minimal Prometheus-style instrumentation. Metrics are rendered in the text exposition
+# format on /metrics. With METRICS_ENABLED=0 every timer is a shared no-op context and
+# nothing is recorded.
+
+import os
+import threading
+import time
+from contextlib import nullcontext
+
+from flask import Response, g, request
+from flask.json.provider import DefaultJSONProvider
+
+METRICS_ENABLED = os.environ.get("METRICS_ENABLED", "1") == "1"
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+_registry = []
+_noop = nullcontext()
+
+def _format_labels(names, values, extra=""):
+    pairs = [f'{name}="{value}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+class Counter:
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.values = {}
+        self.lock = threading.Lock()
+        _registry.append(self)
+
+    def inc(self, amount=1, **labels):
+        if not METRICS_ENABLED:
+            return
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self.lock:
+            for key, value in sorted(self.values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {value}")
+        return lines
+
+class Histogram:
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self.values = {}  # labels -> [bucket counts..., sum, count]
+        self.lock = threading.Lock()
+        _registry.append(self)
+
+    def observe(self, value, **labels):
+        if not METRICS_ENABLED:
+            return
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        with self.lock:
+            series = self.values.get(key)
+            if series is None:
+                series = self.values[key] = [0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+                    break
+            series[-2] += value
+            series[-1] += 1
+
+    def time(self, **labels):
+        """Context manager recording the elapsed time of its block."""
+        if not METRICS_ENABLED:
+            return _noop
+        return _Timer(self, labels)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self.lock:
+            for key, series in sorted(self.values.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets, series):
+                    cumulative += count
+                    bucket_labels = _format_labels(self.labelnames, key, f'le="{bound}"')
+                    lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+                bucket_labels = _format_labels(self.labelnames, key, 'le="+Inf"')
+                lines.append(f"{self.name}_bucket{bucket_labels} {series[-1]}")
+                lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {series[-2]}")
+                lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {series[-1]}")
+        return lines
+
+class _Timer:
+    __slots__ = ("histogram", "labels", "start")
+
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.start, **self.labels)
+        return False
+
+def render_metrics():
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+# --------------------------
+# Backend metrics
+# --------------------------
+UPSTREAM_SECONDS = Histogram(
+    "invest360_upstream_request_seconds", "Latency of upstream data provider calls", ("provider", "operation"))
+CACHE_REQUESTS = Counter(
+    "invest360_cache_requests_total", "Cache lookups by cache and result (hit/miss)", ("cache", "result"))
+STAGE_SECONDS = Histogram(
+    "invest360_stage_seconds", "Latency of internal processing stages", ("stage",))
+REQUEST_SECONDS = Histogram(
+    "invest360_http_request_seconds", "End-to-end request latency", ("endpoint", "method", "status"))
+
+def cache_lookup(cache, hit):
+    CACHE_REQUESTS.inc(cache=cache, result="hit" if hit else "miss")
+
+def upstream(provider, operation):
+    return UPSTREAM_SECONDS.time(provider=provider, operation=operation)
+
+def stage(name):
+    return STAGE_SECONDS.time(stage=name)
+
+def init_app(app):
+    """Register request timing, timed JSON serialization and the /metrics endpoint on a Flask app."""
+    @app.route("/metrics", methods=["GET"])
+    def metrics():
+        return Response(render_metrics(), mimetype="text/plain; version=0.0.4")
+
+    if not METRICS_ENABLED:
+        return
+
+    class TimedJSONProvider(DefaultJSONProvider):
+        def dumps(self, obj, **kwargs):
+            with STAGE_SECONDS.time(stage="serialize"):
+                return super().dumps(obj, **kwargs)
+
+    app.json = TimedJSONProvider(app)
+
+    @app.before_request
+    def start_timer():
+        g.metrics_start = time.perf_counter()
+
+    @app.after_request
+    def record_request(response):
+        start = g.pop("metrics_start", None)
+        if start is not None:
+            REQUEST_SECONDS.observe(time.perf_counter() - start, endpoint=request.endpoint or "unknown",
+                                    method=request.method, status=response.status_code)
+        return response
@@ -0,0 +1,177 @@
+# model_export.py
+#
+# Exports the models trained by /predict (server.run_prediction) into plain NumPy arrays
+# that inference.py evaluates without TensorFlow or scikit-learn:
+#
+#   stacking pipeline  median imputer -> standard scaler -> StackingRegressor over
+#                      RandomForest / GradientBoosting / SVR (RBF) / Ridge with a
+#                      LinearRegression on top
+#   LSTM               MinMaxScaler -> LSTM(128) -> LSTM(64) -> Dense(32, relu) -> Dense(1)
+#
+# Trees are packed into flat node arrays (one set per ensemble) so a whole forest is
+# walked level by level for a batch at once. Dense weight matrices can be stored as
+# float16 or int8 (per-column symmetric scales); tree thresholds are kept exact.
+#
+#     python model_export.py RELIANCE.NS --period 63 --quantize float16
+
+import argparse
+import os
+import time
+
+import numpy as np
+
+MODEL_DIR = os.environ.get("MODEL_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "models"))
+FORMAT_VERSION = 1
+QUANTIZE_MODES = ("float32", "float16", "int8")
+
+def model_path(stock, prediction_period, model_dir=MODEL_DIR):
+    safe = "".join(c if c.isalnum() or c in "._-" else "_" for c in stock.upper())
+    return os.path.join(model_dir, f"{safe}_{int(prediction_period)}.npz")
+
+def pack_trees(trees, arrays, prefix):
+    """
+    Concatenate fitted sklearn trees (their tree_ objects) into flat arrays. Child indices
+    are offset into the flat layout; leaves point to themselves so a fixed number of
+    steps (the deepest tree's depth) walks every tree to its leaf.
+    """
+    lefts, rights, features, thresholds, values, roots = [], [], [], [], [], []
+    offset = 0
+    depth = 0
+    for tree in trees:
+        t = tree.tree_
+        n = t.node_count
+        nodes = np.arange(n) + offset
+        leaf = t.children_left == -1
+        lefts.append(np.where(leaf, nodes, t.children_left + offset))
+        rights.append(np.where(leaf, nodes, t.children_right + offset))
+        features.append(np.where(leaf, 0, t.feature))
+        thresholds.append(t.threshold)
+        values.append(t.value.reshape(n, -1)[:, 0])
+        roots.append(offset)
+        depth = max(depth, t.max_depth)
+        offset += n
+    arrays[f"{prefix}_left"] = np.concatenate(lefts).astype(np.int32)
+    arrays[f"{prefix}_right"] = np.concatenate(rights).astype(np.int32)
+    arrays[f"{prefix}_feature"] = np.concatenate(features).astype(np.int32)
+    arrays[f"{prefix}_threshold"] = np.concatenate(thresholds).astype(np.float64)
+    arrays[f"{prefix}_value"] = np.concatenate(values).astype(np.float64)
+    arrays[f"{prefix}_roots"] = np.array(roots, dtype=np.int32)
+    arrays[f"{prefix}_depth"] = np.array(depth)
+
+def store_matrix(arrays, name, matrix, quantize):
+    """Store a weight matrix, optionally as float16 or int8 with per-column scales."""
+    matrix = np.asarray(matrix, dtype=np.float32)
+    if quantize == "float16":
+        arrays[name] = matrix.astype(np.float16)
+    elif quantize == "int8":
+        scale = np.abs(matrix).max(axis=0, keepdims=True) / 127
+        scale[scale == 0] = 1
+        arrays[name] = np.round(matrix / scale).astype(np.int8)
+        arrays[f"{name}__scale"] = scale.astype(np.float32)
+    else:
+        arrays[name] = matrix
+
+def export_stacking(pipeline, arrays, quantize):
+    imputer = pipeline.named_steps["imputer"]
+    scaler = pipeline.named_steps["scaler"]
+    stacking = pipeline.named_steps["stacking"]
+    if getattr(stacking, "passthrough", False):
+        raise ValueError("Stacking with passthrough features is not supported")
+    arrays["impute"] = imputer.statistics_.astype(np.float64)
+    arrays["scale_mean"] = scaler.mean_.astype(np.float64)
+    arrays["scale_std"] = scaler.scale_.astype(np.float64)
+
+    rf, gbr, svr, ridge = stacking.estimators_
+    pack_trees(rf.estimators_, arrays, "rf")
+
+    pack_trees(gbr.estimators_[:, 0], arrays, "gbr")
+    init = getattr(gbr.init_, "constant_", 0.0) if gbr.init_ != "zero" else 0.0
+    arrays["gbr_init"] = np.array(float(np.ravel(init)[0]))
+    arrays["gbr_rate"] = np.array(float(gbr.learning_rate))
+
+    if svr.kernel != "rbf":
+        raise ValueError(f"Unsupported SVR kernel: {svr.kernel}")
+    store_matrix(arrays, "svr_vectors", svr.support_vectors_, quantize)
+    arrays["svr_dual"] = svr.dual_coef_.ravel().astype(np.float64)
+    arrays["svr_intercept"] = np.array(float(np.ravel(svr.intercept_)[0]))
+    arrays["svr_gamma"] = np.array(float(svr._gamma))
+
+    arrays["ridge_coef"] = np.ravel(ridge.coef_).astype(np.float64)
+    arrays["ridge_intercept"] = np.array(float(np.ravel(ridge.intercept_)[0]))
+
+    final = stacking.final_estimator_
+    arrays["final_coef"] = np.ravel(final.coef_).astype(np.float64)
+    arrays["final_intercept"] = np.array(float(np.ravel(final.intercept_)[0]))
+
+def export_lstm(lstm_model, lstm_scaler, arrays, quantize):
+    """Keras LSTM / Dense weights (gate order i, f, c, o); Dropout layers are inert at inference."""
+    arrays["minmax_scale"] = lstm_scaler.scale_.astype(np.float64)
+    arrays["minmax_min"] = lstm_scaler.min_.astype(np.float64)
+    lstm_layers = dense_layers = 0
+    for layer in lstm_model.layers:
+        kind = type(layer).__name__
+        weights = layer.get_weights()
+        if kind == "LSTM":
+            config = layer.get_config()
+            if config.get("activation") != "tanh" or config.get("recurrent_activation") != "sigmoid":
+                raise ValueError("Only tanh / sigmoid LSTM layers are supported")
+            kernel, recurrent, bias = weights
+            store_matrix(arrays, f"lstm{lstm_layers}_kernel", kernel, quantize)
+            store_matrix(arrays, f"lstm{lstm_layers}_recurrent", recurrent, quantize)
+            arrays[f"lstm{lstm_layers}_bias"] = bias.astype(np.float32)
+            lstm_layers += 1
+        elif kind == "Dense":
+            kernel, bias = weights
+            store_matrix(arrays, f"dense{dense_layers}_kernel", kernel, quantize)
+            arrays[f"dense{dense_layers}_bias"] = bias.astype(np.float32)
+            arrays[f"dense{dense_layers}_relu"] = np.array(layer.get_config().get("activation") == "relu")
+            dense_layers += 1
+        elif kind != "Dropout":
+            raise ValueError(f"Unsupported layer in LSTM model: {kind}")
+    arrays["lstm_layers"] = np.array(lstm_layers)
+    arrays["dense_layers"] = np.array(dense_layers)
+
+def export_models(stock, prediction_period, features, pipeline, lstm_model, lstm_scaler,
+                  quantize="float32", model_dir=MODEL_DIR, latest_row=None):
+    """
+    Write the fitted /predict models for a stock to MODEL_DIR; returns the file path.
+    latest_row, the feature row the models were last evaluated on, is stored with them so
+    a freshly loaded export can be served without rebuilding features from the history.
+    """
+    if quantize not in QUANTIZE_MODES:
+        raise ValueError(f"quantize must be one of {QUANTIZE_MODES}")
+    arrays = {
+        "format_version": np.array(FORMAT_VERSION),
+        "features": np.array(features),
+        "stock": np.array(stock),
+        "prediction_period": np.array(int(prediction_period)),
+        "exported_at": np.array(time.time()),
+    }
+    if latest_row is not None:
+        arrays["latest_row"] = np.asarray(latest_row, dtype=np.float64)
+    export_stacking(pipeline, arrays, quantize)
+    export_lstm(lstm_model, lstm_scaler, arrays, quantize)
+
+    os.makedirs(model_dir, exist_ok=True)
+    path = model_path(stock, prediction_period, model_dir)
+    tmp = path + ".tmp.npz"
+    np.savez_compressed(tmp, **arrays)
+    os.replace(tmp, path)  # Readers never see a half-written model
+    return path
+
+def main():
+    parser = argparse.ArgumentParser(description="Train the /predict models for a stock and export them for inference.py")
+    parser.add_argument("stock")
+    parser.add_argument("--period", type=int, default=63)
+    parser.add_argument("--quantize", choices=QUANTIZE_MODES, default="float32")
+    args = parser.parse_args()
+
+    os.environ.setdefault("REFRESH_SCHEDULER", "0")
+    os.environ["MODEL_QUANTIZE"] = args.quantize
+    from server import run_prediction
+
+    result, status = run_prediction(args.stock, args.period, retrain=True)
+    print(result if status != 200 else f"Exported {model_path(args.stock, args.period)}: {result}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,159 @@
+# nse_snapshots.py
+#
+# Bulk quote ingestion from NSE snapshot endpoints. One /api/equity-stockIndices call
+# returns every constituent of an index and one /api/etf call every listed ETF, so a
+# refresh prices hundreds of symbols per upstream request instead of one quote-equity
+# call per symbol. Snapshots feed the per-process SnapshotBook that server.py reads and,
+# through price_refresher.py, the shared price table.
+#
+# Sample payloads in the NSE response shapes live in fixtures/ (nse_etf_snapshot.json,
+# nse_index_NIFTY_50.json) for offline runs.
+
+import json
+import os
+import threading
+import time
+
+import pandas as pd
+
+from market_calendar import quote_is_fresh
+from resilience import get_upstream
+
+NSE_BASE_URL = os.environ.get("NSE_BASE_URL", "https://www.nseindia.com")  # fault_stub.py for local drills
+# NSE only answers API calls that look like they come from a browser
+NSE_HEADERS = {
+    "User-Agent": ("Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
+                   "AppleWebKit/537.36 (KHTML, like Gecko) "
+                   "Chrome/115.0.0.0 Safari/537.36"),
+    "Accept": "application/json, text/plain, */*",
+    "Accept-Language": "en-US,en;q=0.9",
+    "Referer": "https://www.nseindia.com/",
+    "Connection": "keep-alive",
+}
+
+# Indices whose constituents are ingested, comma separated (NIFTY 500 covers most holdings)
+SNAPSHOT_INDICES = [name.strip() for name in os.environ.get("NSE_SNAPSHOT_INDICES", "NIFTY 500").split(",")
+                    if name.strip()]
+SNAPSHOT_TTL = 60  # seconds, matches server.CACHE_EXPIRATION
+REFRESH_BACKOFF_CAP = 900  # seconds between refresh attempts while every source keeps failing
+ETF_PATH = "/api/etf"
+INDEX_PATH = "/api/equity-stockIndices"
+PRICE_FIELDS = ("lastPrice", "ltP", "ltp")  # Index rows use lastPrice, the ETF list ltP
+
+def snapshot_sources(indices=SNAPSHOT_INDICES):
+    """(name, path, params) of every snapshot request in one refresh."""
+    return [("etf", ETF_PATH, {})] + [(index, INDEX_PATH, {"index": index}) for index in indices]
+
+def parse_snapshot(payload):
+    """
+    Prices from a snapshot payload as a Series indexed by NSE symbol. The index row of an
+    index snapshot (its symbol is the index name) and rows without a price are dropped.
+    """
+    rows = pd.DataFrame(payload.get("data") or [])
+    if rows.empty or "symbol" not in rows:
+        return pd.Series(dtype=float)
+    field = next((f for f in PRICE_FIELDS if f in rows), None)
+    if field is None:
+        return pd.Series(dtype=float)
+    prices = pd.to_numeric(rows[field].astype(str).str.replace(",", "", regex=False), errors="coerce")
+    symbols = rows["symbol"].astype(str).str.strip().str.upper()
+    keep = prices.notna() & (prices > 0) & (symbols != str(payload.get("name", "")).upper())
+    if "priority" in rows:
+        keep &= pd.to_numeric(rows["priority"], errors="coerce").fillna(0) == 0
+    series = pd.Series(prices[keep].round(2).to_numpy(), index=symbols[keep].to_numpy())
+    return series[~series.index.duplicated(keep="first")]
+
+class SnapshotBook:
+    """
+    Latest snapshot prices for this process. fetch(path, params) returns a decoded
+    payload. A stale book is refreshed by one caller while the others keep reading the
+    previous prices; a failed source keeps its last known prices, but price() only serves
+    a price while it is fresh. When every source fails, request-time refreshes back off
+    exponentially (from ttl up to REFRESH_BACKOFF_CAP) instead of retrying on each call.
+    """
+
+    def __init__(self, fetch, indices=SNAPSHOT_INDICES, ttl=SNAPSHOT_TTL, max_age=None):
+        self.fetch = fetch
+        self.sources = snapshot_sources(indices)
+        self.ttl = ttl
+        self.max_age = max_age if max_age is not None else 2 * ttl  # One missed refresh allowed
+        self.prices = {}  # symbol -> (price, time its snapshot was fetched)
+        self.fetched_at = 0
+        self.errors = {}
+        self.failures = 0  # Consecutive refreshes in which every source failed
+        self.retry_at = 0
+        self.lock = threading.Lock()
+
+    def refresh(self, force=False):
+        """Pull every snapshot source; returns the number of symbols priced."""
+        if not self.lock.acquire(blocking=not self.prices):
+            return len(self.prices)  # Another thread is refreshing; serve the current book
+        try:
+            if not force and self.prices and quote_is_fresh(self.fetched_at, self.ttl):
+                return len(self.prices)
+            prices = dict(self.prices)
+            errors = {}
+            for name, path, params in self.sources:
+                try:
+                    snapshot = parse_snapshot(self.fetch(path, params))
+                    fetched_at = time.time()
+                    prices.update(zip(snapshot.index, zip(snapshot.to_numpy().tolist(), [fetched_at] * len(snapshot))))
+                except Exception as e:
+                    errors[name] = str(e)
+            self.prices = prices  # Swapped in whole; readers never see a partial refresh
+            self.errors = errors
+            if len(errors) == len(self.sources):
+                self.failures += 1
+                self.retry_at = time.time() + min(REFRESH_BACKOFF_CAP, self.ttl * 2 ** (self.failures - 1))
+            else:
+                self.failures = 0
+                self.retry_at = 0
+                self.fetched_at = time.time()
+            return len(prices)
+        finally:
+            self.lock.release()
+
+    def price(self, symbol):
+        """A symbol's snapshot price, or None when it is not in the book or no longer fresh."""
+        if not quote_is_fresh(self.fetched_at, self.ttl) and time.time() >= self.retry_at:
+            self.refresh()
+        entry = self.prices.get(symbol.upper())
+        if entry is None or not quote_is_fresh(entry[1], self.max_age):
+            return None
+        return entry[0]
+
+    def ingest(self, table, symbols=None):
+        """
+        Write the book (or just `symbols`) into a shared price table with the time each
+        price was fetched, so prices kept from a failed source stay visibly old. Returns
+        the count written.
+        """
+        prices = self.prices
+        written = 0
+        for symbol in symbols if symbols is not None else list(prices):
+            entry = prices.get(symbol)
+            if entry is not None:
+                table.write(symbol, entry[0], entry[1])
+                written += 1
+        return written
+
+def nse_fetch(session, base_url=NSE_BASE_URL):
+    """A fetch function calling NSE through `session` behind the "nse" upstream guard."""
+    def fetch(path, params):
+        def get():
+            response = session.get(base_url + path, params=params, timeout=15)
+            response.raise_for_status()
+            return response.json()
+        return get_upstream("nse").call(get, operation="snapshot")
+    return fetch
+
+def fixture_fetch(fixtures_dir):
+    """A fetch function serving the snapshot payloads in fixtures_dir, for offline runs."""
+    def fetch(path, params):
+        if path == ETF_PATH:
+            filename = "nse_etf_snapshot.json"
+        else:
+            filename = "nse_index_" + params["index"].replace(" ", "_") + ".json"
+        with open(os.path.join(fixtures_dir, filename)) as f:
+            return json.load(f)
+    return fetch
@@ -0,0 +1,92 @@
+# price_refresher.py
+#
+# Single writer for the shared price table. Run one per host next to the web workers:
+#
+#     PRICE_TABLE_NAME=invest360_prices python price_refresher.py
+#     PRICE_TABLE_NAME=invest360_prices gunicorn -w 8 server:app
+#
+# Every symbol held in any portfolio (plus PRICE_TABLE_SYMBOLS, comma separated) is
+# refreshed once per cycle, so upstream traffic does not grow with the number of workers.
+# Symbols covered by the NSE index / ETF snapshots (nse_snapshots.py) are priced from a
+# few bulk requests; only the rest go into one batched Yahoo Finance download.
+
+import os
+import signal
+import time
+
+import requests
+
+from data import user_portfolios
+from holdings import etf_symbol
+from market_calendar import is_market_open, last_session_close
+from nse_snapshots import NSE_HEADERS, SnapshotBook, nse_fetch
+from screener import fetch_close_panel
+from shared_prices import SharedPriceTable
+
+REFRESH_INTERVAL = 60  # seconds, matches server.CACHE_EXPIRATION
+
+def nse_symbol(name):
+    return name.replace(" ", "").upper()
+
+def tracked_symbols():
+    """NSE symbols of every stock and ETF held in any portfolio."""
+    symbols = set(filter(None, os.environ.get("PRICE_TABLE_SYMBOLS", "").split(",")))
+    for portfolio in user_portfolios.values():
+        assets = portfolio["assets"]
+        for item in assets.get("Stocks", {}).get("holdings", []):
+            symbols.add(nse_symbol(item["name"]))
+        for item in assets.get("ETF", {}).get("holdings", []):
+            symbols.add(etf_symbol(item) or "")
+    symbols.discard("")
+    return sorted(symbols)
+
+def refresh(table, symbols, book=None):
+    """
+    Publish the latest price of every symbol: snapshot prices from `book` first, then one
+    Yahoo Finance download for the symbols no snapshot covers.
+    """
+    written = 0
+    if book is not None:
+        book.refresh(force=True)
+        written = book.ingest(table, symbols)
+        symbols = [s for s in symbols if s not in book.prices]
+    if not symbols:
+        return written
+    close = fetch_close_panel([s + ".NS" for s in symbols], period="5d")
+    if close.empty:
+        return written
+    latest = close.ffill().iloc[-1]
+    fetched_at = time.time()
+    for yahoo_symbol, price in latest.dropna().items():
+        table.write(yahoo_symbol[:-len(".NS")], round(float(price), 2), fetched_at)
+        written += 1
+    return written
+
+def stop(signum, frame):
+    raise KeyboardInterrupt
+
+def main():
+    table = SharedPriceTable.create()
+    session = requests.Session()
+    session.headers.update(NSE_HEADERS)
+    book = SnapshotBook(nse_fetch(session))
+    signal.signal(signal.SIGTERM, stop)
+    last_refresh = 0
+    try:
+        while True:
+            # While the market is closed one refresh after the close is enough
+            if is_market_open() or last_refresh < last_session_close().timestamp():
+                try:
+                    written = refresh(table, tracked_symbols(), book)
+                    last_refresh = time.time()
+                    print(f"Refreshed {written} prices")
+                except Exception as e:
+                    print(f"Error refreshing shared prices: {e}")
+            time.sleep(REFRESH_INTERVAL)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        table.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,159 @@
+# price_stream.py
+
+import copy
+import queue
+import threading
+import time
+
+POLL_INTERVAL = 15  # seconds between polls of each subscribed instrument
+
+# Field that holds the live price for each market-priced category
+PRICE_FIELDS = {"Stocks": "price_per_share", "Mutual Funds": "nav", "ETF": "price_per_unit"}
+QUANTITY_FIELDS = {"Stocks": "quantity", "Mutual Funds": "units", "ETF": "quantity"}
+
+def instrument_key(category, item):
+    """Identifier of the market instrument behind a holding, e.g. ("Stocks", "TCS")."""
+    if category == "ETF":
+        return (category, item.get("symbol") or item["type"])
+    return (category, item["name"])
+
+class Subscription:
+    def __init__(self, instruments):
+        self.instruments = set(instruments)
+        self.queue = queue.Queue()
+
+class PriceHub:
+    """
+    One shared poller for all streaming clients. Each distinct instrument is fetched
+    once per POLL_INTERVAL no matter how many subscribers hold it, and only changed
+    prices are fanned out to the subscribers of that instrument.
+    """
+
+    def __init__(self, fetch_price, interval=POLL_INTERVAL):
+        self.fetch_price = fetch_price  # callable(instrument_key) -> price or None
+        self.interval = interval
+        self.subscribers = {}  # instrument -> set of Subscription
+        self.prices = {}  # instrument -> last published price
+        self.lock = threading.Lock()
+        self.thread = None
+
+    def subscribe(self, instruments, initial_prices=None):
+        sub = Subscription(instruments)
+        with self.lock:
+            for instrument in sub.instruments:
+                self.subscribers.setdefault(instrument, set()).add(sub)
+                known = initial_prices.get(instrument) if initial_prices else None
+                if instrument not in self.prices:
+                    if known is not None:
+                        self.prices[instrument] = known
+                elif self.prices[instrument] != known:
+                    sub.queue.put((instrument, self.prices[instrument]))  # Client's snapshot is behind the hub
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = threading.Thread(target=self._run, name="price-hub", daemon=True)
+                self.thread.start()
+        return sub
+
+    def unsubscribe(self, sub):
+        with self.lock:
+            for instrument in sub.instruments:
+                subs = self.subscribers.get(instrument)
+                if subs:
+                    subs.discard(sub)
+                    if not subs:
+                        del self.subscribers[instrument]
+                        self.prices.pop(instrument, None)
+
+    def poll_once(self):
+        """Fetch every subscribed instrument once and publish the ones whose price moved."""
+        with self.lock:
+            instruments = list(self.subscribers)
+
+        for instrument in instruments:
+            try:
+                price = self.fetch_price(instrument)
+            except Exception as e:
+                print(f"Error polling {instrument}: {e}")
+                continue
+            if price is None:
+                continue
+
+            with self.lock:
+                if self.prices.get(instrument) == price:
+                    continue
+                self.prices[instrument] = price
+                subs = list(self.subscribers.get(instrument, ()))
+            for sub in subs:
+                sub.queue.put((instrument, price))
+
+    def _run(self):
+        while True:
+            with self.lock:
+                if not self.subscribers:
+                    self.thread = None
+                    return
+            started = time.time()
+            self.poll_once()
+            time.sleep(max(self.interval - (time.time() - started), 0))
+
+class PortfolioStream:
+    """
+    Per-client view of a valued portfolio that applies price updates and reports
+    only the fields that changed.
+    """
+
+    def __init__(self, portfolio):
+        self.portfolio = copy.deepcopy(portfolio)
+        self.index = {}  # instrument -> [(category, position)]
+        for category, details in self.portfolio["assets"].items():
+            if category not in PRICE_FIELDS:
+                continue
+            for position, item in enumerate(details["holdings"]):
+                self.index.setdefault(instrument_key(category, item), []).append((category, position))
+
+    def instruments(self):
+        return list(self.index)
+
+    def current_prices(self):
+        prices = {}
+        for instrument, positions in self.index.items():
+            category, position = positions[0]
+            prices[instrument] = self.portfolio["assets"][category]["holdings"][position].get(PRICE_FIELDS[category])
+        return prices
+
+    def apply(self, updates):
+        """Apply {instrument: price} and return the delta, or None if nothing changed."""
+        assets = self.portfolio["assets"]
+        delta = {"holdings": [], "categories": {}}
+        touched = set()
+
+        for instrument, price in updates.items():
+            for category, position in self.index.get(instrument, ()):
+                item = assets[category]["holdings"][position]
+                if item.get(PRICE_FIELDS[category]) == price:
+                    continue
+                old_value = item.get("total_value", 0)
+                item[PRICE_FIELDS[category]] = price
+                item["total_value"] = item[QUANTITY_FIELDS[category]] * price
+                assets[category]["total_value"] = assets[category].get("total_value", 0) + item["total_value"] - old_value
+                self.portfolio["total_portfolio_value"] += item["total_value"] - old_value
+                touched.add((category, position))
+                delta["holdings"].append({
+                    "category": category, "index": position,
+                    PRICE_FIELDS[category]: price, "total_value": round(item["total_value"], 2)})
+                delta["categories"][category] = round(assets[category]["total_value"], 2)
+
+        if not touched:
+            return None
+
+        # A price move shifts every allocation; send only the ones whose rounded value changed
+        total = self.portfolio["total_portfolio_value"]
+        delta["allocations"] = []
+        if total > 0:
+            for category, details in assets.items():
+                for position, item in enumerate(details["holdings"]):
+                    allocation = f"{(item['total_value'] / total) * 100:.2f}%"
+                    if item.get("allocation") != allocation:
+                        item["allocation"] = allocation
+                        delta["allocations"].append({"category": category, "index": position, "allocation": allocation})
+        delta["total_portfolio_value"] = round(total, 2)
+        return delta
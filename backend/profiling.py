@@ -0,0 +1,170 @@
+# profiling.py
+#
+# On-demand profiling for the Flask app, usable on a live server without a restart.
+# Everything is gated by PROFILE_TOKEN; with no token configured the hooks are inert.
+#
+# Single request: send "X-Profile: <token>". The request runs under cProfile and the
+# stats are written to PROFILE_DIR; the file name is returned in the X-Profile-File
+# response header. Open it with `python -m pstats` or snakeviz. The token is only read
+# from headers, so it never lands in access logs or proxy caches with the URL.
+#
+# Sampling: POST /profiling/sampling {"enabled": true, "interval": 0.05} starts a
+# background thread that samples the stack of every thread serving a request and
+# aggregates them per endpoint in folded format ("frame;frame;frame count"), which
+# flamegraph.pl and speedscope read directly. GET /profiling/flamegraph?endpoint=...
+# returns the aggregate.
+
+import cProfile
+import hmac
+import os
+import sys
+import threading
+import time
+from collections import Counter
+
+from flask import Response, g, jsonify, request
+
+PROFILE_TOKEN = os.environ.get("PROFILE_TOKEN", "")
+PROFILE_DIR = os.environ.get("PROFILE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "profiles"))
+
+DEFAULT_SAMPLE_INTERVAL = 0.05  # seconds, ~20 samples per second per busy thread
+MIN_SAMPLE_INTERVAL = 0.005
+MAX_STACK_DEPTH = 64
+
+def is_admin(token):
+    return bool(PROFILE_TOKEN) and bool(token) and hmac.compare_digest(token, PROFILE_TOKEN)
+
+def request_token():
+    return request.headers.get("X-Profile")
+
+def admin_token():
+    return request.headers.get("X-Profile-Token") or request.headers.get("X-Profile")
+
+class StackSampler:
+    """Periodically samples the stacks of threads that are serving a request."""
+
+    def __init__(self):
+        self.active = {}  # thread id -> endpoint, maintained by the request hooks
+        self.stacks = {}  # endpoint -> Counter of folded stacks
+        self.samples = 0
+        self.interval = DEFAULT_SAMPLE_INTERVAL
+        self.enabled = False
+        self.started_at = None
+        self.lock = threading.Lock()
+        self.thread = None
+
+    def enter(self, endpoint):
+        self.active[threading.get_ident()] = endpoint
+
+    def exit(self):
+        self.active.pop(threading.get_ident(), None)
+
+    def start(self, interval=DEFAULT_SAMPLE_INTERVAL):
+        self.interval = max(float(interval), MIN_SAMPLE_INTERVAL)
+        if self.enabled:
+            return
+        self.enabled = True
+        self.started_at = time.time()
+        self.thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.enabled = False
+        self.thread = None
+
+    def reset(self):
+        with self.lock:
+            self.stacks = {}
+            self.samples = 0
+
+    def sample_once(self):
+        frames = sys._current_frames()
+        with self.lock:
+            for ident, endpoint in list(self.active.items()):
+                frame = frames.get(ident)
+                if frame is None:
+                    continue
+                stack = []
+                while frame is not None and len(stack) < MAX_STACK_DEPTH:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                    frame = frame.f_back
+                self.stacks.setdefault(endpoint, Counter())[";".join(reversed(stack))] += 1
+                self.samples += 1
+
+    def _run(self):
+        # A stop/start pair replaces self.thread, which retires the previous sampler
+        while self.enabled and self.thread is threading.current_thread():
+            self.sample_once()
+            time.sleep(self.interval)
+
+    def folded(self, endpoint=None):
+        with self.lock:
+            selected = [endpoint] if endpoint else sorted(self.stacks)
+            lines = []
+            for name in selected:
+                for stack, count in self.stacks.get(name, Counter()).most_common():
+                    # Prefix the endpoint so several endpoints can share one flame graph
+                    lines.append(f"{name};{stack} {count}")
+        return "\n".join(lines) + "\n"
+
+    def status(self):
+        with self.lock:
+            endpoints = {name: sum(counter.values()) for name, counter in self.stacks.items()}
+        return {"enabled": self.enabled, "interval": self.interval, "started_at": self.started_at,
+                "samples": self.samples, "endpoints": endpoints}
+
+sampler = StackSampler()
+
+def save_profile(profiler, endpoint):
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    filename = f"{endpoint}-{time.strftime('%Y%m%d-%H%M%S')}-{threading.get_ident() % 100000}.prof"
+    profiler.dump_stats(os.path.join(PROFILE_DIR, filename))
+    return filename
+
+def init_app(app):
+    """Register the per-request profiler, the stack sampler hooks and the /profiling endpoints."""
+
+    @app.before_request
+    def start_profiling():
+        endpoint = request.endpoint or "unknown"
+        if sampler.enabled:
+            sampler.enter(endpoint)
+        if is_admin(request_token()):
+            g.profiler = cProfile.Profile()
+            g.profiler.enable()
+
+    @app.after_request
+    def stop_profiling(response):
+        profiler = g.pop("profiler", None)
+        if profiler is not None:
+            profiler.disable()
+            try:
+                response.headers["X-Profile-File"] = save_profile(profiler, request.endpoint or "unknown")
+            except OSError as e:
+                print(f"Error saving profile: {e}")
+        return response
+
+    @app.teardown_request
+    def leave_sampler(exc):
+        sampler.exit()
+
+    @app.route("/profiling/sampling", methods=["GET", "POST"])
+    def profiling_sampling():
+        if not is_admin(admin_token()):
+            return jsonify({"error": "Forbidden"}), 403
+        if request.method == "POST":
+            body = request.get_json(silent=True) or {}
+            if body.get("reset"):
+                sampler.reset()
+            if body.get("enabled") is True:
+                sampler.start(body.get("interval", DEFAULT_SAMPLE_INTERVAL))
+            elif body.get("enabled") is False:
+                sampler.stop()
+        return jsonify(sampler.status())
+
+    @app.route("/profiling/flamegraph", methods=["GET"])
+    def profiling_flamegraph():
+        if not is_admin(admin_token()):
+            return jsonify({"error": "Forbidden"}), 403
+        return Response(sampler.folded(request.args.get("endpoint")), mimetype="text/plain")
@@ -0,0 +1,212 @@
+# rebalance.py
+#
+# Turns a target basket (the allocation keys produced by /calculate-baskets) into a trade
+# list for a valued portfolio. Trades are minimum turnover: only over-weight buckets are
+# sold and only under-weight buckets are bought. Fixed income cannot be redeemed before
+# maturity, so an over-weight deposit bucket is held and the other buckets share the rest.
+
+import math
+
+import numpy as np
+
+from holdings import FIXED_INCOME_CATEGORIES, holding_name
+
+# Basket keys from dynamic_allocation -> portfolio categories
+BASKET_CATEGORIES = {
+    "stocks": ("Stocks",),
+    "mutualFunds": ("Mutual Funds",),
+    "ETFs": ("ETF",),
+    "FDs": ("Fixed Deposits", "Recurring Deposits"),
+    "govtSchemes": ("Government Schemes",),
+}
+CATEGORY_BUCKET = {category: bucket for bucket, categories in BASKET_CATEGORIES.items() for category in categories}
+BUCKETS = list(BASKET_CATEGORIES)
+
+# Smallest tradable quantity per category; deposits are bought in rupee steps
+LOT_SIZES = {"Stocks": 1, "ETF": 1, "Mutual Funds": 0.001}
+DEPOSIT_STEP = 1000
+MIN_TRADE_AMOUNT = 500
+
+UNIT_PRICE_FIELDS = {"Stocks": "price_per_share", "Mutual Funds": "nav", "ETF": "price_per_unit"}
+UNIT_FIELDS = {"Stocks": "quantity", "Mutual Funds": "units", "ETF": "quantity"}
+
+def tradable_lines(portfolio):
+    """One row per holding: (bucket, category, name, units, price, value, lot, locked)."""
+    lines = []
+    for category, details in portfolio["assets"].items():
+        bucket = CATEGORY_BUCKET.get(category)
+        if bucket is None:
+            continue
+        for item in details["holdings"]:
+            value = item.get("total_value", 0) or 0
+            locked = category in FIXED_INCOME_CATEGORIES
+            if locked:
+                units, price, lot = value, 1.0, DEPOSIT_STEP
+            else:
+                units = item.get(UNIT_FIELDS[category], 0)
+                price = item.get(UNIT_PRICE_FIELDS[category]) or 0
+                lot = LOT_SIZES[category]
+            lines.append([bucket, category, holding_name(category, item), units, price, value, lot, locked])
+    return lines
+
+def bucket_targets(current, weights, cash, locked):
+    """
+    Target value per bucket. Locked buckets already above target keep their value and
+    the remaining wealth is split over the other buckets by weight (water filling).
+    """
+    total = current.sum() + cash
+    pinned = np.zeros(len(current), dtype=bool)
+    targets = weights * total
+    for _ in range(len(current)):
+        over = locked & ~pinned & (current > targets)
+        if not over.any():
+            break
+        pinned |= over
+        free_weight = weights[~pinned].sum()
+        remaining = total - current[pinned].sum()
+        targets = np.where(pinned, current, weights * remaining / free_weight if free_weight > 0 else 0)
+    return targets, pinned
+
+def round_to_lots(amounts, prices, lots, held_units):
+    """Units per trade rounded toward zero to the lot size; sells never exceed the units held."""
+    lot_cost = prices * lots
+    with np.errstate(divide="ignore", invalid="ignore"):
+        lots_traded = np.where(lot_cost > 0, np.trunc(amounts / lot_cost), 0)
+    max_sell = np.floor(held_units / lots + 1e-9)
+    return np.maximum(lots_traded, -max_sell)
+
+def fit_to_budget(lots_traded, desired, lot_cost, budget):
+    """
+    Greedy cash repair on buy lines: trim the largest buys while they exceed the budget,
+    then spend what is left on the lines furthest below their desired amount.
+    """
+    buys = lots_traded > 0
+    spent = float((lots_traded[buys] * lot_cost[buys]).sum())
+
+    for i in np.argsort(-(lots_traded * lot_cost)):
+        if spent <= budget + 1e-6:
+            break
+        if lots_traded[i] <= 0:
+            continue
+        cut = min(lots_traded[i], math.ceil((spent - budget) / lot_cost[i]))
+        lots_traded[i] -= cut
+        spent -= cut * lot_cost[i]
+
+    shortfall = np.where(desired > 0, desired - np.maximum(lots_traded, 0) * lot_cost, 0)
+    for i in np.argsort(-shortfall):
+        left = budget - spent
+        if shortfall[i] <= 0 or left <= 0:
+            break
+        extra = min(math.floor(shortfall[i] / lot_cost[i] + 0.5), math.floor(left / lot_cost[i]))
+        if extra > 0:
+            lots_traded[i] += extra
+            spent += extra * lot_cost[i]
+    return lots_traded, spent
+
+def allocation(values, total):
+    return {bucket: round(float(v / total * 100), 2) if total > 0 else 0.0 for bucket, v in zip(BUCKETS, values)}
+
+def rebalance(portfolio, target, cash=0.0, min_trade=MIN_TRADE_AMOUNT):
+    """
+    Trade list that moves a valued portfolio towards a target basket ({bucket: percent},
+    see BASKET_CATEGORIES) using existing holdings and at most `cash` in new money.
+    """
+    weights = np.array([max(float(target.get(bucket, 0)), 0.0) for bucket in BUCKETS])
+    if weights.sum() <= 0:
+        raise ValueError("Target allocation must have a positive weight")
+    weights = weights / weights.sum()
+
+    lines = tradable_lines(portfolio)
+    bucket_index = {bucket: i for i, bucket in enumerate(BUCKETS)}
+    # Buckets with nothing tradable get a placeholder line for new money, priced per rupee:
+    # no instrument is chosen yet, so its trade is an amount with no units or price
+    placeholders = set()
+    for bucket, categories in BASKET_CATEGORIES.items():
+        if not any(line[0] == bucket and not line[7] for line in lines) and weights[bucket_index[bucket]] > 0:
+            category = categories[0]
+            locked = category in FIXED_INCOME_CATEGORIES
+            placeholders.add(len(lines))
+            lines.append([bucket, category, f"New {category}", 0.0, 1.0, 0.0,
+                          DEPOSIT_STEP if locked else 1.0, False])
+
+    buckets = np.array([bucket_index[line[0]] for line in lines], dtype=int)
+    units = np.array([line[3] for line in lines], dtype=float)
+    prices = np.array([line[4] for line in lines], dtype=float)
+    values = np.array([line[5] for line in lines], dtype=float)
+    lots = np.array([line[6] for line in lines], dtype=float)
+    locked_line = np.array([line[7] for line in lines], dtype=bool)
+
+    current = np.bincount(buckets, weights=values, minlength=len(BUCKETS))
+    tradable_value = np.bincount(buckets, weights=np.where(locked_line, 0, values), minlength=len(BUCKETS))
+    tradable_count = np.bincount(buckets, weights=(~locked_line).astype(float), minlength=len(BUCKETS))
+    locked_bucket = tradable_value <= 0  # Only deposits (or nothing) held: cannot be sold down
+    locked_bucket &= np.bincount(buckets, weights=locked_line.astype(float), minlength=len(BUCKETS)) > 0
+
+    targets, pinned = bucket_targets(current, weights, cash, locked_bucket)
+    delta = targets - current
+
+    # Spread each bucket's change over its tradable lines, pro rata to value (evenly for new lines)
+    share = np.where(tradable_value[buckets] > 0, values / np.where(tradable_value[buckets] > 0, tradable_value[buckets], 1),
+                     1 / np.maximum(tradable_count[buckets], 1))
+    desired = np.where(locked_line, 0.0, delta[buckets] * share)
+    desired = np.where((desired < 0) & locked_bucket[buckets], 0.0, desired)
+    desired = np.where(np.abs(desired) < min_trade, 0.0, desired)
+
+    lot_cost = prices * lots
+    lots_traded = round_to_lots(desired, prices, lots, units)
+    proceeds = float(-(np.minimum(lots_traded, 0) * lot_cost).sum())
+    lots_traded, spent = fit_to_budget(lots_traded, desired, lot_cost, proceeds + cash)
+
+    amounts = lots_traded * lot_cost
+    amounts = np.where(np.abs(amounts) < min_trade, 0.0, amounts)  # Drop lines rounding left too small
+    lots_traded = np.where(amounts == 0, 0, lots_traded)
+    proceeds = float(-amounts[amounts < 0].sum())
+    spent = float(amounts[amounts > 0].sum())
+
+    after = current + np.bincount(buckets, weights=amounts, minlength=len(BUCKETS))
+    trades = []
+    for i in np.flatnonzero(amounts).tolist():
+        placeholder = i in placeholders
+        trades.append({
+            "bucket": lines[i][0],
+            "category": lines[i][1],
+            "name": lines[i][2],
+            "action": "BUY" if amounts[i] > 0 else "SELL",
+            "units": None if placeholder else round(float(abs(lots_traded[i] * lots[i])), 3),
+            "price": None if placeholder else round(float(prices[i]), 2),
+            "amount": round(float(abs(amounts[i])), 2),
+        })
+
+    total_before = current.sum()
+    total_after = after.sum() + (cash + proceeds - spent)
+    return {
+        "target": allocation(weights, 1.0),
+        "current": allocation(current, total_before),
+        "after": allocation(after, after.sum()),
+        "held_buckets": [BUCKETS[i] for i in np.flatnonzero(pinned)],
+        "trades": trades,
+        "turnover": round(float(np.abs(amounts).sum()), 2),
+        "sell_proceeds": round(proceeds, 2),
+        "buy_amount": round(spent, 2),
+        "cash_left": round(float(cash + proceeds - spent), 2),
+        "total_value_after": round(float(total_after), 2),
+    }
+
+def rebalance_bulk(portfolios, targets, cash=None, min_trade=MIN_TRADE_AMOUNT):
+    """
+    Rebalance many portfolios. portfolios is {pan: valued portfolio}; targets and cash are
+    either one value for everyone or {pan: value}. Failures are reported per PAN.
+    """
+    cash = cash or {}
+    per_pan = not any(bucket in targets for bucket in BUCKETS)  # A single target is keyed by bucket
+    results, errors = {}, {}
+    for pan, portfolio in portfolios.items():
+        target = targets.get(pan) if per_pan else targets
+        try:
+            if target is None:
+                raise ValueError("No target allocation")
+            pan_cash = cash.get(pan, 0.0) if isinstance(cash, dict) else cash
+            results[pan] = rebalance(portfolio, target, float(pan_cash), min_trade)
+        except Exception as e:
+            errors[pan] = str(e)
+    return results, errors
@@ -0,0 +1,405 @@
+# resilience.py
+#
+# Guards around upstream data providers (Yahoo Finance, NSE, AMFI). Every call goes
+# through a provider's Upstream:
+#
+#   - a circuit breaker that fails fast (to the caller's fallback, usually the last
+#     known value) after repeated failures, and lets one probe through after a cool-off
+#   - an optional hedged duplicate request, sent when the first has not answered within
+#     the provider's observed p95 latency; the first successful answer wins. Both attempts
+#     run on a bounded pool; when it is full the call runs unhedged on the caller's thread
+#   - retries with jittered exponential backoff instead of fixed sleeps
+#   - a token-bucket rate budget per provider, kept in a small file-backed table so all
+#     gunicorn workers on a host draw from the same budget
+#
+# Upstream.acall is the same for coroutine functions (server_async.py), with the hedge as a
+# second task and waits that do not block the event loop.
+#
+# fault_stub.py serves NSE-style quotes with injectable latency and errors for exercising
+# all of this locally.
+
+import asyncio
+import fcntl
+import os
+import random
+import tempfile
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import numpy as np
+
+from metrics import Counter, upstream
+
+RATE_BUDGET_FILE = os.environ.get(
+    "RATE_BUDGET_FILE", os.path.join(tempfile.gettempdir(), "invest360_rate_budget"))
+HEDGE_WORKERS = int(os.environ.get("HEDGE_WORKERS", "32"))
+
+# provider -> requests per second, burst size
+RATE_BUDGETS = {
+    "yfinance": (5.0, 20),
+    "nse": (3.0, 10),
+    "amfi": (1.0, 2),
+    "yahoo_search": (5.0, 10),
+}
+FAILURE_THRESHOLD = 5  # Consecutive failures that open a breaker
+RESET_TIMEOUT = 30  # seconds an open breaker waits before letting a probe through
+RATE_WAIT = 2.0  # seconds a call may wait for a token before it is refused
+BACKOFF_BASE = 0.5
+BACKOFF_CAP = 8.0
+LATENCY_WINDOW = 200  # Recent successful latencies kept per provider
+MIN_HEDGE_SAMPLES = 20
+DEFAULT_HEDGE_DELAY = 1.0
+
+UPSTREAM_EVENTS = Counter(
+    "invest360_upstream_events_total",
+    "Upstream resilience events by provider (retry, hedge, hedge_win, fallback, short_circuit, rate_limited, open)",
+    ("provider", "event"))
+
+class UpstreamUnavailable(Exception):
+    """Raised when a breaker is open or the rate budget is exhausted and there is no fallback."""
+
+def backoff_delay(attempt, base=BACKOFF_BASE, cap=BACKOFF_CAP):
+    """Full-jitter exponential backoff: uniform over [0, min(cap, base * 2^attempt)]."""
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+class CircuitBreaker:
+    """Closed -> open after `threshold` consecutive failures -> half-open after `reset_timeout`."""
+
+    def __init__(self, threshold=FAILURE_THRESHOLD, reset_timeout=RESET_TIMEOUT):
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self.probing = False
+        self.lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return "closed"
+        return "half_open" if time.time() - self.opened_at >= self.reset_timeout else "open"
+
+    def allow(self):
+        """Whether a call may go out; in half-open state only one probe at a time."""
+        with self.lock:
+            state = self.state
+            if state == "closed":
+                return True
+            if state == "half_open" and not self.probing:
+                self.probing = True
+                return True
+            return False
+
+    def record_success(self):
+        with self.lock:
+            self.failures = 0
+            self.opened_at = None
+            self.probing = False
+
+    def record_failure(self):
+        """Count a failure; returns True when this failure opened the breaker."""
+        with self.lock:
+            self.failures += 1
+            was_open = self.opened_at is not None
+            if self.probing or self.failures >= self.threshold:
+                self.opened_at = time.time()
+            self.probing = False
+            return self.opened_at is not None and not was_open
+
+    def release_probe(self):
+        """Give back a half-open probe slot that was never used."""
+        with self.lock:
+            self.probing = False
+
+class LatencyWindow:
+    """Recent successful call latencies, for the hedging delay."""
+
+    def __init__(self, size=LATENCY_WINDOW):
+        self.samples = deque(maxlen=size)
+
+    def add(self, seconds):
+        self.samples.append(seconds)
+
+    def percentile(self, q, default=DEFAULT_HEDGE_DELAY):
+        if len(self.samples) < MIN_HEDGE_SAMPLES:
+            return default
+        return float(np.percentile(np.fromiter(self.samples, float, len(self.samples)), q))
+
+class SharedRateBudget:
+    """
+    Token buckets for all providers in one small file: per provider (tokens, last refill).
+    Every worker opens the same file and updates it under an exclusive flock, so the budget
+    holds per host rather than per process. Uses an in-process table when path is None or
+    the file cannot be opened.
+    """
+
+    def __init__(self, budgets=RATE_BUDGETS, path=RATE_BUDGET_FILE):
+        self.providers = list(budgets)
+        self.rates = np.array([budgets[p][0] for p in self.providers])
+        self.bursts = np.array([budgets[p][1] for p in self.providers], dtype=float)
+        self.lock = threading.Lock()
+        self.fd = None
+        try:
+            if path is not None:
+                self.fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+                size = len(self.providers) * 2 * 8
+                with self._file_lock():
+                    if os.fstat(self.fd).st_size != size:
+                        os.ftruncate(self.fd, size)
+                        os.pwrite(self.fd, self._pack(self.bursts, np.full(len(self.providers), time.time())), 0)
+        except OSError as e:
+            print(f"Shared rate budget unavailable, using a per-process budget: {e}")
+            self.fd = None
+        self.local = np.column_stack([self.bursts, np.full(len(self.providers), time.time())])
+
+    @staticmethod
+    def _pack(tokens, refilled):
+        return np.column_stack([tokens, refilled]).astype(np.float64).tobytes()
+
+    @contextmanager
+    def _file_lock(self):
+        fcntl.flock(self.fd, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(self.fd, fcntl.LOCK_UN)
+
+    def _take(self, i, now):
+        """Refill and try to take one token; returns seconds until a token is available (0 if taken)."""
+        with self.lock:
+            if self.fd is None:
+                return self._take_from(self.local, i, now)
+            with self._file_lock():
+                state = np.frombuffer(os.pread(self.fd, len(self.providers) * 16, 0), dtype=np.float64)
+                state = state.reshape(len(self.providers), 2).copy()
+                wait_for = self._take_from(state, i, now)
+                os.pwrite(self.fd, state[i].tobytes(), i * 16)
+                return wait_for
+
+    def _take_from(self, state, i, now):
+        tokens = min(self.bursts[i], state[i, 0] + max(now - state[i, 1], 0) * self.rates[i])
+        state[i, 1] = now
+        if tokens >= 1:
+            state[i, 0] = tokens - 1
+            return 0.0
+        state[i, 0] = tokens
+        return (1 - tokens) / self.rates[i]
+
+    def acquire(self, provider, timeout=RATE_WAIT):
+        """Take a token for a provider, waiting up to `timeout` seconds. Unknown providers are unlimited."""
+        if provider not in self.providers:
+            return True
+        i = self.providers.index(provider)
+        deadline = time.time() + timeout
+        while True:
+            now = time.time()
+            wait_for = self._take(i, now)
+            if wait_for == 0:
+                return True
+            if now + wait_for > deadline:
+                return False
+            time.sleep(wait_for)
+
+    async def acquire_async(self, provider, timeout=RATE_WAIT):
+        """acquire() for event loops: waits for a token with asyncio.sleep."""
+        if provider not in self.providers:
+            return True
+        i = self.providers.index(provider)
+        deadline = time.time() + timeout
+        while True:
+            now = time.time()
+            wait_for = self._take(i, now)
+            if wait_for == 0:
+                return True
+            if now + wait_for > deadline:
+                return False
+            await asyncio.sleep(wait_for)
+
+_hedge_executor = ThreadPoolExecutor(max_workers=HEDGE_WORKERS, thread_name_prefix="hedge")
+_hedge_slots = threading.BoundedSemaphore(HEDGE_WORKERS)  # Never queue an attempt behind a busy pool
+
+class Upstream:
+    """Breaker, latency window, retries and hedging for one provider."""
+
+    def __init__(self, provider, budget=None, threshold=FAILURE_THRESHOLD, reset_timeout=RESET_TIMEOUT):
+        self.provider = provider
+        self.breaker = CircuitBreaker(threshold, reset_timeout)
+        self.latency = LatencyWindow()
+        self.budget = budget
+
+    def _timed(self, func, args, operation):
+        start = time.perf_counter()
+        with upstream(self.provider, operation):
+            result = func(*args)
+        self.latency.add(time.perf_counter() - start)
+        return result
+
+    def _submit(self, func, args, operation):
+        """Start an attempt on the hedge pool, or return None when every pool thread is busy."""
+        if not _hedge_slots.acquire(blocking=False):
+            return None
+        future = _hedge_executor.submit(self._timed, func, args, operation)
+        future.add_done_callback(lambda _: _hedge_slots.release())
+        return future
+
+    def _hedged(self, func, args, operation):
+        """
+        Send the call, and a duplicate if no answer arrives within the p95 latency; the
+        first successful answer is returned and the other attempt is left to finish.
+        """
+        first = self._submit(func, args, operation)
+        if first is None:
+            return self._timed(func, args, operation)  # Pool saturated: no hedging
+        done, _ = wait([first], timeout=self.latency.percentile(95))
+        if done or not self._acquire(timeout=0):
+            return first.result()
+        second = self._submit(func, args, operation)
+        if second is None:
+            return first.result()
+
+        UPSTREAM_EVENTS.inc(provider=self.provider, event="hedge")
+        pending = {first, second}
+        error = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    if future is second:
+                        UPSTREAM_EVENTS.inc(provider=self.provider, event="hedge_win")
+                    return future.result()
+                error = future.exception()
+        raise error
+
+    def _acquire(self, timeout=RATE_WAIT):
+        return self.budget is None or self.budget.acquire(self.provider, timeout)
+
+    def call(self, func, *args, operation="request", retries=0, hedge=False, fallback=None):
+        """
+        Run func(*args) against the provider. On an open breaker, an exhausted rate budget
+        or after the last failed retry, return fallback() if given, else raise.
+        """
+        error = None
+        for attempt in range(retries + 1):
+            if not self.breaker.allow():
+                UPSTREAM_EVENTS.inc(provider=self.provider, event="short_circuit")
+                error = error or UpstreamUnavailable(f"{self.provider} circuit is open")
+                break
+            if not self._acquire():
+                UPSTREAM_EVENTS.inc(provider=self.provider, event="rate_limited")
+                self.breaker.release_probe()  # A refused call does not count against the provider
+                error = UpstreamUnavailable(f"{self.provider} rate budget exhausted")
+                break
+            try:
+                result = self._hedged(func, args, operation) if hedge else self._timed(func, args, operation)
+                self.breaker.record_success()
+                return result
+            except Exception as e:
+                error = e
+                if self.breaker.record_failure():
+                    UPSTREAM_EVENTS.inc(provider=self.provider, event="open")
+            if attempt < retries:
+                UPSTREAM_EVENTS.inc(provider=self.provider, event="retry")
+                time.sleep(backoff_delay(attempt))
+
+        if fallback is not None:
+            UPSTREAM_EVENTS.inc(provider=self.provider, event="fallback")
+            print(f"{self.provider} call failed, using fallback: {error}")
+            return fallback()
+        raise error
+
+    async def _timed_async(self, func, args, operation):
+        start = time.perf_counter()
+        with upstream(self.provider, operation):
+            result = await func(*args)
+        self.latency.add(time.perf_counter() - start)
+        return result
+
+    async def _hedged_async(self, func, args, operation):
+        """Send the call, and a duplicate if no answer arrives within the p95 latency; the loser is cancelled."""
+        first = asyncio.ensure_future(self._timed_async(func, args, operation))
+        done, _ = await asyncio.wait({first}, timeout=self.latency.percentile(95))
+        if done or not await self._acquire_async(timeout=0):
+            return await first
+
+        UPSTREAM_EVENTS.inc(provider=self.provider, event="hedge")
+        second = asyncio.ensure_future(self._timed_async(func, args, operation))
+        pending = {first, second}
+        error = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is second:
+                            UPSTREAM_EVENTS.inc(provider=self.provider, event="hedge_win")
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def _acquire_async(self, timeout=RATE_WAIT):
+        return self.budget is None or await self.budget.acquire_async(self.provider, timeout)
+
+    async def acall(self, func, *args, operation="request", retries=0, hedge=False, fallback=None):
+        """call() for a coroutine function: await func(*args) under the same breaker, budget and retries."""
+        error = None
+        for attempt in range(retries + 1):
+            if not self.breaker.allow():
+                UPSTREAM_EVENTS.inc(provider=self.provider, event="short_circuit")
+                error = error or UpstreamUnavailable(f"{self.provider} circuit is open")
+                break
+            if not await self._acquire_async():
+                UPSTREAM_EVENTS.inc(provider=self.provider, event="rate_limited")
+                self.breaker.release_probe()
+                error = UpstreamUnavailable(f"{self.provider} rate budget exhausted")
+                break
+            try:
+                if hedge:
+                    result = await self._hedged_async(func, args, operation)
+                else:
+                    result = await self._timed_async(func, args, operation)
+                self.breaker.record_success()
+                return result
+            except Exception as e:
+                error = e
+                if self.breaker.record_failure():
+                    UPSTREAM_EVENTS.inc(provider=self.provider, event="open")
+            if attempt < retries:
+                UPSTREAM_EVENTS.inc(provider=self.provider, event="retry")
+                await asyncio.sleep(backoff_delay(attempt))
+
+        if fallback is not None:
+            UPSTREAM_EVENTS.inc(provider=self.provider, event="fallback")
+            print(f"{self.provider} call failed, using fallback: {error}")
+            return fallback()
+        raise error
+
+    def status(self):
+        p95 = self.latency.percentile(95, default=None)
+        return {
+            "state": self.breaker.state,
+            "consecutive_failures": self.breaker.failures,
+            "p95_seconds": round(p95, 4) if p95 is not None else None,
+        }
+
+_budget = None
+_upstreams = {}
+_registry_lock = threading.Lock()
+
+def get_upstream(provider):
+    """The process-wide Upstream for a provider, sharing the host-wide rate budget."""
+    global _budget
+    with _registry_lock:
+        if provider not in _upstreams:
+            if _budget is None:
+                _budget = SharedRateBudget()
+            _upstreams[provider] = Upstream(provider, _budget)
+        return _upstreams[provider]
+
+def upstream_status():
+    return {provider: guard.status() for provider, guard in _upstreams.items()}
@@ -0,0 +1,226 @@
+# returns.py
+#
+# Money-weighted (XIRR) and time-weighted returns for holdings with irregular cash flows.
+#
+# Cash flows come from an optional "transactions" list on each holding:
+#   {"date": "YYYY-MM-DD", "units": 10, "price": 1520.5}   priced buy (negative units: sell)
+#   {"date": "YYYY-MM-DD", "amount": 25000}                 amount invested (negative: withdrawn)
+# Fixed income holdings without transactions get their schedule from investment /
+# monthly_deposit, duration and "start_date" (today if missing), ending at maturity.
+#
+# All holdings are padded into one (holdings x flows) matrix and solved together.
+
+import datetime
+from functools import lru_cache
+
+import numpy as np
+
+from holdings import FIXED_INCOME_CATEGORIES, holding_name
+
+DAYS_PER_YEAR = 365.0
+NEWTON_ITERATIONS = 50
+BISECTION_ITERATIONS = 100
+RATE_BOUNDS = (-0.9999, 100.0)  # -99.99% to +10000% a year
+TOLERANCE = 1e-9
+
+def to_day(date):
+    return np.datetime64(date, "D").astype(np.int64)
+
+@lru_cache(maxsize=4096)
+def monthly_schedule(start, months):
+    """Day numbers of the same day-of-month over consecutive months (clipped to month end)."""
+    month_starts = np.datetime64(start, "M") + np.arange(months + 1)
+    month_ends = (month_starts + 1).astype("datetime64[D]") - 1
+    days = np.minimum(month_starts.astype("datetime64[D]") + (start.day - 1), month_ends).astype(np.int64)
+    days.flags.writeable = False  # Shared between holdings through the cache
+    return days
+
+def holding_flows(category, item, today):
+    """
+    Dated cash flows (day numbers, amounts) of one holding from the investor's side: money
+    in is negative and the closing value is a final positive flow. Also returns the
+    holding value just before each flow (NaN where unknown), which the time-weighted
+    return needs.
+    """
+    value = item.get("total_value", 0) or 0
+    transactions = item.get("transactions")
+
+    if transactions:
+        days, amounts, values_before = [], [], []
+        units_held = 0.0
+        for txn in sorted(transactions, key=lambda t: t["date"]):
+            days.append(to_day(datetime.date.fromisoformat(txn["date"])))
+            if "price" in txn:
+                amounts.append(-txn["units"] * txn["price"])
+                values_before.append(units_held * txn["price"])
+                units_held += txn["units"]
+            else:
+                amounts.append(-txn["amount"])
+                values_before.append(np.nan)
+        days.append(to_day(today))
+        amounts.append(value)
+        values_before.append(value)
+        return np.array(days, dtype=np.int64), np.array(amounts, dtype=float), np.array(values_before, dtype=float)
+
+    if category not in FIXED_INCOME_CATEGORIES or not item.get("duration"):
+        return None
+
+    # Fixed income is held to maturity: deposits on schedule, maturity value at the end
+    start = datetime.date.fromisoformat(item["start_date"]) if item.get("start_date") else today
+    schedule = monthly_schedule(start, item["duration"])
+    if category == "Recurring Deposits":
+        days = schedule
+        amounts = np.full(len(schedule), -float(item["monthly_deposit"]))
+    else:
+        days = schedule[[0, -1]]
+        amounts = np.array([-float(item["investment"]), 0.0])
+    amounts[-1] = value
+    # Value before the first deposit is zero; interim accrued values are not tracked
+    values_before = np.full(len(days), np.nan)
+    values_before[0] = 0.0
+    values_before[-1] = value if len(days) == 2 else np.nan
+    return days, amounts, values_before
+
+def pad_flows(flow_lists):
+    """Pack per-holding (days, amounts) arrays into (holdings x flows) amount and year-fraction matrices."""
+    lengths = np.array([len(days) for days, _ in flow_lists], dtype=int)
+    width = max(int(lengths.max()), 1) if len(lengths) else 1
+    rows = np.repeat(np.arange(len(flow_lists)), lengths)
+    cols = np.arange(lengths.sum()) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+
+    amounts = np.zeros((len(flow_lists), width))
+    times = np.zeros((len(flow_lists), width))
+    amounts[rows, cols] = np.concatenate([a for _, a in flow_lists])
+    times[rows, cols] = np.concatenate([d for d, _ in flow_lists])
+    first = times[:, 0].copy()
+    times = np.where(amounts != 0, (times - first[:, None]) / DAYS_PER_YEAR, 0.0)
+    return amounts, times
+
+def npv(rates, amounts, times):
+    discount = (1 + rates[:, None]) ** -times
+    return (amounts * discount).sum(axis=1)
+
+def xirr(amounts, times):
+    """
+    Annual internal rate of return for every row of (amounts, times) at once. Newton's
+    method runs on all rows together; rows where it diverges or leaves the rate bounds
+    are solved by bisection. Rows without both signs of cash flow return NaN.
+    """
+    n = amounts.shape[0]
+    solvable = (amounts > 0).any(axis=1) & (amounts < 0).any(axis=1)
+    scale = np.abs(amounts).sum(axis=1) + 1e-12
+    lo_bound, hi_bound = RATE_BOUNDS
+
+    rates = np.full(n, 0.1)
+    converged = np.zeros(n, dtype=bool)
+    for _ in range(NEWTON_ITERATIONS):
+        active = solvable & ~converged
+        if not active.any():
+            break
+        r, a, t = rates[active], amounts[active], times[active]
+        discount = (1 + r[:, None]) ** -t
+        f = (a * discount).sum(axis=1)
+        df = (-t * a * discount / (1 + r[:, None])).sum(axis=1)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            step = np.where(df != 0, f / df, np.nan)
+        r_new = r - step
+        ok = np.isfinite(r_new) & (r_new > lo_bound) & (r_new < hi_bound)
+        rates[active] = np.where(ok, r_new, np.nan)
+        converged[active] = ok & (np.abs(f) / scale[active] < TOLERANCE)
+        # Rows that left the bounds stop here and go to bisection
+        solvable[np.flatnonzero(active)[~ok]] = False
+
+    # Bracketing fallback for everything Newton did not settle
+    fallback = (amounts > 0).any(axis=1) & (amounts < 0).any(axis=1) & ~converged
+    if fallback.any():
+        a, t = amounts[fallback], times[fallback]
+        lo = np.full(len(a), lo_bound)
+        hi = np.full(len(a), hi_bound)
+        f_lo = npv(lo, a, t)
+        bracketed = np.sign(f_lo) != np.sign(npv(hi, a, t))
+        for _ in range(BISECTION_ITERATIONS):
+            mid = (lo + hi) / 2
+            f_mid = npv(mid, a, t)
+            left = np.sign(f_mid) == np.sign(f_lo)
+            lo = np.where(left, mid, lo)
+            f_lo = np.where(left, f_mid, f_lo)
+            hi = np.where(left, hi, mid)
+        rates[fallback] = np.where(bracketed, (lo + hi) / 2, np.nan)
+
+    rates[~((amounts > 0).any(axis=1) & (amounts < 0).any(axis=1))] = np.nan
+    return rates
+
+def time_weighted(values_before, amounts):
+    """
+    Cumulative time-weighted return per row. values_before[i, k] is the holding value just
+    before flow k and amounts[i, k] the flow (investor side, so money in is negative).
+    Sub-period returns are chained; rows with an unknown value (NaN) return NaN.
+    """
+    start = values_before[:, :-1] - amounts[:, :-1]  # Value right after each flow
+    end = values_before[:, 1:]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        growth = np.where(start > 0, end / start, np.where(np.isnan(start), np.nan, 1.0))
+    return np.prod(growth, axis=1) - 1
+
+def holding_returns(portfolio, today=None):
+    """XIRR and TWR for every holding with cash flows, plus a portfolio XIRR over all flows."""
+    today = today or datetime.date.today()
+    keys, flow_lists, value_lists = [], [], []
+    for category, details in portfolio["assets"].items():
+        for item in details["holdings"]:
+            flows = holding_flows(category, item, today)
+            if flows is not None:
+                keys.append((category, holding_name(category, item)))
+                flow_lists.append(flows[:2])
+                value_lists.append(flows[2])
+    if not flow_lists:
+        return {"holdings": [], "portfolio": None}
+
+    amounts, times = pad_flows(flow_lists)
+    rates = xirr(amounts, times)
+
+    # Pad each row by repeating its final value with no flow, so padding adds no sub-period
+    width = amounts.shape[1]
+    lengths = np.array([len(v) for v in value_lists])
+    padding = np.arange(width)[None, :] >= lengths[:, None]
+    values = np.zeros((len(lengths), width))
+    values[~padding] = np.concatenate(value_lists)
+    last = values[np.arange(len(lengths)), lengths - 1]
+    values = np.where(padding, last[:, None], values)
+    twr = time_weighted(values, amounts)
+    years = times.max(axis=1)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        twr_annual = np.where(years >= 1, (1 + twr) ** (1 / np.where(years > 0, years, 1)) - 1, np.nan)
+
+    invested = -np.where(amounts < 0, amounts, 0).sum(axis=1)
+    final_value = amounts[np.arange(len(lengths)), lengths - 1]
+    first_flow = np.array([days[0] for days, _ in flow_lists]).astype("datetime64[D]").astype(str)
+
+    def percents(x):
+        return [None if np.isnan(v) else v for v in np.round(x * 100, 2).tolist()]
+
+    columns = zip(np.round(invested, 2).tolist(), np.round(final_value, 2).tolist(), first_flow.tolist(),
+                  percents(rates), percents(twr), percents(twr_annual))
+    results = [{
+        "category": category,
+        "name": name,
+        "invested": inv,
+        "final_value": final,
+        "first_flow": first,
+        "xirr": x,
+        "twr": t,
+        "twr_annualized": ta,
+    } for (category, name), (inv, final, first, x, t, ta) in zip(keys, columns)]
+
+    # Portfolio XIRR: every holding's flows on one timeline (fixed income to maturity)
+    all_days = np.concatenate([d for d, _ in flow_lists])
+    all_amounts = np.concatenate([a for _, a in flow_lists])
+    order = np.argsort(all_days, kind="stable")
+    p_amounts, p_times = pad_flows([(all_days[order], all_amounts[order])])
+    return {
+        "holdings": results,
+        "portfolio": {
+            "invested": round(float(invested.sum()), 2),
+            "xirr": percents(xirr(p_amounts, p_times))[0],
+        },
+    }
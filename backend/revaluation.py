@@ -0,0 +1,158 @@
+# revaluation.py
+#
+# Incremental portfolio valuation. A PortfolioValuation keeps, per PAN, which holdings
+# each market instrument drives and the price they were last valued at, so a refresh
+# only rewrites the holdings whose instrument moved. Category totals are re-summed from
+# a flat value array and only the allocation strings whose rounded value can have moved
+# are reformatted. Fixed income holdings are valued once, when the state is built:
+# their maturity values never change.
+#
+# The state is rebuilt when the portfolio object is replaced or its holdings change
+# (data.holdings_version, bumped by upsert_holdings). An instrument with no price (an
+# open breaker with nothing cached, a delisted symbol) keeps its last-known price and is
+# marked "stale"; one that was never priced is marked "unpriced" and left out of the
+# totals. The rest of the portfolio is valued either way.
+
+import numpy as np
+
+from data import holdings_version
+from holdings import etf_symbol
+from price_stream import PRICE_FIELDS, QUANTITY_FIELDS
+
+# A rounded allocation can only change once the exact share moves this far from it
+ALLOCATION_TOLERANCE = 0.0049  # percentage points, just under half of 0.01
+
+def price_key(category, item):
+    """Key of a holding's price in fetch_portfolio_prices' {category: {key: price}} result."""
+    return etf_symbol(item) if category == "ETF" else item["name"]
+
+def portfolio_instruments(portfolio):
+    """{category: [price key, ...]} of the distinct instruments a portfolio holds."""
+    return {category: list(dict.fromkeys(price_key(category, item)
+                                         for item in portfolio["assets"].get(category, {}).get("holdings", [])))
+            for category in PRICE_FIELDS}
+
+class PortfolioValuation:
+    def __init__(self, portfolio, version, fixed_income_value):
+        self.portfolio = portfolio
+        self.version = version
+        self.categories = list(portfolio["assets"])
+        self.items = []
+        codes, values, quantities = [], [], []
+        index = {}  # (category, price key) -> flat positions of its holdings
+        for code, category in enumerate(self.categories):
+            holdings = portfolio["assets"][category]["holdings"]
+            start = len(self.items)
+            self.items.extend(holdings)
+            codes.append(np.full(len(holdings), code, dtype=np.int64))
+            if category in PRICE_FIELDS:
+                quantity = QUANTITY_FIELDS[category]
+                for position, item in enumerate(holdings, start):
+                    index.setdefault((category, price_key(category, item)), []).append(position)
+                quantities.extend(item[quantity] for item in holdings)
+                values.extend([0.0] * len(holdings))
+            else:
+                for item in holdings:
+                    value = fixed_income_value(category, item)
+                    item["total_value"] = value if value is not None else item.get("total_value", 0)
+                    values.append(item["total_value"])
+                quantities.extend([0] * len(holdings))
+        self.index = {instrument: np.array(positions) for instrument, positions in index.items()}
+        self.codes = np.concatenate(codes) if codes else np.zeros(0, dtype=np.int64)
+        self.quantities = np.array(quantities, dtype=float)
+        self.values = np.array(values, dtype=float)
+        self.shown = np.full(len(self.items), np.nan)  # Allocation (%) currently shown per holding
+        self.prices = {}  # (category, price key) -> price the holdings were last valued at
+        self.status = {}  # (category, price key) -> "stale" / "unpriced" while its price is missing
+        self.valued = False
+
+    def instruments(self):
+        """{category: [price key, ...]} of the distinct instruments to price."""
+        instruments = {category: [] for category in PRICE_FIELDS}
+        for category, key in self.index:
+            instruments[category].append(key)
+        return instruments
+
+    def last_known_price(self, instrument, positions):
+        """The price the instrument was last valued at, here or in the stored holdings."""
+        price = self.prices.get(instrument) or self.items[positions[0]].get(PRICE_FIELDS[instrument[0]])
+        return price if isinstance(price, (int, float)) and price > 0 else None
+
+    def apply(self, prices):
+        """
+        Value the holdings of every instrument whose price moved and refresh the totals.
+        Returns the number of holdings changed. An instrument missing from `prices` keeps
+        its last-known price ("stale") or, without one, counts as 0 ("unpriced"); the
+        holdings carry the status in "price_status" and the portfolio lists them.
+        Holdings without a symbol count as 0.
+        """
+        changed = 0
+        for instrument, positions in self.index.items():
+            category, key = instrument
+            price = prices.get(category, {}).get(key)
+            status = None
+            if price is None and key:
+                price = self.last_known_price(instrument, positions)
+                status = "stale" if price is not None else "unpriced"
+            price = price if price is not None else 0
+            if self.status.get(instrument) != status:
+                if status is None:
+                    del self.status[instrument]
+                else:
+                    self.status[instrument] = status
+                for position in positions.tolist():
+                    if status is None:
+                        self.items[position].pop("price_status", None)
+                    else:
+                        self.items[position]["price_status"] = status
+            if instrument in self.prices and self.prices[instrument] == price:
+                continue
+            self.prices[instrument] = price
+            field = PRICE_FIELDS[category]
+            values = self.quantities[positions] * price
+            self.values[positions] = values
+            for position, value in zip(positions.tolist(), values.tolist()):
+                item = self.items[position]
+                item[field] = price if status != "unpriced" else None
+                item["total_value"] = value
+            changed += len(positions)
+
+        if self.status:
+            self.portfolio["price_status"] = {
+                status: [key for (_, key), s in self.status.items() if s == status]
+                for status in ("stale", "unpriced") if status in self.status.values()}
+        else:
+            self.portfolio.pop("price_status", None)
+
+        if changed or not self.valued:
+            self.valued = True
+            totals = np.bincount(self.codes, weights=self.values, minlength=len(self.categories))
+            assets = self.portfolio["assets"]
+            for category, total in zip(self.categories, totals.tolist()):
+                assets[category]["total_value"] = total
+            self.portfolio["total_portfolio_value"] = total_value = float(self.values.sum())
+            if total_value > 0:
+                self._update_allocations(total_value)
+        return changed
+
+    def _update_allocations(self, total_value):
+        shares = self.values / total_value * 100
+        with np.errstate(invalid="ignore"):
+            stale = ~(np.abs(shares - self.shown) < ALLOCATION_TOLERANCE)  # NaN: never shown
+        positions = np.flatnonzero(stale)
+        shown = []
+        for position, share in zip(positions.tolist(), shares[positions].tolist()):
+            allocation = f"{share:.2f}%"
+            self.items[position]["allocation"] = allocation
+            shown.append(float(allocation[:-1]))
+        self.shown[positions] = shown
+
+_valuations = {}
+
+def get_valuation(pan, portfolio, fixed_income_value):
+    """The PAN's valuation state, rebuilt when its portfolio or holdings have changed."""
+    valuation = _valuations.get(pan)
+    version = holdings_version(pan)
+    if valuation is None or valuation.portfolio is not portfolio or valuation.version != version:
+        valuation = _valuations[pan] = PortfolioValuation(portfolio, version, fixed_income_value)
+    return valuation
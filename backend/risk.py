@@ -0,0 +1,252 @@
+# risk.py
+
+import threading
+import time
+from statistics import NormalDist
+
+import numpy as np
+import pandas as pd
+
+from holdings import NIFTY_SYMBOL, holdings_frame
+from screener import fetch_close_panel
+
+TRADING_DAYS = 252
+RISK_LOOKBACK_DAYS = 252  # Rolling window of daily returns used for covariance
+HISTORY_REFRESH_SECONDS = 3600  # How often new daily bars are pulled
+MISSING_RETRY_SECONDS = 3600  # How long a symbol Yahoo returned no history for is not re-requested
+CONFIDENCE = 0.95
+
+def bar_returns(closes, base=None):
+    """
+    Daily returns of each column over its own bars. A missing bar is NaN rather than a 0%
+    return, and the next return is measured from the last close before the gap. `base`
+    (the last closes before `closes`) prices the first row; without it the row is dropped.
+    """
+    frame = closes if base is None else pd.concat([base.to_frame().T, closes])
+    returns = pd.DataFrame({column: frame[column].dropna().pct_change(fill_method=None) for column in frame.columns},
+                           index=frame.index, columns=frame.columns)
+    return returns.iloc[1:]
+
+def moments(returns):
+    """
+    Pairwise-complete sums of a returns block: (days both symbols have a return, sum of
+    the row symbol's returns on those days, sum of products). Missing returns add nothing.
+    """
+    observed = returns.notna().to_numpy(dtype=float)
+    values = np.nan_to_num(returns.to_numpy(dtype=float))
+    return observed.T @ observed, values.T @ observed, values.T @ values
+
+class ReturnHistoryCache:
+    """
+    Cached daily return histories for every instrument seen so far, plus pairwise rolling
+    sums (counts, sums, sums of products) from which the covariance matrix is derived
+    over the days both symbols traded. New bars are folded in and old bars dropped
+    without recomputing over the window.
+    """
+
+    def __init__(self, lookback=RISK_LOOKBACK_DAYS):
+        self.lookback = lookback
+        self.closes = pd.DataFrame()
+        self.returns = pd.DataFrame()
+        self.n = np.zeros((0, 0))  # Days with a return for both symbols
+        self.sum = np.zeros((0, 0))  # [i, j]: sum of i's returns on those days
+        self.sum_sq = np.zeros((0, 0))
+        self.last_refresh = 0
+        self.failed = {}  # symbol -> time before which it is not requested again
+        self.lock = threading.Lock()
+
+    def _rebuild(self):
+        """Recompute the rolling sums from scratch (used when the symbol set changes)."""
+        self.n, self.sum, self.sum_sq = moments(self.returns)
+
+    def _fold(self, returns, sign):
+        if len(returns):
+            n, total, sum_sq = moments(returns)
+            self.n += sign * n
+            self.sum += sign * total
+            self.sum_sq += sign * sum_sq
+
+    def _add_symbols(self, symbols):
+        closes = fetch_close_panel(symbols, period="2y")
+        if closes.empty:
+            return
+        self.closes = closes if self.closes.empty else self.closes.join(closes, how="outer")
+        self.returns = bar_returns(self.closes).iloc[-self.lookback:]
+        self._rebuild()
+
+    def _append_bars(self):
+        """
+        Pull the latest bars for all cached symbols and roll them into the window. Bars are
+        re-read from the oldest last close among the symbols, so a symbol that lags (one
+        joined with an older history, or a failed download) catches up, and a trailing bar
+        fetched while its session was still trading is replaced.
+        """
+        recent = fetch_close_panel(list(self.closes.columns), period="5d")
+        if recent.empty:
+            return
+        recent = recent.reindex(columns=self.closes.columns)
+        start = max(self.closes.apply(pd.Series.last_valid_index).min(), recent.index[0])
+        old_tail = self.closes.loc[self.closes.index >= start]
+        tail = (recent.loc[recent.index >= start].combine_first(old_tail)
+                .reindex(columns=self.closes.columns).sort_index())
+        if tail.index.equals(old_tail.index) and np.array_equal(tail.to_numpy(), old_tail.to_numpy(), equal_nan=True):
+            return  # Nothing new
+
+        head = self.closes.loc[self.closes.index < start]
+        returns = self.returns.loc[self.returns.index < start]
+        self._fold(self.returns.loc[self.returns.index >= start], -1)
+        added = bar_returns(tail, base=head.ffill().iloc[-1] if len(head) else None)
+        dropped = returns.iloc[:max(len(returns) + len(added) - self.lookback, 0)]
+        self._fold(added, 1)
+        self._fold(dropped, -1)
+
+        self.closes = pd.concat([head, tail])
+        self.returns = pd.concat([returns.iloc[len(dropped):], added])
+
+    def ensure(self, symbols):
+        """
+        Make sure histories for all symbols are cached and no older than
+        HISTORY_REFRESH_SECONDS. A symbol with no history is retried after
+        MISSING_RETRY_SECONDS; new bars are pulled on their own schedule.
+        """
+        with self.lock:
+            now = time.time()
+            missing = [s for s in dict.fromkeys(symbols)
+                       if s not in self.closes.columns and self.failed.get(s, 0) <= now]
+            if missing:
+                first_load = self.closes.empty
+                self._add_symbols(missing)
+                for symbol in missing:
+                    if symbol in self.closes.columns:
+                        self.failed.pop(symbol, None)
+                    else:
+                        self.failed[symbol] = now + MISSING_RETRY_SECONDS
+                if first_load:
+                    self.last_refresh = now  # The two-year download is current
+            if not self.closes.empty and now - self.last_refresh > HISTORY_REFRESH_SECONDS:
+                self._append_bars()
+                self.last_refresh = now
+
+    def _covariance(self, idx):
+        block = np.ix_(idx, idx)
+        n, total = self.n[block], self.sum[block]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return np.where(n > 1, (self.sum_sq[block] - total * total.T / n) / (n - 1), np.nan)
+
+    def _mean_returns(self, idx):
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return self.sum[idx, idx] / self.n[idx, idx]
+
+    def covariance(self, symbols):
+        """Daily covariance matrix for the given symbols, each pair over the days both traded."""
+        with self.lock:  # n, sum and sum_sq change together in _append_bars
+            return self._covariance(self.closes.columns.get_indexer(symbols))
+
+    def mean_returns(self, symbols):
+        """Mean daily return per symbol over the rolling window."""
+        with self.lock:
+            return self._mean_returns(self.closes.columns.get_indexer(symbols))
+
+    def return_matrix(self, symbols):
+        """Daily returns (days x symbols) over the rolling window; NaN where a symbol has no bar."""
+        with self.lock:
+            return self.returns.to_numpy()[:, self.closes.columns.get_indexer(symbols)]
+
+    def snapshot(self, symbols):
+        """
+        One consistent read for the cached ones among `symbols` (order and repeats kept):
+        (symbols, covariance, mean returns, daily returns), so a concurrent refresh
+        cannot change the window between them.
+        """
+        with self.lock:
+            symbols = [s for s in symbols if s in self.closes.columns]
+            idx = self.closes.columns.get_indexer(symbols)
+            return symbols, self._covariance(idx), self._mean_returns(idx), self.returns.to_numpy()[:, idx]
+
+history_cache = ReturnHistoryCache()
+
+def portfolio_risk_metrics(holdings, cache=history_cache, confidence=CONFIDENCE):
+    """
+    Compute volatility, VaR/CVaR, beta to NIFTY and per-holding risk contributions
+    for a holdings table (see holdings.holdings_frame). Returns None if no priced holdings.
+    """
+    total_value = float(holdings["total_value"].sum())
+    priced = holdings[holdings["symbol"].notna() & (holdings["total_value"] > 0)]
+    if total_value <= 0 or priced.empty:
+        return None
+
+    # Holdings sharing a market series (e.g. mutual funds on the NIFTY proxy) are summed
+    exposure = priced.groupby("symbol", sort=False)["total_value"].sum()
+    symbols = list(exposure.index)
+    cache.ensure(symbols + [NIFTY_SYMBOL])
+    all_symbols, cov_all, means, returns = cache.snapshot(symbols + [NIFTY_SYMBOL])
+    has_nifty = bool(all_symbols) and all_symbols[-1] == NIFTY_SYMBOL
+    symbols = all_symbols[:-1] if has_nifty else all_symbols
+    k = len(symbols)
+    # Historical VaR / CVaR use the days every held symbol traded
+    returns = returns[:, :k]
+    returns = returns[~np.isnan(returns).any(axis=1)]
+    if not symbols or len(returns) < 2:
+        return None
+
+    w = exposure[symbols].to_numpy() / total_value  # Fixed income holds the remaining weight at zero variance
+    cov = np.nan_to_num(cov_all[:k, :k])
+
+    sigma_w = cov @ w
+    variance = max(float(w @ sigma_w), 0.0)  # Pairwise estimates need not be positive semi-definite
+    daily_vol = float(np.sqrt(variance))
+
+    port_returns = returns @ w
+    cutoff = np.quantile(port_returns, 1 - confidence)
+    hist_var = -cutoff
+    hist_cvar = -port_returns[port_returns <= cutoff].mean()
+
+    # Parametric (normal) VaR / CVaR
+    mean = float(np.nan_to_num(means[:k]) @ w)
+    z = NormalDist().inv_cdf(confidence)
+    param_var = z * daily_vol - mean
+    param_cvar = daily_vol * NormalDist().pdf(z) / (1 - confidence) - mean
+
+    beta = None
+    if has_nifty and cov_all[k, k] > 0 and not np.isnan(cov_all[:k, k]).any():
+        beta = float(w @ cov_all[:k, k] / cov_all[k, k])
+
+    # Marginal and component contributions to portfolio volatility
+    marginal = sigma_w / daily_vol if daily_vol > 0 else np.zeros(k)
+    component = w * marginal
+    share = pd.Series(component / daily_vol if daily_vol > 0 else component, index=symbols)
+    mrc = pd.Series(marginal, index=symbols)
+
+    # Split each symbol's contribution across the holdings that map to it
+    holding_symbol = holdings["symbol"]
+    holding_share = (holding_symbol.map(share).fillna(0)
+                     * holdings["total_value"] / holding_symbol.map(exposure).fillna(1))
+    contributions = pd.DataFrame({
+        "category": holdings["category"],
+        "name": holdings["name"],
+        "weight": (holdings["total_value"] / total_value * 100).round(2),
+        "marginal_risk": (holding_symbol.map(mrc).fillna(0) * np.sqrt(TRADING_DAYS) * 100).round(4),
+        "risk_contribution": (holding_share * 100).round(2),
+    }).to_dict(orient="records")
+
+    return {
+        "volatility_annual": round(daily_vol * np.sqrt(TRADING_DAYS) * 100, 2),
+        "volatility_daily": round(daily_vol * 100, 4),
+        "var_95": {
+            "historical": round(float(hist_var) * 100, 2),
+            "parametric": round(float(param_var) * 100, 2),
+            "amount": round(float(hist_var) * total_value, 2),
+        },
+        "cvar_95": {
+            "historical": round(float(hist_cvar) * 100, 2),
+            "parametric": round(float(param_cvar) * 100, 2),
+            "amount": round(float(hist_cvar) * total_value, 2),
+        },
+        "beta": round(beta, 3) if beta is not None else None,
+        "observations": len(returns),
+        "contributions": contributions,
+    }
+
+def analyze_portfolio_risk(portfolio_data):
+    """Risk metrics for a valued portfolio."""
+    return portfolio_risk_metrics(holdings_frame(portfolio_data))
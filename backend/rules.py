@@ -0,0 +1,186 @@
+# rules.py
+
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from fund_screener import lookup_fund
+from holdings import holdings_frame
+from lookthrough import lookthrough_exposure
+
+RECOMMENDATION_RULES_FILE = os.environ.get(
+    "RECOMMENDATION_RULES_FILE", os.path.join(os.path.dirname(__file__), "recommendation_rules.json"))
+
+RULE_TYPES = ("risk_level", "category_max", "holding_max", "sector_max", "maturity_within", "underperforming_fund",
+              "lookthrough_max")
+
+class RecommendationEngine:
+    """
+    Declarative recommendation rules compiled into one table per rule type.
+    Evaluation joins each table against the holdings (or per-PAN aggregates) and
+    applies the threshold as a single vectorized comparison, so cost does not grow
+    with a Python loop over rules x holdings.
+    """
+
+    def __init__(self, config, fund_status=None, exposure=None):
+        self.sectors = config.get("sectors", {})
+        self.fund_status = fund_status  # callable(names) -> DataFrame[name, fund_status, fund_reason]
+        self.exposure = exposure  # callable(holdings) -> DataFrame[pan, level, name, sector, weight, via_funds] or None
+        self.tables = self.compile(config.get("rules", []))
+
+    @staticmethod
+    def compile(rules):
+        """Expand rules into rows of (rule_id, key, threshold, message) grouped by type."""
+        rows = {rule_type: [] for rule_type in RULE_TYPES}
+        for rule_id, rule in enumerate(rules):
+            rule_type = rule["type"]
+            if rule_type not in rows:
+                raise ValueError(f"Unknown recommendation rule type: {rule_type}")
+
+            if rule_type == "risk_level":
+                for level in rule["levels"]:
+                    for offset, message in enumerate(rule["messages"]):
+                        rows[rule_type].append((rule_id + offset / 100, level, None, message))
+            elif rule_type == "sector_max":
+                rows[rule_type].append((rule_id, None, rule["max"], rule["message"]))
+            elif rule_type == "lookthrough_max":
+                rows[rule_type].append((rule_id, rule.get("level", "security"), rule["max"], rule["message"]))
+            else:
+                threshold = rule.get("max", rule.get("months"))
+                for category in rule.get("categories") or [None]:
+                    rows[rule_type].append((rule_id, category, threshold, rule["message"]))
+
+        return {rule_type: pd.DataFrame(table, columns=["rule_id", "key", "threshold", "message"])
+                for rule_type, table in rows.items()}
+
+    def _prepare(self, holdings):
+        holdings = holdings.copy()
+        totals = holdings.groupby("pan")["total_value"].transform("sum")
+        holdings["weight"] = np.where(totals > 0, holdings["total_value"] / totals.where(totals > 0, 1), 0.0)
+        holdings["sector"] = holdings["name"].map(self.sectors)
+        holdings["order"] = np.arange(len(holdings))
+        return holdings
+
+    def _fired(self, holdings, risk_levels):
+        t = self.tables
+        fired = []
+
+        if not t["risk_level"].empty and risk_levels is not None:
+            levels = pd.DataFrame({"pan": list(risk_levels.keys()), "key": list(risk_levels.values())})
+            fired.append(levels.merge(t["risk_level"], on="key").assign(order=-1))
+
+        by_category = (holdings.groupby(["pan", "category"], as_index=False, sort=False)
+                       .agg(weight=("weight", "sum"), order=("order", "min"))
+                       .rename(columns={"category": "key"}))
+        fired.append(self._threshold(by_category, t["category_max"], on="key", op="gt"))
+
+        fired.append(self._threshold(holdings.rename(columns={"category": "key"}),
+                                     t["holding_max"], on="key", op="gt"))
+
+        if not t["sector_max"].empty:
+            by_sector = (holdings.dropna(subset=["sector"])
+                         .groupby(["pan", "sector"], as_index=False, sort=False)
+                         .agg(weight=("weight", "sum"), order=("order", "min")))
+            fired.append(self._threshold(by_sector, t["sector_max"].drop(columns="key"), on=None, op="gt"))
+
+        maturing = holdings.dropna(subset=["months_to_maturity"]).rename(
+            columns={"category": "key", "months_to_maturity": "months_left"})
+        maturing = maturing.assign(category=maturing["key"], weight=maturing["months_left"])
+        fired.append(self._threshold(maturing, t["maturity_within"], on="key", op="le"))
+
+        if not t["underperforming_fund"].empty and self.fund_status is not None:
+            funds = holdings[holdings["category"].isin(t["underperforming_fund"]["key"])]
+            if not funds.empty:
+                funds = funds.merge(self.fund_status(funds["name"].unique()), on="name", how="left")
+                funds = funds[funds["fund_status"] == "bad"].rename(columns={"category": "key"})
+                fired.append(funds.merge(t["underperforming_fund"], on="key"))
+
+        if not t["lookthrough_max"].empty and self.exposure is not None:
+            # Only exposure that reaches the portfolio through mutual funds; direct-only
+            # concentration is already covered by holding_max / sector_max
+            exposure = self.exposure(holdings)  # None without disclosures: the rules are skipped
+            if exposure is not None:
+                exposure = exposure[exposure["via_funds"] > 0].sort_values("weight", ascending=False)
+                exposure = exposure.assign(order=np.arange(len(exposure))).rename(columns={"level": "key"})
+                fired.append(self._threshold(exposure, t["lookthrough_max"], on="key", op="gt"))
+
+        fired = [f for f in fired if not f.empty]
+        if not fired:
+            return pd.DataFrame(columns=["pan", "rule_id", "order", "message"])
+        return pd.concat(fired, ignore_index=True).sort_values(["pan", "rule_id", "order"], kind="stable")
+
+    @staticmethod
+    def _threshold(values, rules, on, op):
+        """Join values with rule rows and keep the rows where the threshold is breached."""
+        if rules.empty or values.empty:
+            return pd.DataFrame()
+        if on is None:
+            joined = values.merge(rules, how="cross")
+        else:
+            # Rules without a category apply to every row
+            joined = pd.concat([
+                values.merge(rules.dropna(subset=["key"]), on=on),
+                values.merge(rules[rules["key"].isna()].drop(columns="key"), how="cross"),
+            ], ignore_index=True)
+        breached = joined["weight"] > joined["threshold"] if op == "gt" else joined["weight"] <= joined["threshold"]
+        return joined[breached]
+
+    def evaluate(self, holdings, risk_levels=None):
+        """
+        Evaluate all rules over a holdings table with a "pan" column (see holdings.holdings_frame)
+        covering one or many portfolios. Returns {pan: [recommendation, ...]}.
+        """
+        fired = self._fired(self._prepare(holdings), risk_levels)
+        result = {pan: [] for pan in holdings["pan"].unique()}
+        for row in fired.to_dict(orient="records"):
+            fields = {k: v for k, v in row.items() if not isinstance(v, float) or not np.isnan(v)}
+            if "months_left" in fields:
+                fields["months_left"] = int(fields["months_left"])
+            elif "weight" in fields:
+                fields["weight_pct"] = f"{fields['weight'] * 100:.2f}"
+            message = row["message"].format_map(DefaultFields(fields))
+            if message not in result[row["pan"]]:
+                result[row["pan"]].append(message)
+        return result
+
+class DefaultFields(dict):
+    """Leave unknown template fields blank instead of raising."""
+    def __missing__(self, key):
+        return ""
+
+def screened_fund_status(names):
+    """Look up the fund screener verdict for each mutual fund name."""
+    rows = []
+    for name in names:
+        try:
+            fund = lookup_fund(name)
+        except Exception as e:
+            print(f"Error screening mutual fund {name}: {e}")
+            fund = None
+        rows.append((name, None if fund is None else fund["status"], None if fund is None else fund["reason"]))
+    return pd.DataFrame(rows, columns=["name", "fund_status", "fund_reason"])
+
+def load_engine(path=RECOMMENDATION_RULES_FILE):
+    with open(path) as f:
+        return RecommendationEngine(json.load(f), fund_status=screened_fund_status, exposure=lookthrough_exposure)
+
+_engine = None
+
+def get_engine():
+    """Compile the configured rules once per process."""
+    global _engine
+    if _engine is None:
+        _engine = load_engine()
+    return _engine
+
+def recommend(portfolio_data, risk_level, pan=""):
+    """Recommendations for a single valued portfolio."""
+    holdings = holdings_frame(portfolio_data).assign(pan=pan)
+    return get_engine().evaluate(holdings, {pan: risk_level}).get(pan, [])
+
+def recommend_bulk(portfolios, risk_levels):
+    """Recommendations for many valued portfolios ({pan: portfolio}) in one evaluation."""
+    holdings = pd.concat([holdings_frame(p).assign(pan=pan) for pan, p in portfolios.items()], ignore_index=True)
+    return get_engine().evaluate(holdings, risk_levels)
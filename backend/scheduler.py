@@ -0,0 +1,101 @@
+# scheduler.py
+
+import datetime
+import threading
+import time
+
+from market_calendar import is_market_open, last_amfi_publish, now_ist
+from resilience import backoff_delay
+
+SCHEDULER_TICK = 5  # seconds between scheduler passes
+REFRESH_AHEAD = 0.8  # Refresh once an entry has used this fraction of its TTL
+HOT_WINDOW = 3600  # Instruments not requested for this long stop being refreshed
+DAILY_RETRY_BASE = 60  # seconds; a failed daily job is retried with jittered backoff from here
+DAILY_RETRY_CAP = 1800
+
+class RefreshScheduler:
+    """
+    Keeps caches warm. Recently requested ("hot") entries are refreshed shortly before
+    their TTL runs out while the NSE session is open, and left frozen while it is closed.
+    The AMFI NAV file is refreshed once after each evening publish.
+    """
+
+    def __init__(self, tick=SCHEDULER_TICK):
+        self.tick = tick
+        self.kinds = {}  # kind -> (refresh(key), ttl, market_hours_only)
+        self.hot = {}  # (kind, key) -> {"requested": ts, "fetched": ts}
+        self.daily_jobs = []  # [refresh(), last_due(now), last run timestamp, consecutive failures, retry at]
+        self.lock = threading.Lock()
+        self.thread = None
+
+    def register(self, kind, refresh, ttl, market_hours_only=True):
+        self.kinds[kind] = (refresh, ttl, market_hours_only)
+
+    def register_daily(self, refresh, last_due):
+        """Run refresh() once each time last_due(now) moves past the previous run."""
+        self.daily_jobs.append([refresh, last_due, time.time(), 0, 0])
+
+    def track(self, kind, key, fetched_at=None):
+        """Record a request for an entry; pass fetched_at when the entry was just (re)fetched."""
+        with self.lock:
+            entry = self.hot.setdefault((kind, key), {"requested": 0, "fetched": 0})
+            entry["requested"] = time.time()
+            if fetched_at is not None:
+                entry["fetched"] = fetched_at
+
+    def due(self, now=None):
+        """Hot entries that should be refreshed now."""
+        current_time = time.time()
+        market_open = is_market_open(now)
+        due = []
+        with self.lock:
+            for (kind, key), entry in list(self.hot.items()):
+                if current_time - entry["requested"] > HOT_WINDOW:
+                    del self.hot[(kind, key)]
+                    continue
+                refresh, ttl, market_hours_only = self.kinds[kind]
+                if market_hours_only and not market_open:
+                    continue
+                if current_time - entry["fetched"] >= ttl * REFRESH_AHEAD:
+                    due.append((kind, key))
+        return due
+
+    def run_once(self):
+        now = now_ist()
+        for kind, key in self.due(now):
+            try:
+                self.kinds[kind][0](key)
+            except Exception as e:
+                print(f"Error refreshing {kind} {key}: {e}")
+            with self.lock:
+                if (kind, key) in self.hot:
+                    self.hot[(kind, key)]["fetched"] = time.time()
+
+        for job in self.daily_jobs:
+            refresh, last_due, last_run, failures, retry_at = job
+            if last_due(now).timestamp() > last_run and time.time() >= retry_at:
+                try:
+                    refresh()
+                    job[2:] = [time.time(), 0, 0]
+                except Exception as e:
+                    # e.g. AMFI has not published yet: back off instead of retrying every tick
+                    job[3] = failures + 1
+                    job[4] = time.time() + backoff_delay(failures, base=DAILY_RETRY_BASE, cap=DAILY_RETRY_CAP)
+                    print(f"Error running scheduled refresh (attempt {failures + 1}): {e}")
+
+    def _run(self):
+        while True:
+            self.run_once()
+            time.sleep(self.tick)
+
+    def start(self):
+        if self.thread is None:
+            self.thread = threading.Thread(target=self._run, name="refresh-scheduler", daemon=True)
+            self.thread.start()
+
+scheduler = RefreshScheduler()
+
+def register_amfi_refresh(refresh, grace_seconds=900):
+    """Refresh the AMFI NAV file a little after each evening publish."""
+    grace = datetime.timedelta(seconds=grace_seconds)
+    scheduler.register_daily(refresh, lambda now: last_amfi_publish(now - grace) + grace)
@@ -0,0 +1,125 @@
+# screener.py
+
+import numpy as np
+import pandas as pd
+import yfinance as yf
+
+from resilience import get_upstream
+
+TRADING_DAYS = 252
+LOOKBACK_3M = 63  # ~3 months of trading days
+BAD_RETURN_THRESHOLD = -10  # % change over 3 months that marks a stock as "bad"
+
+def to_nse_symbol(stock_name):
+    """Convert a stock name to its NSE ticker on Yahoo Finance."""
+    return stock_name.replace(" ", "").upper() + ".NS"
+
+def fetch_close_panel(symbols, period="1y"):
+    """
+    Download closing prices for all symbols in a single batched request, behind the
+    "yfinance" upstream guard. Returns a DataFrame indexed by date with one column per
+    symbol, empty when the download fails or the breaker is open.
+    """
+    symbols = list(dict.fromkeys(symbols))  # De-duplicate, keep order
+    if not symbols:
+        return pd.DataFrame()
+
+    def download():
+        df = yf.download(symbols, period=period, auto_adjust=True, group_by="column",
+                         threads=True, progress=False)
+        if df.empty:
+            raise ValueError(f"No {period} closes returned for {len(symbols)} symbols")
+        return df
+
+    df = get_upstream("yfinance").call(download, operation="download", retries=1, fallback=pd.DataFrame)
+    if df.empty:
+        return pd.DataFrame()
+
+    close = df["Close"]
+    if isinstance(close, pd.Series):  # Single ticker comes back without a symbol level
+        close = close.to_frame(symbols[0])
+    return close.sort_index().dropna(how="all").dropna(axis=1, how="all")
+
+def compute_screen_metrics(close):
+    """
+    Compute screening metrics for every column of a close-price panel at once.
+    Returns a DataFrame indexed by symbol.
+    """
+    prices = close.to_numpy(dtype=float)
+    last_idx = close.notna().to_numpy()[::-1].argmax(axis=0)  # Rows since last valid close
+    rows = np.arange(prices.shape[1])
+    current = prices[prices.shape[0] - 1 - last_idx, rows]
+
+    window = close.ffill().iloc[-LOOKBACK_3M:]
+    start = window.bfill().iloc[0].to_numpy(dtype=float)
+    return_3m = (current / start - 1) * 100
+
+    running_max = close.cummax().to_numpy(dtype=float)
+    drawdowns = prices / running_max - 1
+    max_drawdown = np.nanmin(drawdowns, axis=0) * 100
+    current_drawdown = (current / np.nanmax(prices, axis=0) - 1) * 100
+
+    daily_returns = window.pct_change(fill_method=None)
+    volatility = daily_returns.std().to_numpy() * np.sqrt(TRADING_DAYS) * 100
+
+    ma50 = close.rolling(window=50, min_periods=1).mean().iloc[-1].to_numpy()
+    ma200 = close.rolling(window=200, min_periods=1).mean().iloc[-1].to_numpy()
+
+    metrics = pd.DataFrame({
+        "price": current,
+        "return_3m": return_3m,
+        "max_drawdown": max_drawdown,
+        "current_drawdown": current_drawdown,
+        "volatility": volatility,
+        "ma50": ma50,
+        "ma200": ma200,
+        "below_ma50": current < ma50,
+        "below_ma200": current < ma200,
+    }, index=close.columns)
+    return metrics
+
+def rank_screen(metrics):
+    """
+    Flag and rank screened stocks, worst first.
+    A stock is 'bad' if it fell more than BAD_RETURN_THRESHOLD% over 3 months,
+    or trades below both its 50-day and 200-day moving averages.
+    """
+    bad = (metrics["return_3m"] < BAD_RETURN_THRESHOLD) | (metrics["below_ma50"] & metrics["below_ma200"])
+
+    # Higher score = weaker stock
+    score = (-metrics["return_3m"].fillna(0)
+             - metrics["current_drawdown"].fillna(0)
+             + 0.5 * metrics["volatility"].fillna(0)
+             + 10 * metrics["below_ma50"].astype(int)
+             + 10 * metrics["below_ma200"].astype(int))
+
+    ranked = metrics.assign(status=np.where(bad, "bad", "good"), score=score.round(2))
+    return ranked.sort_values("score", ascending=False)
+
+def screen_stocks(stock_names, period="1y"):
+    """Screen a list of stock names and return a ranked list of results."""
+    symbols = {to_nse_symbol(name): name for name in stock_names}
+    close = fetch_close_panel(list(symbols), period=period)
+
+    results = []
+    if not close.empty:
+        ranked = rank_screen(compute_screen_metrics(close))
+        for rank, (symbol, row) in enumerate(ranked.iterrows(), start=1):
+            results.append({
+                "rank": rank,
+                "stock_name": symbols.get(symbol, symbol),
+                "symbol": symbol,
+                "status": row["status"],
+                "score": float(row["score"]),
+                "price": round(float(row["price"]), 2),
+                "return_3m": round(float(row["return_3m"]), 2),
+                "max_drawdown": round(float(row["max_drawdown"]), 2),
+                "current_drawdown": round(float(row["current_drawdown"]), 2),
+                "volatility": round(float(row["volatility"]), 2),
+                "below_ma50": bool(row["below_ma50"]),
+                "below_ma200": bool(row["below_ma200"]),
+            })
+
+    found = {r["symbol"] for r in results}
+    missing = [name for symbol, name in symbols.items() if symbol not in found]
+    return {"results": results, "missing": missing}
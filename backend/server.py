@@ -1,90 +1,175 @@
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, Response, stream_with_context
 from flask_cors import CORS
 import yfinance as yf
 import requests
-from data import get_user_portfolio  # Import the database functions
+from data import get_user_portfolio, portfolio_lock, user_portfolios  # Import the database functions
 import time
-from database import save_user_portfolio, get_cached_portfolio  # Import database functions
+from database import save_user_portfolio, get_cached_portfolio, get_portfolio_version, save_portfolio_analysis, get_cached_analysis  # Import database functions
+from database import save_rebalance_plan, get_rebalance_plan
+from screener import screen_stocks  # Batched stock screener
+from fund_screener import lookup_fund, screen_funds  # Screened AMFI scheme universe
+from risk import analyze_portfolio_risk, history_cache  # Covariance based risk engine
+from rules import recommend  # Declarative recommendation rules
+from price_stream import PriceHub, PortfolioStream  # Shared live price poller
+from market_calendar import amfi_is_fresh, quote_is_fresh, last_session_close  # TTLs freeze while NSE is closed
+from scheduler import scheduler, register_amfi_refresh  # Background cache warmer
+from fund_screener import get_fund_universe
+from shared_prices import attach_price_table  # Cross-worker price table
+from nse_snapshots import NSE_BASE_URL, NSE_HEADERS, SnapshotBook, nse_fetch  # Bulk index / ETF snapshot quotes
+from holdings import etf_symbol
+import metrics  # Prometheus-style instrumentation
+import profiling  # Admin-gated on-demand profiler
+from metrics import cache_lookup, stage
+import valuation_history  # Daily valuation snapshots per PAN
+from returns import holding_returns  # XIRR / TWR from cash flows
+from rebalance import MIN_TRADE_AMOUNT, rebalance_bulk  # Basket targets -> trade lists
+import backtest  # Precomputed historical basket backtests
+import goal_planner  # Vectorized target x horizon x SIP sweeps
+from stress import get_library, stress_portfolios  # Scenario shocks over holdings x factors
+from lookthrough import lookthrough_bulk  # Mutual fund holdings as a sparse scheme x security matrix
+from holdings_import import IMPORT_BATCH_SIZE, import_holdings  # Streaming CAS / broker CSV import
+from resilience import get_upstream, upstream_status  # Breakers, hedging and rate budgets per provider
+from model_export import export_models  # Trained /predict models -> NumPy arrays
+import inference  # TensorFlow-free batched inference over exported models
+from revaluation import get_valuation, portfolio_instruments  # Dirty-tracked incremental valuation
 import datetime
+import functools
+import io
+import json
+import os
+import queue
+import threading
 import numpy as np
 import pandas as pd
 import ta  # Technical Analysis indicators
-from sklearn.model_selection import train_test_split
-from sklearn.ensemble import RandomForestRegressor, GradientBoostingRegressor, StackingRegressor
-from sklearn.linear_model import Ridge, LinearRegression
-from sklearn.svm import SVR
-from sklearn.pipeline import Pipeline
-from sklearn.preprocessing import StandardScaler, MinMaxScaler
-from sklearn.impute import SimpleImputer
-import tensorflow as tf
-from tensorflow.keras.models import Sequential
-from tensorflow.keras.layers import LSTM, Dense, Dropout
 
 app = Flask(__name__)
 CORS(app, resources={r"/*": {"origins": "*"}})  # Enable CORS for frontend
+metrics.init_app(app)  # Request timing and /metrics endpoint
+profiling.init_app(app)  # X-Profile requests and /profiling endpoints
 
-def get_live_price(stock_name):
+# Simple caching to avoid making too many requests (60-second expiry)
+CACHE_EXPIRATION = 60  # seconds
+cache = {}
+price_cache = {}
+
+# Shared price table written by price_refresher.py (when PRICE_TABLE_NAME is set)
+SHARED_PRICE_MAX_AGE = 2 * CACHE_EXPIRATION  # Refresher writes every CACHE_EXPIRATION seconds
+SHARED_TABLE_RETRY = 30  # seconds between attempts to attach when no refresher is running
+shared_table = {"table": None, "last_attempt": 0}
+
+def read_shared_price(symbol):
+    """Read an NSE symbol's price from the shared table, or None if it is missing or stale."""
+    table = shared_table["table"]
+    if table is None:
+        if time.time() - shared_table["last_attempt"] < SHARED_TABLE_RETRY:
+            return None
+        shared_table["last_attempt"] = time.time()
+        table = shared_table["table"] = attach_price_table()
+        if table is None:
+            return None
+
+    entry = table.read(symbol)
+    hit = bool(entry) and quote_is_fresh(entry[1], SHARED_PRICE_MAX_AGE)
+    cache_lookup("shared_price", hit)
+    return entry[0] if hit else None
+
+def ticker_history(stock, period):
+    """stock.history(period), raising on an empty frame: yfinance reports throttling and failures as no rows."""
+    data = stock.history(period)
+    if data.empty:
+        raise ValueError(f"No {period} history returned for {stock.ticker}")
+    return data
+
+def get_live_price(stock_name, force=False):
     """Fetch live price from Yahoo Finance."""
+    shared_price = None if force else read_shared_price(stock_name.replace(" ", "").upper())
+    if shared_price is not None:
+        return shared_price
+    snapshot_price = None if force else snapshot_book.price(stock_name.replace(" ", ""))
+    if snapshot_price is not None:
+        return snapshot_price
+
+    cached = price_cache.get(stock_name)
+    hit = not force and cached is not None and quote_is_fresh(cached["time"], CACHE_EXPIRATION)
+    cache_lookup("price", hit)
+    if hit:
+        scheduler.track("price", stock_name)
+        return cached["price"]
+
     try:
         stock_symbol = stock_name.replace(" ", "").upper() + ".NS"  # Convert name to NSE ticker
         stock = yf.Ticker(stock_symbol)
-        live_data = stock.history(period="1d")
-
-        if live_data.empty:
-            return None  # If no data found, return None
-        return round(live_data["Close"].iloc[-1], 2)  # Return latest closing price
+        live_data = get_upstream("yfinance").call(ticker_history, stock, "1d", operation="history", hedge=True,
+                                                  fallback=lambda: None)
+        if live_data is None:
+            return cached["price"] if cached else None  # Provider down or no data: last known price
+        price = round(live_data["Close"].iloc[-1], 2)  # Return latest closing price
+        fetched_at = time.time()
+        price_cache[stock_name] = {"price": price, "time": fetched_at}
+        scheduler.track("price", stock_name, fetched_at)
+        return price
     except Exception as e:
         print(f"Error fetching price for {stock_name}: {e}")
         return None  # Handle API errors gracefully
 
 # Create a persistent session with headers mimicking a real browser.
 session = requests.Session()
-headers = {
-    "User-Agent": ("Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
-                   "AppleWebKit/537.36 (KHTML, like Gecko) "
-                   "Chrome/115.0.0.0 Safari/537.36"),
-    "Accept": "application/json, text/plain, */*",
-    "Accept-Language": "en-US,en;q=0.9",
-    "Referer": "https://www.nseindia.com/",
-    "Connection": "keep-alive",
-}
-session.headers.update(headers)
+session.headers.update(NSE_HEADERS)
 
 # Prime the session by calling the NSE homepage so that cookies are set.
 try:
-    session.get("https://www.nseindia.com", timeout=10)
+    session.get(NSE_BASE_URL, timeout=10)
 except Exception as e:
     print("Error priming NSE session:", e)
 
-# Simple caching to avoid making too many requests (60-second expiry)
-CACHE_EXPIRATION = 60  # seconds
-cache = {}
-
-def get_quote_nse(symbol):
+def get_quote_nse(symbol, force=False):
     """
     Retrieve the quote for a given NSE symbol using NSE's API.
-    This function caches the result for CACHE_EXPIRATION seconds.
+    This function caches the result for CACHE_EXPIRATION seconds, or until the next
+    session opens when the quote was fetched after the close.
     """
     current_time = time.time()
-    if symbol in cache and (current_time - cache[symbol]["time"]) < CACHE_EXPIRATION:
+    hit = not force and symbol in cache and quote_is_fresh(cache[symbol]["time"], CACHE_EXPIRATION)
+    cache_lookup("quote", hit)
+    if hit:
+        scheduler.track("quote", symbol)
         return cache[symbol]["data"]
     
-    url = f"https://www.nseindia.com/api/quote-equity?symbol={symbol}"
-    try:
+    url = f"{NSE_BASE_URL}/api/quote-equity?symbol={symbol}"
+
+    def fetch():
         response = session.get(url, timeout=10)
         response.raise_for_status()
-        data = response.json()
+        return response.json()
+
+    try:
+        data = get_upstream("nse").call(fetch, operation="quote-equity", hedge=True)
         cache[symbol] = {"data": data, "time": current_time}
+        scheduler.track("quote", symbol, current_time)
         return data
     except Exception as e:
         print(f"Error fetching data for {symbol}: {e}")
-        return None
+        return cache[symbol]["data"] if symbol in cache else None  # Last known quote
+
+# Every listed ETF and the NSE_SNAPSHOT_INDICES constituents, a few requests per refresh
+snapshot_book = SnapshotBook(nse_fetch(session))
+
+# Used when an ETF has no quote at all
+ETF_FALLBACK_PRICES = {"GOLDBEES": 73.95, "SILVERBEES": 94.18}
 
 def get_etf_price(symbol, fallback_price):
     """
-    Fetch live ETF price from NSE using a custom API call.
-    Returns the last traded price as a float, or the fallback if data isn't available.
+    Fetch live ETF price from NSE: the shared price table, then the ETF snapshot, then
+    a quote-equity call. Returns the fallback if data isn't available.
     """
+    shared_price = read_shared_price(symbol)
+    if shared_price is not None:
+        return shared_price
+    snapshot_price = snapshot_book.price(symbol)
+    if snapshot_price is not None:
+        return snapshot_price
+
     data = get_quote_nse(symbol)
     if data and "priceInfo" in data and "lastPrice" in data["priceInfo"]:
         return float(data["priceInfo"]["lastPrice"])
@@ -92,34 +177,28 @@ def get_etf_price(symbol, fallback_price):
     return fallback_price
 
 def get_live_nav(mutual_fund_name):
-    """Fetch latest NAV for mutual funds using AMFI API."""
+    """Fetch latest NAV for mutual funds from the cached AMFI scheme table."""
     try:
-        url = "https://www.amfiindia.com/spages/NAVAll.txt"
-        response = requests.get(url)
-        response_text = response.text.split("\n")
-
-        for line in response_text:
-            columns = line.split(";")
-            if len(columns) > 4:
-                fund_name_amfi = columns[3].strip().lower()  # Normalize AMFI name
-                fund_name_input = mutual_fund_name.strip().lower()  # Normalize input name
-
-                if fund_name_input in fund_name_amfi:  # Substring match
-                    return float(columns[4])  
-
-        return None  
+        fund = lookup_fund(mutual_fund_name)
+        if fund is None or pd.isna(fund["nav"]):
+            return None
+        return float(fund["nav"])
     except Exception as e:
         print(f"Error fetching NAV for {mutual_fund_name}: {e}")
         return None
 
+# Maturity values depend only on the deposit terms, so they are cached for good
+@functools.lru_cache(maxsize=None)
 def calculate_fd_maturity(principal, rate, time):
     """Calculate FD maturity using simple interest formula."""
     return round(principal + (principal * rate * time / 1200), 2)
 
+@functools.lru_cache(maxsize=None)
 def calculate_government_scheme_maturity(investment, rate, time):
     """Calculate Government Scheme maturity using simple interest formula."""
     return round(investment + (investment * rate * time / 1200), 2)
 
+@functools.lru_cache(maxsize=None)
 def calculate_rd_maturity(monthly_deposit, rate, months):
     """Calculate RD maturity using compound interest formula."""
     R = rate / 100  # Convert rate to decimal
@@ -129,10 +208,32 @@ def calculate_rd_maturity(monthly_deposit, rate, months):
     maturity_value = monthly_deposit * ((1 + R / N) ** (N * t) - 1) / (1 - (1 + R / N) ** -1)
     return round(maturity_value, 2)
 
+def fixed_income_value(category, item):
+    """Maturity value of a fixed income holding, or None for market-priced categories."""
+    if category == "Fixed Deposits":
+        return calculate_fd_maturity(item["investment"], item["interest_rate"], item["duration"])
+    if category == "Recurring Deposits":
+        return calculate_rd_maturity(item["monthly_deposit"], item["interest_rate"], item["duration"])
+    if category == "Government Schemes":
+        return calculate_government_scheme_maturity(item["investment"], item["interest_rate"], item["duration"])
+    return None
+
 
 CACHE_EXPIRATION_SECONDS = 3600  # 1 hour
 
-def calculate_portfolio(pan):
+def valuation_is_fresh(portfolio, valued_at):
+    """
+    A valuation is fresh within CACHE_EXPIRATION_SECONDS; market prices also freeze while
+    NSE is closed, but mutual fund NAVs move when AMFI publishes (in the evening), so a
+    portfolio holding funds must also have been valued after the last NAV publish.
+    """
+    if not quote_is_fresh(valued_at, CACHE_EXPIRATION_SECONDS):
+        return False
+    if portfolio["assets"].get("Mutual Funds", {}).get("holdings"):
+        return amfi_is_fresh(valued_at, CACHE_EXPIRATION_SECONDS)
+    return True
+
+def calculate_portfolio(pan, force=False):
     """Fetch live prices and store portfolio in DB to avoid repeated API calls."""
     portfolio = get_user_portfolio(pan)  # Fetch from database
     if not portfolio:
@@ -141,58 +242,106 @@ def calculate_portfolio(pan):
     last_updated = portfolio.get("last_updated")
     current_time = datetime.datetime.now().timestamp()
 
-    # Check if the last update was within CACHE_EXPIRATION_SECONDS
-    if last_updated and (current_time - last_updated) < CACHE_EXPIRATION_SECONDS:
+    # Check if the last update was within CACHE_EXPIRATION_SECONDS (or nothing it holds can have moved since)
+    hit = not force and bool(last_updated) and valuation_is_fresh(portfolio, last_updated)
+    cache_lookup("portfolio", hit)
+    if hit:
+        scheduler.track("portfolio", pan)
         return portfolio  # Return cached portfolio if recent
 
-    total_portfolio_value = 0
-    gold_price = get_etf_price("GOLDBEES", 73.95)
-    silver_price = get_etf_price("SILVERBEES", 94.18)
+    scheduler.track("portfolio", pan, current_time)
 
-    for category, details in portfolio["assets"].items():
-        total_category_value = 0
-        for item in details["holdings"]:
-            if category == "Stocks":
-                live_price = get_live_price(item["name"])
-                item["price_per_share"] = live_price if live_price is not None else 0
-                item["total_value"] = item["quantity"] * item["price_per_share"]
-            
-            elif category == "Mutual Funds":
-                live_nav = get_live_nav(item["name"])
-                item["nav"] = live_nav if live_nav is not None else 0
-                item["total_value"] = item["units"] * item["nav"]
+    with stage("price_fetch"):
+        # Each distinct instrument is priced once, however many holdings share it
+        with portfolio_lock(pan):
+            instruments = get_valuation(pan, portfolio, fixed_income_value).instruments()
+        prices = fetch_portfolio_prices(portfolio, instruments)
+    with stage("valuation"):
+        return value_portfolio(pan, portfolio, prices, current_time)
 
-            elif category == "ETF":
-                item["price_per_unit"] = gold_price if item["type"] == "Gold" else silver_price
-                item["total_value"] = item["quantity"] * item["price_per_unit"]
-
-            elif category == "Fixed Deposits":
-                item["total_value"] = calculate_fd_maturity(item["investment"], item["interest_rate"], item["duration"])
-
-            elif category == "Recurring Deposits":
-                item["total_value"] = calculate_rd_maturity(item["monthly_deposit"], item["interest_rate"], item["duration"])
+def fetch_portfolio_prices(portfolio, instruments=None):
+    """
+    Fetch every market price a portfolio needs, keyed by category and holding name (NSE
+    symbol for ETFs). `instruments` ({category: [key, ...]}) skips the scan of the holdings.
+    """
+    if instruments is None:
+        instruments = portfolio_instruments(portfolio)
+    return {
+        "Stocks": {name: get_live_price(name) for name in instruments["Stocks"]},
+        "Mutual Funds": {name: get_live_nav(name) for name in instruments["Mutual Funds"]},
+        "ETF": {symbol: get_etf_price(symbol, ETF_FALLBACK_PRICES.get(symbol))
+                for symbol in instruments["ETF"] if symbol},
+    }
 
-            elif category == "Government Schemes":
-                item["total_value"] = calculate_government_scheme_maturity(item["investment"], item["interest_rate"], item["duration"])
+def value_portfolio(pan, portfolio, prices, current_time):
+    """
+    Apply pre-fetched prices and save the snapshot. Only holdings whose instrument price
+    moved since the last valuation are rewritten (see revaluation.py). Holdings without a
+    price are marked in "price_status"; such a valuation is served but not timestamped,
+    so the next request retries, and an unpriced one is not recorded in the history.
+    """
+    with portfolio_lock(pan):  # Holdings cannot be upserted mid-valuation
+        valuation = get_valuation(pan, portfolio, fixed_income_value)
+        rebuilt = not valuation.valued
+        changed = valuation.apply(prices)
+        if "price_status" not in portfolio:
+            portfolio["last_updated"] = current_time  # Store timestamp
+
+        # A fresh state has nothing to compare against, so the fingerprint decides
+        save_user_portfolio(pan, portfolio, changed=None if rebuilt else changed > 0)
+        portfolio["version"] = get_portfolio_version(pan)
+
+    if "unpriced" not in portfolio.get("price_status", {}):
+        try:
+            valuation_history.record_snapshot(pan, portfolio)
+        except Exception as e:
+            print(f"Error recording valuation snapshot for {pan}: {e}")
 
-            total_category_value += item["total_value"]
+    return portfolio
 
-        details["total_value"] = total_category_value
-        total_portfolio_value += total_category_value
+def get_portfolio_analysis(pan, portfolio):
+    """Risk analysis and recommendations, memoized on the valuation version they were computed from."""
+    version = get_portfolio_version(pan)
+    analysis = get_cached_analysis(pan, version)
+    cache_lookup("analysis", analysis is not None)
+    if analysis is None:
+        with stage("risk_analysis"):
+            risk_analysis = calculate_risk_analysis(portfolio)
+        with stage("recommendations"):
+            recommendations = generate_recommendations(portfolio, risk_analysis)
+        analysis = {
+            "risk_analysis": risk_analysis,
+            "recommendations": recommendations
+        }
+        save_portfolio_analysis(pan, version, analysis)
+    return analysis
 
-    portfolio["total_portfolio_value"] = total_portfolio_value
-    portfolio["last_updated"] = current_time  # Store timestamp
+# Keep hot quotes, prices and valuations warm during market hours
+scheduler.register("quote", lambda symbol: get_quote_nse(symbol, force=True), CACHE_EXPIRATION)
+scheduler.register("price", lambda name: get_live_price(name, force=True), CACHE_EXPIRATION)
+scheduler.register("portfolio", lambda pan: calculate_portfolio(pan, force=True), CACHE_EXPIRATION_SECONDS)
+register_amfi_refresh(lambda: get_fund_universe(force_refresh=True))
+if os.environ.get("REFRESH_SCHEDULER", "1") == "1":
+    scheduler.start()
 
-    if total_portfolio_value > 0:
-        for category, details in portfolio["assets"].items():
-            for item in details["holdings"]:
-                item["allocation"] = f"{(item['total_value'] / total_portfolio_value) * 100:.2f}%"
+# Annualised volatility at which the risk score reaches 1.0
+FULL_RISK_VOLATILITY = 20.0
 
-    save_user_portfolio(pan, portfolio)  # Save updated portfolio to database
+def calculate_risk_analysis(portfolio_data):
+    """
+    Score portfolio risk from the covariance of the holdings' daily returns.
+    Falls back to fixed per-category weights when no price history is available.
+    """
+    try:
+        metrics = analyze_portfolio_risk(portfolio_data)
+    except Exception as e:
+        print(f"Error computing risk metrics: {e}")
+        metrics = None
 
-    return portfolio
+    if metrics:
+        risk_score = min(metrics["volatility_annual"] / FULL_RISK_VOLATILITY, 1.0)
+        return {"risk_score": round(risk_score, 2), "risk_level": risk_level_for(risk_score), "metrics": metrics}
 
-def calculate_risk_analysis(portfolio_data):
     risk_weights = {
         "Stocks": 0.9,
         "Mutual Funds": 0.65,
@@ -210,46 +359,26 @@ def calculate_risk_analysis(portfolio_data):
         allocation_ratio = category_value / total_value if total_value else 0
         risk_score += allocation_ratio * risk_weights.get(category, 0)
 
+    return {"risk_score": round(risk_score, 2), "risk_level": risk_level_for(risk_score)}
+
+def risk_level_for(risk_score):
     if risk_score >= 0.75:
-        risk_level = "High Risk"
+        return "High Risk"
     elif risk_score >= 0.5:
-        risk_level = "Moderate Risk"
-    else:
-        risk_level = "Low Risk"
-
-    return {"risk_score": round(risk_score, 2), "risk_level": risk_level}
+        return "Moderate Risk"
+    return "Low Risk"
 
 def generate_recommendations(portfolio_data, risk_analysis):
-    recommendations = []
-    risk_level = risk_analysis.get("risk_level")
-    
-    # Recommendation based on risk level
-    if risk_level == "High Risk":
-        recommendations.append("Consider reducing exposure to high-volatility assets like stocks and aggressive mutual funds.")
-        recommendations.append("Increase allocation in Fixed Deposits, Recurring Deposits, or Government Schemes for stability.")
-    elif risk_level == "Moderate Risk":
-        recommendations.append("Maintain a balanced portfolio by ensuring a mix of equities and fixed-income instruments.")
-        recommendations.append("Rebalance periodically to adjust to market changes and protect against market volatility.")
-    else:  # Low Risk
-        recommendations.append("Your portfolio is conservative. Consider adding a small allocation to growth-oriented assets for higher returns.")
-        recommendations.append("Review opportunities in equity-linked savings schemes or diversified equity mutual funds.")
-    
-    # Additional recommendation based on asset allocation
-    total_assets = portfolio_data["total_portfolio_value"]
-    if total_assets > 0:
-        # Example: Check if stocks form a very high portion of the portfolio.
-        stocks_value = portfolio_data["assets"].get("Stocks", {}).get("total_value", 0)
-        if stocks_value / total_assets > 0.7:
-            recommendations.append("Stocks constitute over 70% of your portfolio. Diversify by reducing equity exposure.")
-    
-    return recommendations
+    """Evaluate the configured recommendation rules (recommendation_rules.json) for a portfolio."""
+    return recommend(portfolio_data, risk_analysis.get("risk_level"))
 
 def check_bad_stock(stock_name):
     """Checks if a stock is 'bad' based on price drop and historical performance."""
     try:
         stock_symbol = stock_name.replace(" ", "").upper() + ".NS"  # Convert name to NSE ticker
         stock = yf.Ticker(stock_symbol)
-        historical_data = stock.history(period="3mo")  # Check the past 3 months
+        historical_data = get_upstream("yfinance").call(ticker_history, stock, "3mo", operation="history",
+                                                        fallback=pd.DataFrame)  # Past 3 months
 
         if historical_data.empty:
             return {"status": "error", "message": "No data available for this stock"}
@@ -275,51 +404,29 @@ def check_bad_stock(stock_name):
 def check_bad_mutual_fund(mutual_fund_name):
     """Checks if a mutual fund is 'bad' based on NAV, expense ratio, and AUM."""
     try:
-        url = "https://www.amfiindia.com/spages/NAVAll.txt"
-        response = requests.get(url)
-        response_text = response.text.split("\n")
-
-        if not response_text:
-            return {"status": "error", "message": "No data returned from AMFI."}
-
-        for line in response_text:
-            columns = line.split(";")
-            if len(columns) > 4:
-                fund_name_amfi = columns[3].strip().lower()
-                fund_name_input = mutual_fund_name.strip().lower()
-
-                if fund_name_input in fund_name_amfi:  # Substring match for mutual fund name
-                    try:
-                        nav = float(columns[4].strip())
-                        expense_ratio = float(columns[7].strip())
-                        aum = float(columns[8].strip())
-
-                        # Check if NAV is too low (indicating potential underperformance)
-                        if nav < 10:
-                            return {
-                                "status": "bad",
-                                "message": f"The mutual fund {mutual_fund_name} has a low NAV: {nav:.2f}, indicating potential underperformance."
-                            }
-
-                        # Check if expense ratio is too high (greater than 2%)
-                        if expense_ratio > 2:
-                            return {
-                                "status": "bad",
-                                "message": f"The mutual fund {mutual_fund_name} has a high expense ratio: {expense_ratio:.2f}%, which may be too costly."
-                            }
-
-                        # Check if AUM is too low (less than 100 crore)
-                        if aum < 100:
-                            return {
-                                "status": "bad",
-                                "message": f"The mutual fund {mutual_fund_name} has a low AUM: {aum:.2f} crore, indicating lack of investor confidence."
-                            }
-
-                    except ValueError as e:
-                        continue  # Skip lines with missing or invalid data
+        fund = lookup_fund(mutual_fund_name)
+        if fund is None:
+            return {"status": "error", "message": f"No AMFI scheme found matching {mutual_fund_name}."}
+
+        # Rules are precomputed for the whole universe by fund_screener.screen_universe
+        if fund["low_nav"]:
+            return {
+                "status": "bad",
+                "message": f"The mutual fund {mutual_fund_name} has a low NAV: {fund['nav']:.2f}, indicating potential underperformance."
+            }
+        if fund["high_expense_ratio"]:
+            return {
+                "status": "bad",
+                "message": f"The mutual fund {mutual_fund_name} has a high expense ratio: {fund['expense_ratio']:.2f}%, which may be too costly."
+            }
+        if fund["low_aum"]:
+            return {
+                "status": "bad",
+                "message": f"The mutual fund {mutual_fund_name} has a low AUM: {fund['aum']:.2f} crore, indicating lack of investor confidence."
+            }
 
         return {"status": "good", "message": "The mutual fund is performing well."}
-    
+
     except Exception as e:
         return {"status": "error", "message": f"Error checking mutual fund data: {e}"}
 
@@ -335,6 +442,9 @@ def get_portfolio():
         portfolio = calculate_portfolio(pan)
 
         if portfolio:
+            if data.get("include_returns"):
+                with stage("returns"):
+                    return jsonify({**portfolio, "returns": holding_returns(portfolio)})
             return jsonify(portfolio)
         else:
             return jsonify({"error": "No portfolio found for the given PAN"}), 404
@@ -350,26 +460,239 @@ def get_recommendations():
             return jsonify({"error": "PAN number is required"}), 400
 
         pan = data["pan"].upper()
-        portfolio = get_cached_portfolio(pan)  # Fetch from database
+        portfolio = get_cached_portfolio(pan) or calculate_portfolio(pan)  # Reuse the /getPortfolio valuation
         if not portfolio:
             return jsonify({"error": "No portfolio found for the given PAN"}), 404
-        
-        risk_analysis = calculate_risk_analysis(portfolio)
-        recommendations = generate_recommendations(portfolio, risk_analysis)
 
-        return jsonify({
-            "risk_analysis": risk_analysis,
-            "recommendations": recommendations
-        })
+        return jsonify(get_portfolio_analysis(pan, portfolio))
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route("/getPortfolioInsights", methods=["POST"])
+def get_portfolio_insights():
+    """Valuation, risk analysis and recommendations in one round-trip."""
+    try:
+        data = request.get_json()
+        if not data or "pan" not in data:
+            return jsonify({"error": "PAN number is required"}), 400
+
+        pan = data["pan"].upper()
+        portfolio = calculate_portfolio(pan)
+        if not portfolio:
+            return jsonify({"error": "No portfolio found for the given PAN"}), 404
+
+        return jsonify({"portfolio": portfolio, **get_portfolio_analysis(pan, portfolio)})
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route("/getPortfolioHistory", methods=["POST"])
+def get_portfolio_history():
+    """Daily valuation history with returns and allocation drift, downsampled for long ranges."""
+    try:
+        data = request.get_json()
+        if not data or "pan" not in data:
+            return jsonify({"error": "PAN number is required"}), 400
+
+        pan = data["pan"].upper()
+        start = datetime.date.fromisoformat(data["start"]) if data.get("start") else None
+        end = datetime.date.fromisoformat(data["end"]) if data.get("end") else None
+        max_points = int(data.get("max_points", valuation_history.DEFAULT_MAX_POINTS))
+
+        history = valuation_history.portfolio_history(pan, start, end, max_points)
+        if history is None:
+            return jsonify({"error": "No valuation history for the given PAN and range"}), 404
+        return jsonify(history)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route("/backfillPortfolioHistory", methods=["POST"])
+def backfill_portfolio_history():
+    """Reconstruct past daily valuations for one or more PANs from cached price histories."""
+    try:
+        data = request.get_json() or {}
+        pans = data.get("pans") or ([data["pan"]] if data.get("pan") else [])
+        if not pans:
+            return jsonify({"error": "PAN number is required"}), 400
+
+        portfolios = {}
+        for pan in pans:
+            portfolio = calculate_portfolio(pan.upper())
+            if portfolio:
+                portfolios[pan.upper()] = portfolio
+        with stage("history_backfill"):
+            filled = valuation_history.backfill(portfolios)
+        return jsonify({"pans": list(portfolios), "missing": [p.upper() for p in pans if p.upper() not in portfolios],
+                        "days_filled": filled})
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+@app.route("/stressTest", methods=["POST"])
+def stress_test():
+    """
+    P&L of one PAN ("pan") or many ("pans", every portfolio when empty) under the scenario
+    library, a subset of it ("scenarios") or ad-hoc shocks ("custom"). Per-holding P&L is
+    returned for the scenarios listed in "detail" (the historical episodes by default for one PAN).
+    """
+    try:
+        data = request.get_json() or {}
+        if data.get("pan"):
+            pans = [data["pan"].upper()]
+        else:
+            pans = [pan.upper() for pan in data.get("pans") or user_portfolios]
+
+        portfolios = {}
+        for pan in pans:
+            portfolio = calculate_portfolio(pan)
+            if portfolio:
+                portfolios[pan] = portfolio
+        if not portfolios:
+            return jsonify({"error": "No portfolio found for the given PAN"}), 404
+
+        detail = data.get("detail")
+        if detail is None and len(portfolios) == 1:
+            library = get_library()
+            detail = [i for i, kind in zip(library.ids, library.kinds) if kind == "historical"]
+        with stage("stress_test"):
+            results = stress_portfolios(portfolios, data.get("scenarios"), data.get("custom"), detail, history_cache)
+        if data.get("pan"):
+            return jsonify(results[pans[0]])
+        return jsonify({"results": results, "missing": [pan for pan in pans if pan not in portfolios]})
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route("/getLookThrough", methods=["POST"])
+def get_look_through():
+    """
+    Underlying stock and sector exposure of one PAN ("pan") or many ("pans", every
+    portfolio when empty): direct stocks plus the disclosed holdings of each mutual fund.
+    """
+    try:
+        data = request.get_json() or {}
+        if data.get("pan"):
+            pans = [data["pan"].upper()]
+        else:
+            pans = [pan.upper() for pan in data.get("pans") or user_portfolios]
+
+        portfolios = {}
+        for pan in pans:
+            portfolio = get_cached_portfolio(pan) or calculate_portfolio(pan)
+            if portfolio:
+                portfolios[pan] = portfolio
+        if not portfolios:
+            return jsonify({"error": "No portfolio found for the given PAN"}), 404
+
+        with stage("lookthrough"):
+            reports = lookthrough_bulk(portfolios, int(data.get("top", 25)))
+        if data.get("pan"):
+            return jsonify(reports[pans[0]])
+        return jsonify({"results": reports, "missing": [pan for pan in pans if pan not in portfolios]})
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route("/importHoldings", methods=["POST"])
+def import_holdings_route():
+    """
+    Bulk import holdings from an uploaded CSV ("file"), either a broker holdings export or a
+    CAS transaction statement ("format": "broker" / "cas", detected from the header otherwise).
+    Rows are parsed and upserted in batches, so the upload is never held in memory as a whole.
+    With "dry_run" the file is only parsed and resolved.
+    """
+    try:
+        upload = request.files.get("file")
+        if upload is None:
+            return jsonify({"error": "A CSV file is required"}), 400
+        file_format = request.form.get("format") or None
+        if file_format not in (None, "broker", "cas"):
+            return jsonify({"error": "format must be broker or cas"}), 400
+        batch_size = int(request.form.get("batch_size", IMPORT_BATCH_SIZE))
+        dry_run = request.form.get("dry_run", "").lower() in ("1", "true", "yes")
+
+        with stage("holdings_import"):
+            stats = import_holdings(io.TextIOWrapper(upload.stream, encoding="utf-8-sig"),
+                                    file_format, batch_size, dry_run=dry_run)
+        return jsonify(stats)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+def fetch_instrument_price(instrument):
+    """Live price for a streamed instrument key such as ("Stocks", "TCS") or ("ETF", "Gold")."""
+    category, name = instrument
+    if category == "Stocks":
+        return get_live_price(name)
+    if category == "Mutual Funds":
+        return get_live_nav(name)
+    if category == "ETF":
+        return get_etf_price(etf_symbol({"type": name}) or name, None)
+    return None
+
+price_hub = PriceHub(fetch_instrument_price)
+STREAM_HEARTBEAT_SECONDS = 15
+
+def sse_event(event, payload):
+    return f"event: {event}\ndata: {json.dumps(payload)}\n\n"
+
+@app.route("/streamPortfolio", methods=["GET"])
+def stream_portfolio():
+    """
+    Server-Sent Events stream of a PAN's valuation. Sends one "snapshot" event and then
+    "delta" events with only the prices, values and allocations that changed.
+    """
+    pan = request.args.get("pan", "").upper()
+    if not pan:
+        return jsonify({"error": "PAN number is required"}), 400
+
+    portfolio = get_cached_portfolio(pan) or calculate_portfolio(pan)
+    if not portfolio:
+        return jsonify({"error": "No portfolio found for the given PAN"}), 404
+
+    stream = PortfolioStream(portfolio)
+
+    def events():
+        subscription = price_hub.subscribe(stream.instruments(), stream.current_prices())
+        try:
+            yield sse_event("snapshot", stream.portfolio)
+            while True:
+                try:
+                    updates = dict([subscription.queue.get(timeout=STREAM_HEARTBEAT_SECONDS)])
+                except queue.Empty:
+                    yield ": heartbeat\n\n"  # Keeps proxies from closing the idle connection
+                    continue
+                while not subscription.queue.empty():  # Coalesce a burst into one delta
+                    instrument, price = subscription.queue.get_nowait()
+                    updates[instrument] = price
+
+                delta = stream.apply(updates)
+                if delta:
+                    yield sse_event("delta", delta)
+        finally:
+            price_hub.unsubscribe(subscription)
+
+    return Response(stream_with_context(events()), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
 @app.route("/checkBadStock", methods=["POST"])
 def check_stock():
     try:
         data = request.get_json()
-        if not data or "stock_name" not in data:
-            return jsonify({"error": "Stock name is required"}), 400
+        if not data or not any(key in data for key in ("stock_name", "stocks", "pan")):
+            return jsonify({"error": "Stock name, list of stocks or PAN is required"}), 400
+
+        # Screen a whole watchlist or a PAN's stock holdings in one batch
+        if "stocks" in data:
+            return jsonify(screen_stocks(data["stocks"]))
+
+        if "pan" in data:
+            portfolio = get_user_portfolio(data["pan"].upper())
+            if not portfolio:
+                return jsonify({"error": "No portfolio found for the given PAN"}), 404
+            holdings = portfolio["assets"].get("Stocks", {}).get("holdings", [])
+            return jsonify(screen_stocks([item["name"] for item in holdings]))
 
         stock_name = data["stock_name"]
         result = check_bad_stock(stock_name)
@@ -394,6 +717,20 @@ def check_mutual_fund():
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+@app.route("/screenMutualFunds", methods=["POST"])
+def screen_mutual_funds():
+    try:
+        data = request.get_json() or {}
+        result = screen_funds(
+            query=data.get("query"),
+            status=data.get("status"),
+            limit=int(data.get("limit", 50))
+        )
+        return jsonify(result)
+
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
 
 # Assumed base returns and worst-case drawdowns for asset classes.
 ASSET_CLASSES = {
@@ -515,11 +852,16 @@ def compute_expected_return(allocation, risk_category):
         return base_return + 0.04
     return base_return
 
-def forecast_wealth_growth(initial_wealth, annual_return, time_frame):
-    """Forecast yearly wealth growth based on the annual return."""
+def forecast_wealth_growth(initial_wealth, annual_return, time_frame, monthly_investment=0):
+    """
+    Forecast yearly wealth growth based on the annual return, with an optional SIP
+    invested at the start of every month (the same sum as the goal-planner sweep).
+    """
     growth = []
     for year in range(1, time_frame + 1):
         wealth = initial_wealth * ((1 + annual_return) ** year)
+        if monthly_investment:
+            wealth += float(goal_planner.sip_factor(annual_return, year)) * monthly_investment
         growth.append({"year": year, "wealth": round(wealth, 2)})
     return growth
 
@@ -558,18 +900,27 @@ def calculate_baskets():
         target_wealth = float(data.get("targetWealth", 0))
         time_frame = int(data.get("timeFrame", 0))
         investment_type = data.get("investmentType", "Lump-Sum")  # "Lump-Sum" or "SIP"
+        monthly_investment = float(data.get("monthlyInvestment", 0))  # Optional monthly SIP amount
 
         if current_wealth <= 0 or target_wealth <= 0 or time_frame <= 0:
             return jsonify({"error": "Invalid input values"}), 400
 
         req_cagr = calculate_cagr(current_wealth, target_wealth, time_frame)
+        backtest_table = backtest.get_table()
         market_scenarios = simulate_market_scenarios(req_cagr)
 
         baskets_result = {}
         for risk in ["Low", "Medium", "High"]:
             alloc = dynamic_allocation(risk, req_cagr, investment_type)
             exp_return = compute_expected_return(alloc, risk)
-            projection = forecast_wealth_growth(current_wealth, exp_return, time_frame)
+            realized = None
+            if backtest_table is not None:
+                realized = backtest_table.lookup(risk, investment_type, req_cagr, time_frame,
+                                                 current_wealth, monthly_investment, target_wealth)
+            if realized:
+                # Median realized CAGR over every historical window replaces the assumed returns
+                exp_return = realized["cagr"]["median"] / 100
+            projection = forecast_wealth_growth(current_wealth, exp_return, time_frame, monthly_investment)
             final_wealth = projection[-1]["wealth"]
             goal_met = final_wealth >= target_wealth
             shortfall = target_wealth - final_wealth if not goal_met else 0
@@ -580,7 +931,8 @@ def calculate_baskets():
                 "finalWealth": final_wealth,
                 "goalAchieved": goal_met,
                 "shortfall": round(shortfall, 2),
-                "wealthProjection": projection
+                "wealthProjection": projection,
+                "backtest": realized
             }
         
         feasibility = feasibility_check(req_cagr)
@@ -598,6 +950,131 @@ def calculate_baskets():
         return jsonify({"error": str(e)}), 500
 
 
+@app.route('/calculate-baskets/sweep', methods=['POST'])
+def calculate_baskets_sweep():
+    """
+    Goal-planner feasibility surface: every combination of "targetWealth", "timeFrame" and
+    "monthlyInvestment" (each a number, a list or {min, max, steps|step}) for the Low,
+    Medium and High baskets in one call, with minimum time frame and minimum SIP frontiers.
+    Each point uses the same allocation and return as /calculate-baskets.
+    """
+    try:
+        data = request.get_json() or {}
+        current_wealth = float(data.get("currentWealth", 0))
+        if current_wealth <= 0:
+            return jsonify({"error": "Invalid input values"}), 400
+        targets = goal_planner.sweep_axis(data.get("targetWealth", {}), "targetWealth")
+        years = goal_planner.sweep_axis(data.get("timeFrame", {"min": 1, "max": 30, "step": 1}), "timeFrame", integer=True)
+        sips = goal_planner.sweep_axis(data.get("monthlyInvestment", 0), "monthlyInvestment")
+        if targets.min() <= 0 or years.min() <= 0 or sips.min() < 0:
+            return jsonify({"error": "Invalid input values"}), 400
+        investment_type = data.get("investmentType", "SIP" if sips.max() > 0 else "Lump-Sum")
+
+        asset_returns = {asset: compute_dynamic_asset_return(asset) for asset in goal_planner.ASSETS}
+        with stage("goal_sweep"):
+            result = goal_planner.sweep(current_wealth, targets, years, sips, asset_returns,
+                                        investment_type, backtest.get_table())
+            response = goal_planner.to_json(result, targets, years, sips, bool(data.get("includeAllocation")))
+        return jsonify(response)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+# --------------------------
+# Rebalancing
+# --------------------------
+# Required CAGR at which dynamic_allocation returns each basket's baseline mix
+BASELINE_CAGR = {"Low": 0.08, "Medium": 0.10, "High": 0.15}
+RISK_LEVEL_BASKETS = {"Low Risk": "Low", "Moderate Risk": "Medium", "High Risk": "High"}
+
+def rebalance_target(data, pan, portfolio):
+    """
+    Target basket for a rebalance request: an explicit "target" allocation, a
+    "riskCategory" basket, or by default the basket matching the portfolio's risk level.
+    """
+    if data.get("target"):
+        return data["target"]
+    risk_category = data.get("riskCategory")
+    if risk_category is None:
+        risk_level = get_portfolio_analysis(pan, portfolio)["risk_analysis"]["risk_level"]
+        risk_category = RISK_LEVEL_BASKETS.get(risk_level, "Medium")
+    if risk_category not in BASELINE_CAGR:
+        raise ValueError(f"Unknown risk category: {risk_category}")
+    required_cagr = float(data["requiredCAGR"]) / 100 if data.get("requiredCAGR") else BASELINE_CAGR[risk_category]
+    return dynamic_allocation(risk_category, required_cagr, data.get("investmentType", "Lump-Sum"))
+
+def run_rebalance(pans, data):
+    """Value and rebalance many PANs, storing each plan. Returns (plans, errors)."""
+    portfolios, targets, errors = {}, {}, {}
+    for pan in pans:
+        try:
+            portfolio = calculate_portfolio(pan)
+            if not portfolio:
+                errors[pan] = "No portfolio found for the given PAN"
+                continue
+            targets[pan] = rebalance_target(data, pan, portfolio)
+            portfolios[pan] = portfolio  # Only PANs with a resolved target are rebalanced
+        except Exception as e:
+            errors[pan] = str(e)
+
+    with stage("rebalance"):
+        plans, failed = rebalance_bulk(portfolios, targets, data.get("cash", 0.0),
+                                       float(data.get("minTrade", MIN_TRADE_AMOUNT)))
+    for pan, plan in plans.items():
+        plan["pan"] = pan
+        plan["version"] = portfolios[pan].get("version")
+        save_rebalance_plan(pan, plan)
+    for pan, error in failed.items():
+        errors.setdefault(pan, error)  # Keep the first reason a PAN failed
+    return plans, errors
+
+@app.route("/rebalance", methods=["POST"])
+def rebalance_portfolio():
+    """Trade list moving a PAN's holdings towards a target basket."""
+    try:
+        data = request.get_json()
+        if not data or "pan" not in data:
+            return jsonify({"error": "PAN number is required"}), 400
+
+        pan = data["pan"].upper()
+        plans, errors = run_rebalance([pan], data)
+        if pan in plans:
+            return jsonify(plans[pan])
+        status = 404 if errors.get(pan) == "No portfolio found for the given PAN" else 400
+        return jsonify({"error": errors.get(pan, "Rebalance failed")}), status
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route("/rebalanceBulk", methods=["POST"])
+def rebalance_portfolios():
+    """Rebalance a list of PANs (every portfolio when "pans" is omitted)."""
+    try:
+        data = request.get_json() or {}
+        pans = [pan.upper() for pan in data.get("pans") or user_portfolios]
+        plans, errors = run_rebalance(pans, data)
+        return jsonify({"plans": plans, "errors": errors})
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route("/getRebalancePlan", methods=["POST"])
+def get_rebalance_plan_route():
+    """Latest stored plan, e.g. from the scheduled after-close rebalance run."""
+    try:
+        data = request.get_json()
+        if not data or "pan" not in data:
+            return jsonify({"error": "PAN number is required"}), 400
+        plan = get_rebalance_plan(data["pan"].upper())
+        if plan is None:
+            return jsonify({"error": "No rebalance plan for the given PAN"}), 404
+        return jsonify(plan)
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+# Scheduled bulk run after each NSE close, each user towards the basket of their risk level
+if os.environ.get("REBALANCE_SCHEDULE", "0") == "1":
+    scheduler.register_daily(lambda: run_rebalance(list(user_portfolios), {}), last_session_close)
+
 # --------------------------
 # Helper Functions Machine Learning
 # --------------------------
@@ -617,17 +1094,19 @@ def safe_serialize(obj):
         return obj.to_dict()
     return obj
 
-def fetch_stock_data(ticker, max_retries=3, delay=5):
-    """Handle Yahoo Finance timeouts with retries"""
-    for attempt in range(max_retries):
-        try:
-            df = yf.download(ticker, period="max", auto_adjust=True, timeout=20)
-            if not df.empty:
-                return df
-        except Exception as e:
-            print(f"Attempt {attempt + 1}: Failed to fetch data for {ticker}. Error: {e}")
-            time.sleep(delay)
-    return None  # Return None if all retries fail
+def fetch_stock_data(ticker, max_retries=3):
+    """Handle Yahoo Finance timeouts with retries (jittered backoff, skipped while the breaker is open)"""
+    def download():
+        df = yf.download(ticker, period="max", auto_adjust=True, timeout=20)
+        if df.empty:
+            raise ValueError(f"No data returned for {ticker}")
+        return df
+
+    try:
+        return get_upstream("yfinance").call(download, operation="download", retries=max_retries - 1)
+    except Exception as e:
+        print(f"Failed to fetch data for {ticker}. Error: {e}")
+        return None  # Return None if all retries fail
 
 # --------------------------
 # Compute Technical Indicators
@@ -665,7 +1144,7 @@ def add_technical_indicators(df):
 def add_fundamental_indicators(df, ticker):
     tkr = yf.Ticker(ticker)
     try:
-        info = tkr.info
+        info = get_upstream("yfinance").call(lambda: tkr.info, operation="info")
     except Exception as e:
         print(f"Failed to fetch fundamentals for {ticker}. Error: {e}")
         info = {}
@@ -685,85 +1164,106 @@ def add_fundamental_indicators(df, ticker):
     
     return df
 
-# --------------------------
-# LSTM Model
-# --------------------------
-def create_lstm_model(input_shape):
-    model = Sequential([
-        LSTM(128, return_sequences=True, input_shape=input_shape),
-        Dropout(0.2),
-        LSTM(64, return_sequences=False),
-        Dropout(0.2),
-        Dense(32, activation='relu'),
-        Dense(1, activation='linear')
-    ])
-    model.compile(optimizer='adam', loss='mse')
-    return model
-
 # --------------------------
 # Flask API Route
 # --------------------------
-@app.route('/predict', methods=['POST'])
-def predict():
-    data = request.get_json()
-    stock = data.get("stock")
-    prediction_period = int(data.get("prediction_period", 63))
+MODEL_EXPORT = os.environ.get("MODEL_EXPORT", "1") == "1"
+MODEL_QUANTIZE = os.environ.get("MODEL_QUANTIZE", "float32")
+FEATURE_ROW_TTL = int(os.environ.get("FEATURE_ROW_TTL", 6 * 3600))  # Seconds; features are built from daily bars
+
+PREDICTION_FEATURES = ["MA50", "MA200", "RSI", "MACD", "BB_Upper", "BB_Lower", "ADX", "OBV",
+                       "MarketCap", "TrailingPE", "ForwardPE", "PriceToBook", "DividendYield", "Beta"]
 
-    df = yf.download(stock, period="max", auto_adjust=True)
-    if df.empty:
-        return jsonify({"error": f"No data fetched for {stock}"}), 400
+feature_rows = {}  # (stock, prediction_period) -> (latest feature row, time it was built)
+feature_rows_lock = threading.Lock()
+
+def build_training_frame(stock, prediction_period):
+    """(X, y) for a stock from its full price history, or None when no history could be fetched."""
+    df = fetch_stock_data(stock, max_retries=2)
+    if df is None:
+        return None
 
     df["Stock"] = stock
     df = df.sort_index()
-    df_ti = add_technical_indicators(df)
+    with stage("feature_engineering"):
+        df_ti = add_technical_indicators(df)
     df_ti = add_fundamental_indicators(df_ti, stock)
 
     df_ti["Target"] = (df_ti["Close"].shift(-prediction_period) / df_ti["Close"]) - 1
     df_ti = df_ti.iloc[:-prediction_period]
 
-    features = ["MA50", "MA200", "RSI", "MACD", "BB_Upper", "BB_Lower", "ADX", "OBV",
-                "MarketCap", "TrailingPE", "ForwardPE", "PriceToBook", "DividendYield", "Beta"]
-    
-    X = df_ti[features].dropna()
+    X = df_ti[PREDICTION_FEATURES].dropna()
     y = df_ti["Target"].dropna()
 
-    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
-
-    base_models = [
-        ('rf', RandomForestRegressor(n_estimators=100, random_state=42)),
-        ('gbr', GradientBoostingRegressor(random_state=42)),
-        ('svr', SVR()),
-        ('ridge', Ridge())
-    ]
-
-    stacking_reg = StackingRegressor(
-        estimators=base_models,
-        final_estimator=LinearRegression(),
-        cv=5
-    )
-
-    pipeline = Pipeline([
-        ('imputer', SimpleImputer(strategy='median')),
-        ('scaler', StandardScaler()),
-        ('stacking', stacking_reg)
-    ])
+    with feature_rows_lock:
+        feature_rows[(stock, prediction_period)] = (X.iloc[-1].to_numpy(dtype=float), time.time())
+    return X, y
 
-    pipeline.fit(X_train, y_train)
+def latest_feature_row(stock, prediction_period, model):
+    """
+    The feature row an exported model predicts from: the cached row, else the one stored
+    with the export, while it is fresh; the history is only refetched once both are stale.
+    """
+    with feature_rows_lock:
+        cached = feature_rows.get((stock, prediction_period))
+    if cached is None and model.latest_row is not None:
+        cached = (model.latest_row, model.exported_at)
+    if cached is not None and quote_is_fresh(cached[1], FEATURE_ROW_TTL):
+        return cached[0]
+    if build_training_frame(stock, prediction_period) is None:
+        return None
+    with feature_rows_lock:
+        return feature_rows[(stock, prediction_period)][0]
 
-    # Prepare latest data for LSTM
-    scaler = MinMaxScaler()
-    X_scaled = scaler.fit_transform(X_train)
-    X_lstm = np.reshape(X_scaled, (X_scaled.shape[0], 1, X_scaled.shape[1]))
+def run_prediction(stock, prediction_period=63, retrain=False):
+    """
+    Predict a stock's growth with the stacking + LSTM ensemble. A fresh exported model is
+    evaluated by the inference runtime on the cached latest feature row; otherwise (or with
+    retrain) the ensemble is trained on the stock's history and exported for later requests.
+    """
+    model = None if retrain else inference.get_model(stock, prediction_period)
+    if model is not None and model.features == PREDICTION_FEATURES:
+        row = latest_feature_row(stock, prediction_period, model)
+        if row is None:
+            return {"error": f"No data fetched for {stock}"}, 400
+        with stage("predict_compiled"):
+            final_prediction = inference.predictor.predict(model, row)
+        return {"stock": stock, "predicted_growth_percent": round(final_prediction * 100, 2)}, 200
+
+    frame = build_training_frame(stock, prediction_period)
+    if frame is None:
+        return {"error": f"No data fetched for {stock}"}, 400
+    X, y = frame
+
+    import training  # scikit-learn and TensorFlow load on the first retrain only
+
+    pipeline, lstm_model, scaler = training.train_models(X, y)
+    latest_row = X.iloc[-1].to_numpy(dtype=float)
+    final_prediction = training.predict(pipeline, lstm_model, scaler, latest_row)
+
+    if MODEL_EXPORT:
+        try:
+            with stage("export_models"):
+                export_models(stock, prediction_period, PREDICTION_FEATURES, pipeline, lstm_model, scaler,
+                              MODEL_QUANTIZE, latest_row=latest_row)
+        except Exception as e:
+            print(f"Model export failed for {stock}: {e}")
 
-    lstm_model = create_lstm_model((1, X_scaled.shape[1]))
-    lstm_model.fit(X_lstm, y_train, epochs=50, batch_size=32, verbose=1)
+    return {"stock": stock, "predicted_growth_percent": round(final_prediction * 100, 2)}, 200
 
-    predicted_growth = pipeline.predict([X.iloc[-1].values])[0]
-    predicted_lstm = lstm_model.predict(X_lstm[-1].reshape(1, 1, X_lstm.shape[2]))[0][0]
+@app.route('/predict', methods=['POST'])
+def predict():
+    data = request.get_json()
+    stock = data.get("stock")
+    prediction_period = int(data.get("prediction_period", 63))
 
-    final_prediction = (predicted_growth + predicted_lstm) / 2
+    result, status = run_prediction(stock, prediction_period, bool(data.get("retrain")))
+    return jsonify(result), status
 
-    return jsonify({"stock": stock, "predicted_growth_percent": round(final_prediction * 100, 2)})
+@app.route("/upstreamStatus", methods=["GET"])
+def upstream_status_route():
+    """Circuit breaker state and recent p95 latency per upstream provider."""
+    return jsonify(upstream_status())
 
 @app.route("/get_stock_suggestions", methods=["GET"])
 def get_stock_suggestions():
@@ -778,7 +1278,8 @@ def get_stock_suggestions():
     }
 
     try:
-        response = requests.get(url, headers=headers)
+        response = get_upstream("yahoo_search").call(
+            lambda: requests.get(url, headers=headers, timeout=10), operation="search", hedge=True)
         data = response.json()
 
         stocks = []
@@ -4,6 +4,7 @@ import yfinance as yf
 import requests
 from data import get_user_portfolio  # Import the database functions
 import time
+from database import save_user_portfolio, get_cached_portfolio, get_portfolio_version, save_portfolio_analysis, get_cached_analysis  # Import database functions
 
 app = Flask(__name__)
 CORS(app, resources={r"/*": {"origins": "*"}})  # Enable CORS for frontend
@@ -115,8 +116,14 @@ def calculate_rd_maturity(monthly_deposit, rate, months):
     return round(maturity_value, 2)
 
 
+CACHE_EXPIRATION_SECONDS = 3600  # 1 hour
+
 def calculate_portfolio(pan):
     """Dynamically fetch prices and calculate portfolio value."""
+    cached = get_cached_portfolio(pan)
+    if cached and (time.time() - cached["last_updated"]) < CACHE_EXPIRATION_SECONDS:
+        return cached  # Reuse the recent valuation instead of re-fetching every price
+
     portfolio = get_user_portfolio(pan)  # Fetch portfolio from database
     if not portfolio:
         return None
@@ -170,7 +177,23 @@ def calculate_portfolio(pan):
             for item in details["holdings"]:
                 item["allocation"] = f"{(item['total_value'] / total_portfolio_value) * 100:.2f}%"
 
-    return {"assets": portfolio["assets"], "total_portfolio_value": total_portfolio_value}
+    result = {"assets": portfolio["assets"], "total_portfolio_value": total_portfolio_value, "last_updated": time.time()}
+    save_user_portfolio(pan, result)
+    result["version"] = get_portfolio_version(pan)
+    return result
+
+def get_portfolio_analysis(pan, portfolio):
+    """Risk analysis and recommendations, memoized on the valuation version they were computed from."""
+    version = get_portfolio_version(pan)
+    analysis = get_cached_analysis(pan, version)
+    if analysis is None:
+        risk_analysis = calculate_risk_analysis(portfolio)
+        analysis = {
+            "risk_analysis": risk_analysis,
+            "recommendations": generate_recommendations(portfolio, risk_analysis)
+        }
+        save_portfolio_analysis(pan, version, analysis)
+    return analysis
 
 def calculate_risk_analysis(portfolio_data):
     risk_weights = {
@@ -332,14 +355,25 @@ def get_recommendations():
         portfolio = calculate_portfolio(pan)
         if not portfolio:
             return jsonify({"error": "No portfolio found for the given PAN"}), 404
-        
-        risk_analysis = calculate_risk_analysis(portfolio)
-        recommendations = generate_recommendations(portfolio, risk_analysis)
-        
-        return jsonify({
-            "risk_analysis": risk_analysis,
-            "recommendations": recommendations
-        })
+
+        return jsonify(get_portfolio_analysis(pan, portfolio))
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route("/getPortfolioInsights", methods=["POST"])
+def get_portfolio_insights():
+    """Valuation, risk analysis and recommendations in one round-trip."""
+    try:
+        data = request.get_json()
+        if not data or "pan" not in data:
+            return jsonify({"error": "PAN number is required"}), 400
+
+        pan = data["pan"].upper()
+        portfolio = calculate_portfolio(pan)
+        if not portfolio:
+            return jsonify({"error": "No portfolio found for the given PAN"}), 404
+
+        return jsonify({"portfolio": portfolio, **get_portfolio_analysis(pan, portfolio)})
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -0,0 +1,432 @@
+# server_async.py
+#
+# asyncio serving mode for the backend. Exposes the same routes as server.py through
+# an ASGI app, e.g.:
+#
+#     hypercorn server_async:app --bind 0.0.0.0:5000
+#
+# NSE, AMFI and Yahoo search calls go through one pooled httpx.AsyncClient, yfinance
+# (which has no async API) and CPU-bound valuation / ML work run in executors, so a
+# single process can keep hundreds of mostly-waiting /getPortfolio requests in flight.
+# Upstream calls share server.py's breakers, rate budgets and hedging (Upstream.acall).
+#
+# Routes delegated to server.py through call_sync_route run with its request hooks, so
+# request timing, X-Profile profiling and the stack sampler cover them; native routes are
+# timed by the hooks below. /metrics and /profiling/* are served as in server.py.
+
+import asyncio
+import io
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import httpx
+from quart import Quart, g, jsonify, make_response, request
+from quart_cors import cors
+
+import server  # Reuse the sync implementation for everything that is not I/O bound
+import metrics
+from price_stream import PortfolioStream
+from data import get_user_portfolio, portfolio_lock
+from database import get_cached_portfolio
+from fund_screener import AMFI_NAV_URL, AMFI_CACHE_EXPIRATION, _universe, build_universe, set_fund_universe
+from market_calendar import amfi_is_fresh, quote_is_fresh
+from metrics import REQUEST_SECONDS, METRICS_ENABLED
+from returns import holding_returns
+from resilience import get_upstream
+from holdings_import import IMPORT_BATCH_SIZE, import_holdings
+from revaluation import portfolio_instruments
+
+app = cors(Quart(__name__), allow_origin="*")
+
+# Blocking yfinance calls and CPU-bound work (valuation, screening, model training)
+IO_WORKERS = int(os.environ.get("ASYNC_IO_WORKERS", "64"))
+CPU_WORKERS = int(os.environ.get("ASYNC_CPU_WORKERS", str(os.cpu_count() or 4)))
+io_executor = ThreadPoolExecutor(max_workers=IO_WORKERS, thread_name_prefix="upstream")
+cpu_executor = ThreadPoolExecutor(max_workers=CPU_WORKERS, thread_name_prefix="compute")
+
+STREAM_POLL_SECONDS = 0.5  # How often a /streamPortfolio connection checks its subscription queue
+
+http_client = None
+nse_primed = False
+amfi_lock = None
+
+async def run_io(func, *args):
+    return await asyncio.get_running_loop().run_in_executor(io_executor, func, *args)
+
+async def run_cpu(func, *args):
+    return await asyncio.get_running_loop().run_in_executor(cpu_executor, func, *args)
+
+@app.before_serving
+async def startup():
+    global http_client, amfi_lock
+    http_client = httpx.AsyncClient(
+        headers=server.NSE_HEADERS,
+        timeout=httpx.Timeout(10.0, read=30.0),
+        limits=httpx.Limits(max_connections=100, max_keepalive_connections=20),
+        follow_redirects=True,
+    )
+    amfi_lock = asyncio.Lock()
+
+@app.after_serving
+async def shutdown():
+    await http_client.aclose()
+    io_executor.shutdown(wait=False)
+    cpu_executor.shutdown(wait=False)
+
+# --------------------------
+# Async upstream calls
+# --------------------------
+async def prime_nse_session():
+    """Call the NSE homepage once so the pooled client carries its cookies."""
+    global nse_primed
+    if nse_primed:
+        return
+    try:
+        await http_client.get(server.NSE_BASE_URL)
+        nse_primed = True
+    except Exception as e:
+        print("Error priming NSE session:", e)
+
+async def get_quote_nse(symbol):
+    """Async version of server.get_quote_nse sharing its 60-second cache."""
+    current_time = time.time()
+    cached = server.cache.get(symbol)
+    if cached and quote_is_fresh(cached["time"], server.CACHE_EXPIRATION):
+        return cached["data"]
+
+    await prime_nse_session()
+
+    async def fetch():
+        response = await http_client.get(f"{server.NSE_BASE_URL}/api/quote-equity?symbol={symbol}")
+        response.raise_for_status()
+        return response.json()
+
+    try:
+        data = await get_upstream("nse").acall(fetch, operation="quote-equity", hedge=True)
+        server.cache[symbol] = {"data": data, "time": current_time}
+        return data
+    except Exception as e:
+        print(f"Error fetching data for {symbol}: {e}")
+        return cached["data"] if cached else None  # Last known quote
+
+async def get_etf_price(symbol, fallback_price):
+    """Async version of server.get_etf_price: shared price table, ETF snapshot, then quote-equity."""
+    shared_price = server.read_shared_price(symbol)
+    if shared_price is not None:
+        return shared_price
+    snapshot_price = await run_io(server.snapshot_book.price, symbol)  # One /api/etf call covers every ETF
+    if snapshot_price is not None:
+        return snapshot_price
+    data = await get_quote_nse(symbol)
+    if data and "priceInfo" in data and "lastPrice" in data["priceInfo"]:
+        return float(data["priceInfo"]["lastPrice"])
+    print(f"No data found for {symbol}, using fallback.")
+    return fallback_price
+
+async def ensure_fund_universe():
+    """Refresh the AMFI scheme table without blocking the event loop."""
+    if _universe["table"] is not None and amfi_is_fresh(_universe["time"], AMFI_CACHE_EXPIRATION):
+        return
+    async with amfi_lock:  # Only one request downloads NAVAll.txt; the rest wait for it
+        if _universe["table"] is not None and amfi_is_fresh(_universe["time"], AMFI_CACHE_EXPIRATION):
+            return
+        async def fetch():
+            response = await http_client.get(AMFI_NAV_URL)
+            response.raise_for_status()
+            return response
+
+        try:
+            response = await get_upstream("amfi").acall(fetch, operation="navall", retries=1)
+            table = await run_cpu(build_universe, response.text)
+            set_fund_universe(table)
+        except Exception as e:
+            print(f"Error fetching AMFI NAV file: {e}")
+
+async def fetch_portfolio_prices(portfolio, instruments=None):
+    """Async version of server.fetch_portfolio_prices: all quotes are requested concurrently."""
+    if instruments is None:
+        instruments = portfolio_instruments(portfolio)
+    stocks, funds = instruments["Stocks"], instruments["Mutual Funds"]
+    etfs = [symbol for symbol in instruments["ETF"] if symbol]
+
+    results = await asyncio.gather(
+        ensure_fund_universe(),
+        *(get_etf_price(symbol, server.ETF_FALLBACK_PRICES.get(symbol)) for symbol in etfs),
+        *(run_io(server.get_live_price, name) for name in stocks),
+    )
+    navs = await run_io(lambda: {name: server.get_live_nav(name) for name in funds})  # Table lookups once warm
+
+    return {
+        "Stocks": dict(zip(stocks, results[1 + len(etfs):])),
+        "Mutual Funds": navs,
+        "ETF": dict(zip(etfs, results[1:1 + len(etfs)])),
+    }
+
+async def calculate_portfolio(pan):
+    """Async version of server.calculate_portfolio."""
+    portfolio = get_user_portfolio(pan)
+    if not portfolio:
+        return None
+
+    current_time = time.time()
+    last_updated = portfolio.get("last_updated")
+    if last_updated and server.valuation_is_fresh(portfolio, last_updated):
+        return portfolio
+
+    with portfolio_lock(pan):
+        instruments = server.get_valuation(pan, portfolio, server.fixed_income_value).instruments()
+    prices = await fetch_portfolio_prices(portfolio, instruments)
+    return await run_cpu(server.value_portfolio, pan, portfolio, prices, current_time)
+
+async def call_sync_route(view, json=None, query_string=None):
+    """
+    Run a Flask view from server.py in the CPU executor and convert its response. The
+    Flask request carries this request's path, method, headers and query string, and
+    server.app's before / after request hooks run around the view.
+    """
+    headers = {k: v for k, v in request.headers.items() if k.lower() not in ("content-length", "content-type", "host")}
+    options = {"path": request.path, "method": request.method, "headers": headers, "json": json,
+               "query_string": request.query_string if query_string is None else query_string}
+    g.sync_route = True  # Timed by server.app's hooks
+
+    def call():
+        with server.app.test_request_context(**options):
+            response = server.app.preprocess_request()
+            if response is None:
+                response = view()
+            response = server.app.process_response(server.app.make_response(response))
+            return response.get_data(), response.status_code, dict(response.headers)
+    return await run_cpu(call)
+
+if METRICS_ENABLED:
+    @app.before_request
+    async def start_timer():
+        g.metrics_start = time.perf_counter()
+
+    @app.after_request
+    async def record_request(response):
+        start = g.pop("metrics_start", None)
+        if start is not None and not g.get("sync_route"):
+            REQUEST_SECONDS.observe(time.perf_counter() - start, endpoint=request.endpoint or "unknown",
+                                    method=request.method, status=response.status_code)
+        return response
+
+# --------------------------
+# Routes
+# --------------------------
+@app.route("/getPortfolio", methods=["POST"])
+async def get_portfolio():
+    try:
+        data = await request.get_json()
+        if not data or "pan" not in data:
+            return jsonify({"error": "PAN number is required"}), 400
+
+        portfolio = await calculate_portfolio(data["pan"].upper())
+        if portfolio:
+            if data.get("include_returns"):
+                return jsonify({**portfolio, "returns": await run_cpu(holding_returns, portfolio)})
+            return jsonify(portfolio)
+        return jsonify({"error": "No portfolio found for the given PAN"}), 404
+
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route("/streamPortfolio", methods=["GET"])
+async def stream_portfolio():
+    """Async version of server.stream_portfolio: the subscription queue is drained on the event loop."""
+    pan = request.args.get("pan", "").upper()
+    if not pan:
+        return jsonify({"error": "PAN number is required"}), 400
+
+    portfolio = get_cached_portfolio(pan) or await calculate_portfolio(pan)
+    if not portfolio:
+        return jsonify({"error": "No portfolio found for the given PAN"}), 404
+
+    stream = PortfolioStream(portfolio)
+
+    async def events():
+        subscription = server.price_hub.subscribe(stream.instruments(), stream.current_prices())
+        try:
+            yield server.sse_event("snapshot", stream.portfolio)
+            quiet_since = time.monotonic()
+            while True:
+                updates = {}
+                while not subscription.queue.empty():  # Coalesce a burst into one delta
+                    instrument, price = subscription.queue.get_nowait()
+                    updates[instrument] = price
+                delta = stream.apply(updates) if updates else None
+                if delta:
+                    yield server.sse_event("delta", delta)
+                    quiet_since = time.monotonic()
+                elif time.monotonic() - quiet_since >= server.STREAM_HEARTBEAT_SECONDS:
+                    yield ": heartbeat\n\n"  # Keeps proxies from closing the idle connection
+                    quiet_since = time.monotonic()
+                await asyncio.sleep(STREAM_POLL_SECONDS)
+        finally:
+            server.price_hub.unsubscribe(subscription)
+
+    response = await make_response(events(), 200, {"Content-Type": "text/event-stream",
+                                                   "Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+    response.timeout = None  # Streams stay open until the client goes away
+    return response
+
+@app.route("/getRecommendations", methods=["POST"])
+async def get_recommendations():
+    try:
+        data = await request.get_json()
+        if not data or "pan" not in data:
+            return jsonify({"error": "PAN number is required"}), 400
+
+        pan = data["pan"].upper()
+        portfolio = get_cached_portfolio(pan) or await calculate_portfolio(pan)
+        if not portfolio:
+            return jsonify({"error": "No portfolio found for the given PAN"}), 404
+
+        await ensure_fund_universe()  # Fund rules read the AMFI table
+        return jsonify(await run_cpu(server.get_portfolio_analysis, pan, portfolio))
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route("/getPortfolioInsights", methods=["POST"])
+async def get_portfolio_insights():
+    try:
+        data = await request.get_json()
+        if not data or "pan" not in data:
+            return jsonify({"error": "PAN number is required"}), 400
+
+        pan = data["pan"].upper()
+        portfolio = await calculate_portfolio(pan)
+        if not portfolio:
+            return jsonify({"error": "No portfolio found for the given PAN"}), 404
+
+        analysis = await run_cpu(server.get_portfolio_analysis, pan, portfolio)
+        return jsonify({"portfolio": portfolio, **analysis})
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route("/getPortfolioHistory", methods=["POST"])
+async def get_portfolio_history():
+    return await call_sync_route(server.get_portfolio_history, json=await request.get_json())
+
+@app.route("/backfillPortfolioHistory", methods=["POST"])
+async def backfill_portfolio_history():
+    return await call_sync_route(server.backfill_portfolio_history, json=await request.get_json())
+
+@app.route("/checkBadStock", methods=["POST"])
+async def check_stock():
+    return await call_sync_route(server.check_stock, json=await request.get_json())
+
+@app.route("/checkBadMutualFund", methods=["POST"])
+async def check_mutual_fund():
+    await ensure_fund_universe()
+    return await call_sync_route(server.check_mutual_fund, json=await request.get_json())
+
+@app.route("/screenMutualFunds", methods=["POST"])
+async def screen_mutual_funds():
+    await ensure_fund_universe()
+    return await call_sync_route(server.screen_mutual_funds, json=await request.get_json())
+
+@app.route("/calculate-baskets", methods=["POST"])
+async def calculate_baskets():
+    return await call_sync_route(server.calculate_baskets, json=await request.get_json())
+
+@app.route("/calculate-baskets/sweep", methods=["POST"])
+async def calculate_baskets_sweep():
+    return await call_sync_route(server.calculate_baskets_sweep, json=await request.get_json())
+
+@app.route("/rebalance", methods=["POST"])
+async def rebalance_portfolio():
+    return await call_sync_route(server.rebalance_portfolio, json=await request.get_json())
+
+@app.route("/rebalanceBulk", methods=["POST"])
+async def rebalance_portfolios():
+    return await call_sync_route(server.rebalance_portfolios, json=await request.get_json())
+
+@app.route("/getRebalancePlan", methods=["POST"])
+async def get_rebalance_plan():
+    return await call_sync_route(server.get_rebalance_plan_route, json=await request.get_json())
+
+@app.route("/importHoldings", methods=["POST"])
+async def import_holdings_route():
+    try:
+        files = await request.files
+        form = await request.form
+        upload = files.get("file")
+        if upload is None:
+            return jsonify({"error": "A CSV file is required"}), 400
+        file_format = form.get("format") or None
+        if file_format not in (None, "broker", "cas"):
+            return jsonify({"error": "format must be broker or cas"}), 400
+        batch_size = int(form.get("batch_size", IMPORT_BATCH_SIZE))
+        dry_run = form.get("dry_run", "").lower() in ("1", "true", "yes")
+
+        stream = io.TextIOWrapper(upload.stream, encoding="utf-8-sig")
+        return jsonify(await run_cpu(lambda: import_holdings(stream, file_format, batch_size, dry_run=dry_run)))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route("/upstreamStatus", methods=["GET"])
+async def upstream_status_route():
+    return await call_sync_route(server.upstream_status_route)
+
+@app.route("/metrics", methods=["GET"])
+async def metrics_route():
+    return metrics.render_metrics(), 200, {"Content-Type": "text/plain; version=0.0.4"}
+
+@app.route("/profiling/sampling", methods=["GET", "POST"])
+async def profiling_sampling():
+    return await call_sync_route(server.app.view_functions["profiling_sampling"],
+                                 json=await request.get_json(silent=True))
+
+@app.route("/profiling/flamegraph", methods=["GET"])
+async def profiling_flamegraph():
+    return await call_sync_route(server.app.view_functions["profiling_flamegraph"])
+
+@app.route("/stressTest", methods=["POST"])
+async def stress_test():
+    return await call_sync_route(server.stress_test, json=await request.get_json())
+
+@app.route("/getLookThrough", methods=["POST"])
+async def get_look_through():
+    return await call_sync_route(server.get_look_through, json=await request.get_json())
+
+@app.route("/predict", methods=["POST"])
+async def predict():
+    data = await request.get_json()
+    result, status = await run_cpu(server.run_prediction, data.get("stock"), int(data.get("prediction_period", 63)),
+                                   bool(data.get("retrain")))
+    return jsonify(result), status
+
+@app.route("/get_stock_suggestions", methods=["GET"])
+async def get_stock_suggestions():
+    query = request.args.get("q", "").strip()
+
+    if len(query) < 2:
+        return jsonify({"stocks": []})
+
+    async def search():
+        return await http_client.get(
+            "https://query2.finance.yahoo.com/v1/finance/search",
+            params={"q": query},
+            headers={"User-Agent": "Mozilla/5.0"},
+        )
+
+    try:
+        response = await get_upstream("yahoo_search").acall(search, operation="search", hedge=True)
+        data = response.json()
+
+        stocks = []
+        for stock in data.get("quotes", []):
+            if "symbol" in stock and "shortname" in stock:
+                stocks.append({"symbol": stock["symbol"], "name": stock["shortname"]})
+
+        return jsonify({"stocks": stocks})
+    except Exception as e:
+        return jsonify({"error": str(e)})
+
+
+if __name__ == "__main__":
+    app.run(debug=True)
@@ -0,0 +1,139 @@
+# shared_prices.py
+#
+# Cross-process price table in multiprocessing.shared_memory. One refresher process
+# (price_refresher.py) owns and writes the table; every gunicorn worker attaches to it
+# read-only and reads prices through zero-copy NumPy views.
+#
+# Layout (one segment):
+#   header   int64[4]            magic, capacity, symbol count, layout version
+#   symbols  S{SYMBOL_BYTES}[N]  symbol stored in each slot (slot index = symbol id)
+#   slots    record[N]           seq (uint64), price (float64), timestamp (float64)
+#
+# Each slot is guarded by a seqlock: the writer makes seq odd, writes, then makes it
+# even again; readers retry until they see the same even seq before and after reading.
+
+import os
+from multiprocessing import resource_tracker, shared_memory
+
+import numpy as np
+
+PRICE_TABLE_NAME = os.environ.get("PRICE_TABLE_NAME", "invest360_prices")
+PRICE_TABLE_SLOTS = int(os.environ.get("PRICE_TABLE_SLOTS", "4096"))
+
+MAGIC = 0x1A7E360
+LAYOUT_VERSION = 1
+SYMBOL_BYTES = 24
+HEADER = np.dtype(np.int64)
+SLOT = np.dtype([("seq", np.uint64), ("price", np.float64), ("timestamp", np.float64)])
+MAX_READ_RETRIES = 100
+
+def table_size(capacity):
+    return 4 * HEADER.itemsize + capacity * SYMBOL_BYTES + capacity * SLOT.itemsize
+
+class SharedPriceTable:
+    def __init__(self, shm, owner):
+        self.shm = shm
+        self.owner = owner
+        self.header = np.ndarray((4,), dtype=HEADER, buffer=shm.buf)
+        if owner:
+            capacity = (shm.size - 4 * HEADER.itemsize) // (SYMBOL_BYTES + SLOT.itemsize)
+        else:
+            capacity = int(self.header[1])
+        offset = 4 * HEADER.itemsize
+        self.symbols = np.ndarray((capacity,), dtype=f"S{SYMBOL_BYTES}", buffer=shm.buf, offset=offset)
+        offset += capacity * SYMBOL_BYTES
+        self.slots = np.ndarray((capacity,), dtype=SLOT, buffer=shm.buf, offset=offset)
+        self.capacity = capacity
+        self.index = {}  # symbol -> slot, rebuilt lazily as the writer adds symbols
+
+    @classmethod
+    def create(cls, name=PRICE_TABLE_NAME, capacity=PRICE_TABLE_SLOTS):
+        """Create the table (refresher process only)."""
+        try:
+            stale = shared_memory.SharedMemory(name=name)
+            stale.close()
+            stale.unlink()  # Left over from a refresher that did not shut down cleanly
+        except FileNotFoundError:
+            pass
+        shm = shared_memory.SharedMemory(name=name, create=True, size=table_size(capacity))
+        table = cls(shm, owner=True)
+        table.slots[:] = 0
+        table.symbols[:] = b""
+        table.header[:] = (MAGIC, table.capacity, 0, LAYOUT_VERSION)
+        return table
+
+    @classmethod
+    def attach(cls, name=PRICE_TABLE_NAME):
+        """Attach to an existing table read-only, or return None if no refresher is running."""
+        try:
+            shm = shared_memory.SharedMemory(name=name)
+        except FileNotFoundError:
+            return None
+        # Readers must not unlink the segment when they exit
+        resource_tracker.unregister(shm._name, "shared_memory")
+        table = cls(shm, owner=False)
+        if table.header[0] != MAGIC or table.header[3] != LAYOUT_VERSION:
+            shm.close()
+            return None
+        return table
+
+    def close(self):
+        self.header = self.symbols = self.slots = None
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+    def _refresh_index(self):
+        count = int(self.header[2])
+        for slot in range(len(self.index), count):
+            self.index[self.symbols[slot].decode()] = slot
+
+    def slot_for(self, symbol):
+        slot = self.index.get(symbol)
+        if slot is None and len(self.index) < int(self.header[2]):
+            self._refresh_index()
+            slot = self.index.get(symbol)
+        return slot
+
+    # Writer side
+    def register(self, symbol):
+        """Assign a slot to a symbol (writer only)."""
+        slot = self.index.get(symbol)
+        if slot is not None:
+            return slot
+        count = int(self.header[2])
+        if count >= self.capacity:
+            raise RuntimeError("Shared price table is full; raise PRICE_TABLE_SLOTS")
+        self.symbols[count] = symbol.encode()[:SYMBOL_BYTES]
+        self.header[2] = count + 1  # Publish the slot only after its symbol is written
+        self.index[symbol] = count
+        return count
+
+    def write(self, symbol, price, timestamp):
+        slot = self.slots[self.register(symbol)]
+        slot["seq"] += 1  # Odd: write in progress
+        slot["price"] = price
+        slot["timestamp"] = timestamp
+        slot["seq"] += 1  # Even: consistent
+
+    # Reader side
+    def read(self, symbol):
+        """Return (price, timestamp) for a symbol, or None if it is not in the table."""
+        slot = self.slot_for(symbol)
+        if slot is None:
+            return None
+        record = self.slots[slot]
+        for _ in range(MAX_READ_RETRIES):
+            before = int(record["seq"])
+            if before & 1:
+                continue
+            price, timestamp = float(record["price"]), float(record["timestamp"])
+            if int(record["seq"]) == before:
+                return (price, timestamp) if before else None
+        return None
+
+def attach_price_table():
+    """Attach to the shared table when PRICE_TABLE_NAME is configured and a refresher is running."""
+    if not os.environ.get("PRICE_TABLE_NAME"):
+        return None
+    return SharedPriceTable.attach()
@@ -0,0 +1,167 @@
+# stress.py
+
+import itertools
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from holdings import FIXED_INCOME_CATEGORIES, NIFTY_SYMBOL, holdings_frame
+
+STRESS_SCENARIOS_FILE = os.environ.get(
+    "STRESS_SCENARIOS_FILE", os.path.join(os.path.dirname(__file__), "stress_scenarios.json"))
+
+FACTORS = ("equity", "gold", "silver", "rates")
+ETF_FACTORS = {"GOLDBEES.NS": "gold", "SILVERBEES.NS": "silver"}
+
+class ScenarioLibrary:
+    """
+    Scenarios compiled into one (factors x scenarios) shock matrix. Fixed scenarios come
+    from the library file; each grid expands into the cartesian product of its axes.
+    """
+
+    def __init__(self, config):
+        ids, names, kinds, columns = [], [], [], []
+        for scenario in config.get("scenarios", []):
+            ids.append(scenario["id"])
+            names.append(scenario["name"])
+            kinds.append(scenario.get("kind", "hypothetical"))
+            columns.append(self._column(scenario["shocks"]))
+        for grid in config.get("grids", []):
+            axes = list(grid["axes"])
+            values = [np.round(np.arange(lo, hi + step / 2, step), 4) for lo, hi, step in grid["axes"].values()]
+            for point in itertools.product(*values):
+                shocks = dict(zip(axes, point))
+                ids.append(grid["id"] + ":" + ",".join(f"{a}={v:g}" for a, v in shocks.items()))
+                names.append(grid["name"].format(**shocks))
+                kinds.append("grid")
+                columns.append(self._column(shocks))
+        self.ids = ids
+        self.names = names
+        self.kinds = kinds
+        self.index = {scenario_id: i for i, scenario_id in enumerate(ids)}
+        self.shocks = np.array(columns, dtype=float).T.reshape(len(FACTORS), len(ids))
+
+    @staticmethod
+    def _column(shocks):
+        unknown = set(shocks) - set(FACTORS)
+        if unknown:
+            raise ValueError(f"Unknown stress factors: {sorted(unknown)}")
+        return [float(shocks.get(factor, 0.0)) for factor in FACTORS]
+
+    def select(self, scenario_ids=None, custom=None):
+        """Shock matrix and labels for a subset of scenarios plus ad-hoc ones ({"name", "shocks"})."""
+        if scenario_ids is None:
+            positions = list(range(len(self.ids)))
+        else:
+            missing = [s for s in scenario_ids if s not in self.index]
+            if missing:
+                raise ValueError(f"Unknown scenarios: {missing}")
+            positions = [self.index[s] for s in scenario_ids]
+        ids = [self.ids[i] for i in positions]
+        names = [self.names[i] for i in positions]
+        shocks = self.shocks[:, positions]
+        for i, scenario in enumerate(custom or []):
+            ids.append(scenario.get("id", f"custom_{i}"))
+            names.append(scenario.get("name", ids[-1]))
+            shocks = np.hstack([shocks, np.array(self._column(scenario["shocks"]))[:, None]])
+        return ids, names, shocks
+
+def exposures(holdings, betas=None):
+    """
+    (holdings x factors) rupee sensitivity matrix. Stocks carry beta x value on equity
+    (beta 1 when unknown), mutual funds value on equity, gold and silver ETFs value on
+    their metal, other (equity index) ETFs value on equity with beta 1, and fixed income -duration x value on rates (duration = remaining years to maturity,
+    shocks in percentage points).
+    """
+    value = holdings["total_value"].to_numpy(dtype=float)
+    category = holdings["category"].to_numpy()
+    symbol = holdings["symbol"]
+    matrix = np.zeros((len(holdings), len(FACTORS)))
+
+    etf_factor = symbol.map(ETF_FACTORS).to_numpy()
+    beta = symbol.map(betas or {}).fillna(1.0).to_numpy(dtype=float)
+    equity = (category == "Stocks") | (category == "Mutual Funds") | ((category == "ETF") & pd.isna(etf_factor))
+    matrix[:, FACTORS.index("equity")] = np.where(equity, value * np.where(category == "Stocks", beta, 1.0), 0.0)
+
+    for factor in ("gold", "silver"):
+        matrix[:, FACTORS.index(factor)] = np.where(etf_factor == factor, value, 0.0)
+
+    years = pd.to_numeric(holdings["months_to_maturity"], errors="coerce").fillna(0).to_numpy() / 12
+    fixed = np.isin(category, FIXED_INCOME_CATEGORIES)
+    matrix[:, FACTORS.index("rates")] = np.where(fixed, -years * value / 100, 0.0)
+    return matrix
+
+def equity_betas(holdings, cache):
+    """Betas to NIFTY for stock holdings whose histories the risk engine already holds."""
+    stocks = [s for s in holdings.loc[holdings["category"] == "Stocks", "symbol"].dropna().unique()
+              if s != NIFTY_SYMBOL]
+    symbols, cov, _, _ = cache.snapshot(stocks + [NIFTY_SYMBOL])
+    if len(symbols) < 2 or symbols[-1] != NIFTY_SYMBOL or not cov[-1, -1] > 0:
+        return {}
+    betas = cov[:-1, -1] / cov[-1, -1]
+    return {symbol: beta for symbol, beta in zip(symbols[:-1], betas.tolist()) if not np.isnan(beta)}
+
+def run_stress(frames, library, scenario_ids=None, custom=None, betas=None, detail=None, top=5):
+    """
+    Stress many portfolios at once. frames is {pan: holdings frame}. All holdings are
+    stacked into one exposure matrix, multiplied by the shock matrix once, and summed
+    per PAN. detail lists scenario ids whose per-holding P&L is returned.
+    """
+    ids, names, shocks = library.select(scenario_ids, custom)
+    pans = list(frames)
+    stacked = pd.concat([frames[pan] for pan in pans], ignore_index=True) if pans else pd.DataFrame()
+    if stacked.empty:
+        return {}
+    bounds = np.concatenate([[0], np.cumsum([len(frames[pan]) for pan in pans])])
+
+    pnl = exposures(stacked, betas) @ shocks  # (holdings x scenarios)
+    # Holdings are contiguous per PAN, so per-PAN sums are differences of running sums
+    running = np.vstack([np.zeros(len(ids)), np.cumsum(pnl, axis=0)])
+    totals = running[bounds[1:]] - running[bounds[:-1]]
+    running_value = np.concatenate([[0.0], np.cumsum(stacked["total_value"].to_numpy(dtype=float))])
+    values = running_value[bounds[1:]] - running_value[bounds[:-1]]
+
+    detail_positions = [ids.index(s) for s in (detail or []) if s in ids]
+    results = {}
+    for p, pan in enumerate(pans):
+        pct = totals[p] / values[p] * 100 if values[p] > 0 else np.zeros(len(ids))
+        worst = np.argsort(totals[p])[:top]
+        result = {
+            "total_value": round(float(values[p]), 2),
+            "scenarios": [{"id": ids[k], "name": names[k], "pnl": round(float(totals[p, k]), 2),
+                           "pnl_percent": round(float(pct[k]), 2)} for k in range(len(ids))],
+            "worst": [ids[k] for k in worst],
+        }
+        if detail_positions:
+            rows = slice(bounds[p], bounds[p + 1])
+            frame = stacked.iloc[rows]
+            result["holdings"] = {
+                ids[k]: [{"category": c, "name": n, "pnl": round(float(v), 2)}
+                         for c, n, v in zip(frame["category"], frame["name"], pnl[rows, k])]
+                for k in detail_positions
+            }
+        results[pan] = result
+    return results
+
+def load_library(path=STRESS_SCENARIOS_FILE):
+    with open(path) as f:
+        return ScenarioLibrary(json.load(f))
+
+_library = None
+
+def get_library():
+    """Compile the scenario library once per process."""
+    global _library
+    if _library is None:
+        _library = load_library()
+    return _library
+
+def stress_portfolios(portfolios, scenario_ids=None, custom=None, detail=None, cache=None):
+    """Stress valued portfolios ({pan: portfolio}); betas come from the risk engine cache when given."""
+    frames = {pan: holdings_frame(portfolio) for pan, portfolio in portfolios.items()}
+    betas = {}
+    if cache is not None and frames:
+        betas = equity_betas(pd.concat(frames.values(), ignore_index=True), cache)
+    return run_stress(frames, get_library(), scenario_ids, custom, betas, detail)
@@ -0,0 +1,5 @@
+# Backend modules import each other as top-level modules (server.py is run from backend/)
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,53 @@
+# Basket backtests over the proxy series in fixtures/backtest. Every series repeats a
+# pattern that divides a year, so every 12-month window has the same growth and the
+# realized CAGR of an annually rebalanced basket is known exactly.
+
+import os
+
+import numpy as np
+import pytest
+
+import backtest
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "fixtures", "backtest")
+MIX = {"stocks": 50, "mutualFunds": 20, "ETFs": 10, "FDs": 10, "govtSchemes": 10}
+ANNUAL_GROWTH = {
+    "stocks": (1.04 * 0.98 * 1.03 * 0.99 * 1.02 * 1.01) ** 2,
+    "mutualFunds": 1.01 ** 12,
+    "ETFs": 1.006 ** 12,
+    "FDs": 1.07,
+    "govtSchemes": 1.075,
+}
+
+@pytest.fixture(scope="module")
+def table():
+    returns = backtest.load_returns(DATA_DIR)
+    return backtest.BacktestTable(backtest.build_table(returns, lambda risk, cagr, kind: MIX))
+
+def expected_cagr():
+    return sum(MIX[asset] / 100 * ANNUAL_GROWTH[asset] for asset in MIX) - 1
+
+def test_load_returns_covers_every_asset():
+    returns = backtest.load_returns(DATA_DIR)
+    assert list(returns.columns) == backtest.ASSETS
+    assert len(returns) == 120
+    assert returns["FDs"].iloc[0] == pytest.approx(1.07 ** (1 / 12) - 1)
+
+def test_realized_cagr_of_a_rebalanced_basket(table):
+    result = table.lookup("Medium", "Lump-Sum", 0.10, 5)
+    assert result["windows"] == 120 - 60 + 1
+    assert result["cagr"]["median"] == round(expected_cagr() * 100, 2)
+    assert result["cagr"]["p10"] == result["cagr"]["p90"]
+    assert table.median_cagr("Medium", "Lump-Sum", np.array([0.1]), np.array([5]))[0] == pytest.approx(
+        round(expected_cagr() * 100, 2) / 100)
+
+def test_goal_hit_rate_counts_the_sip(table):
+    growth = (1 + expected_cagr()) ** 5
+    lump_only = table.lookup("Medium", "SIP", 0.10, 5, 100000, 0, 100000 * growth * 1.01)
+    with_sip = table.lookup("Medium", "SIP", 0.10, 5, 100000, 1000, 100000 * growth * 1.01)
+    assert lump_only["goalHitRate"] == 0
+    assert with_sip["goalHitRate"] == 100
+    assert lump_only["medianFinalWealth"] == pytest.approx(100000 * growth, rel=1e-5)
+
+def test_no_result_beyond_the_history(table):
+    assert table.lookup("Medium", "Lump-Sum", 0.10, 11) is None
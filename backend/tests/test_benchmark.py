@@ -0,0 +1,43 @@
+# Offline benchmark fixtures and harness.
+
+import numpy as np
+import pandas as pd
+
+import benchmark
+from fund_screener import parse_amfi_nav
+from holdings import holdings_frame
+
+def test_scaled_amfi_text_parses_to_the_requested_schemes():
+    table = parse_amfi_nav(benchmark.scaled_amfi_text(1_000))
+    assert len(table) == 1_000
+    assert table["scheme_code"].is_unique and table["name_key"].is_unique
+
+def test_generated_data_is_seeded():
+    pd.testing.assert_frame_equal(benchmark.generate_close_panel(["A", "B"], seed=3),
+                                  benchmark.generate_close_panel(["A", "B"], seed=3))
+    assert len(benchmark.generate_ohlcv(5)) == 5 * benchmark.TRADING_DAYS
+    assert benchmark.generate_portfolio(100, seed=1) == benchmark.generate_portfolio(100, seed=1)
+
+def test_generated_portfolio_has_the_requested_holdings():
+    portfolio = benchmark.generate_portfolio(1_000)
+    frame = holdings_frame(portfolio)
+    assert len(frame) == 1_000
+    assert set(frame["category"]) == {"Stocks", "Mutual Funds", "ETF", "Fixed Deposits",
+                                      "Recurring Deposits", "Government Schemes"}
+
+def test_disclosures_name_the_generated_funds():
+    disclosures = benchmark.generate_disclosures(schemes=10, securities=50, lines=5)
+    funds = {h["name"] for h in benchmark.generate_portfolio(100)["assets"]["Mutual Funds"]["holdings"]}
+    assert len(disclosures) == 50
+    assert funds & set(disclosures["scheme_name"])
+
+def test_measure_reports_latency_and_throughput():
+    runs = []
+    case = benchmark.Case("noop", setup=lambda: np.arange(1000), run=lambda state: runs.append(state.sum()),
+                          items=1000, repeat=5)
+    result = benchmark.measure(case)
+    assert len(runs) == 5 + 2  # Warm-up and the traced run are not timed
+    assert result["case"] == "noop"
+    assert 0 <= result["median_ms"] <= result["p95_ms"]
+    assert result["throughput_per_s"] is None or result["throughput_per_s"] > 0
+    assert result["peak_mb"] >= 0
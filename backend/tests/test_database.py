@@ -0,0 +1,47 @@
+# Valuation versions and the analysis cache keyed on them.
+
+import pytest
+
+import database
+
+@pytest.fixture(autouse=True)
+def empty_database(monkeypatch):
+    for name in ("DATABASE", "VERSIONS", "FINGERPRINTS", "ANALYSIS_CACHE"):
+        monkeypatch.setattr(database, name, {})
+
+def portfolio(value):
+    return {"total_portfolio_value": value + 500,
+            "assets": {"Stocks": {"holdings": [{"name": "TCS", "total_value": value}]},
+                       "Fixed Deposits": {"holdings": [{"bank": "SBI", "total_value": 500}]}}}
+
+def test_version_only_moves_when_values_change():
+    assert database.get_portfolio_version("P1") == 0
+    database.save_user_portfolio("P1", portfolio(1000))
+    assert database.get_portfolio_version("P1") == 1
+    database.save_user_portfolio("P1", portfolio(1000))  # Same values, e.g. a cache refresh
+    assert database.get_portfolio_version("P1") == 1
+    database.save_user_portfolio("P1", portfolio(1200))
+    assert database.get_portfolio_version("P1") == 2
+    assert database.get_cached_portfolio("P1")["total_portfolio_value"] == 1700
+
+def test_analysis_is_reused_until_the_valuation_changes():
+    database.save_user_portfolio("P1", portfolio(1000))
+    version = database.get_portfolio_version("P1")
+    database.save_portfolio_analysis("P1", version, {"recommendations": ["hold"]})
+
+    database.save_user_portfolio("P1", portfolio(1000))
+    assert database.get_cached_analysis("P1", database.get_portfolio_version("P1")) == {"recommendations": ["hold"]}
+
+    database.save_user_portfolio("P1", portfolio(900))
+    assert database.get_cached_analysis("P1", database.get_portfolio_version("P1")) is None
+    assert database.get_cached_analysis("P1", version) is None  # Dropped, not just shadowed
+
+def test_explicit_change_flag_skips_the_fingerprint():
+    database.save_user_portfolio("P1", portfolio(1000))
+    database.save_user_portfolio("P1", portfolio(1000), changed=False)
+    assert database.get_portfolio_version("P1") == 1
+    database.save_user_portfolio("P1", portfolio(1000), changed=True)
+    assert database.get_portfolio_version("P1") == 2
+    # The next fingerprinted save has nothing to compare against and issues a version
+    database.save_user_portfolio("P1", portfolio(1000))
+    assert database.get_portfolio_version("P1") == 3
@@ -0,0 +1,58 @@
+# Vectorized AMFI universe screening against the sample NAVAll.txt and metrics fixtures.
+
+import os
+
+import pandas as pd
+import pytest
+
+import fund_screener
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "fixtures")
+
+@pytest.fixture
+def amfi_text():
+    with open(os.path.join(FIXTURES_DIR, "amfi_navall_sample.txt")) as f:
+        return f.read()
+
+@pytest.fixture
+def universe(amfi_text, monkeypatch):
+    metrics = fund_screener.load_fund_metrics(os.path.join(FIXTURES_DIR, "fund_metrics_sample.csv"))
+    table = fund_screener.build_universe(amfi_text, metrics)
+    fund_screener.set_fund_universe(table)
+    monkeypatch.setattr(fund_screener, "get_fund_universe", lambda force_refresh=False: table)
+    return table
+
+def test_parse_drops_headers_and_types_columns(amfi_text):
+    table = fund_screener.parse_amfi_nav(amfi_text)
+    assert list(table["scheme_code"]) == [122639, 122640, 119018, 101762, 119800, 119801, 150001, 150002]
+    assert table["nav"].isna().sum() == 1  # "N.A."
+    assert table["nav_date"].iloc[0] == pd.Timestamp("2025-10-17")
+
+def test_screen_flags_each_rule(universe):
+    by_code = universe.set_index("scheme_code")
+    assert by_code.loc[150001, "reason"] == "low_nav"
+    assert by_code.loc[150001, "high_expense_ratio"] and by_code.loc[150001, "low_aum"]
+    assert by_code.loc[150002, "reason"] == "low_aum"
+    assert (by_code.drop([150001, 150002])["status"] == "good").all()
+    # Good funds first, cheapest first within them
+    assert list(universe["status"]) == ["good"] * 6 + ["bad"] * 2
+    assert universe["expense_ratio"].iloc[:6].is_monotonic_increasing
+
+def test_rules_without_data_are_skipped(amfi_text):
+    table = fund_screener.build_universe(amfi_text, fund_screener.load_fund_metrics("/nonexistent.csv"))
+    assert fund_screener.screened_rules(table) == ["low_nav"]
+    assert not table["high_expense_ratio"].any() and not table["low_aum"].any()
+    assert set(table.loc[table["status"] == "bad", "scheme_code"]) == {150001}
+
+def test_lookup_and_search(universe):
+    exact = fund_screener.lookup_fund("  hdfc large cap fund - growth option - direct plan ")
+    assert exact["scheme_code"] == 119018
+    partial = fund_screener.lookup_fund("SBI Liquid Fund")
+    assert partial["scheme_code"] == 119800  # First match in AMFI file order
+    assert fund_screener.lookup_fund("no such fund") is None
+
+    result = fund_screener.screen_funds(query="example", status="bad")
+    assert result["total"] == 2
+    assert result["rules"] == ["low_nav", "high_expense_ratio", "low_aum"]
+    assert {f["scheme_code"] for f in result["funds"]} == {150001, 150002}
+    assert all(f["nav_date"] == "2025-10-17" for f in result["funds"])
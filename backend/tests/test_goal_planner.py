@@ -0,0 +1,53 @@
+# Goal-planner sweep: final wealth, frontiers and axis handling.
+
+import numpy as np
+import pytest
+
+import goal_planner
+
+ASSET_RETURNS = {"stocks": 0.12, "mutualFunds": 0.11, "FDs": 0.07, "ETFs": 0.09, "govtSchemes": 0.075}
+
+def expected_return(risk, target, years):
+    """The basket return sweep() uses for one (target, years) point."""
+    weights = goal_planner.allocation_grid(risk, (target / 100000) ** (1 / years) - 1, "SIP")
+    return float(weights @ np.array([ASSET_RETURNS[a] for a in goal_planner.ASSETS]) / 100
+                 + goal_planner.RISK_PREMIUM[risk])
+
+def run(targets, years, sips):
+    return goal_planner.sweep(100000, np.asarray(targets, float), np.asarray(years, float),
+                              np.asarray(sips, float), ASSET_RETURNS, "SIP")
+
+def test_axes_are_sorted_and_deduplicated():
+    np.testing.assert_array_equal(goal_planner.sweep_axis([10, 2, 5, 2], "timeFrame", integer=True), [2, 5, 10])
+    np.testing.assert_array_equal(goal_planner.sweep_axis([3e6, 1e6], "targetWealth"), [1e6, 3e6])
+    with pytest.raises(ValueError):
+        goal_planner.sweep_axis({"min": 5, "max": 1}, "timeFrame")
+
+def test_final_wealth_is_lump_sum_plus_sip():
+    result = run([1e6], [10], [0, 5000])
+    basket = result["baskets"]["Medium"]
+    expected = expected_return("Medium", 1e6, 10)
+    lump = 100000 * (1 + expected) ** 10
+    sip = goal_planner.sip_factor(expected, 10) * 5000
+    assert basket["finalWealth"][0, 0, 0] == pytest.approx(lump, abs=0.02)
+    assert basket["finalWealth"][0, 0, 1] == pytest.approx(lump + sip, abs=0.02)
+
+def test_frontiers_are_consistent_with_the_grid():
+    years = np.arange(1, 31)
+    result = run([1e6, 5e6], years, [0, 10000])
+    for risk, basket in result["baskets"].items():
+        feasible = basket["feasible"]
+        for t in range(2):
+            for s in range(2):
+                first = np.flatnonzero(feasible[t, :, s])
+                min_years = basket["minTimeFrame"][t, s]
+                assert (np.isnan(min_years) if first.size == 0 else min_years == years[first[0]])
+        # The minimum SIP exactly closes the gap
+        expected = expected_return(risk, 1e6, 10)
+        lump = 100000 * (1 + expected) ** 10
+        closing = lump + goal_planner.sip_factor(expected, 10) * basket["minMonthlyInvestment"][0, 9]
+        assert closing == pytest.approx(max(1e6, lump), rel=1e-4)
+
+def test_unsorted_years_are_rejected():
+    with pytest.raises(ValueError):
+        run([1e6], [10, 5], [0])
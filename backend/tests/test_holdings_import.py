@@ -0,0 +1,82 @@
+# Streaming broker and CAS imports into the portfolio store.
+
+import io
+import os
+
+import pandas as pd
+import pytest
+
+import data
+from fund_screener import parse_amfi_nav
+from holdings_import import InstrumentResolver, import_holdings, parse_dates
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "fixtures")
+
+@pytest.fixture(autouse=True)
+def empty_store(monkeypatch):
+    monkeypatch.setattr(data, "user_portfolios", {})
+    monkeypatch.setattr(data, "_holding_index", {})
+    monkeypatch.setattr(data, "_holdings_versions", {})
+
+@pytest.fixture
+def resolver():
+    with open(os.path.join(FIXTURES_DIR, "amfi_navall_sample.txt")) as f:
+        return InstrumentResolver(parse_amfi_nav(f.read()))
+
+BROKER = """Client PAN,Trading Symbol,ISIN Code,Qty,Asset Class,Principal,Tenure,Rate,Issuer
+abcde1234f,NSE:RELIANCE-EQ,,10,,,,,
+ABCDE1234F,GOLDBEES,,100,,,,,
+ABCDE1234F,,INF879O01027,25.5,,,,,
+ABCDE1234F,,,,FD,100000,12,7.1,SBI
+ZZZZZ9999Z,TCS.NS,,3,equity,,,,
+,INFY,,5,,,,,
+ZZZZZ9999Z,,INF000BOGUS1,4,mf,,,,
+"""
+
+def test_broker_positions_are_imported_in_batches(resolver):
+    stats = import_holdings(io.StringIO(BROKER), batch_size=2, resolver=resolver)
+    assert (stats["rows"], stats["inserted"], stats["skipped"], stats["pans"]) == (7, 5, 2, 2)
+
+    assets = data.user_portfolios["ABCDE1234F"]["assets"]
+    assert assets["Stocks"]["holdings"] == [{"name": "RELIANCE", "quantity": 10}]
+    assert assets["ETF"]["holdings"] == [{"type": "Gold", "quantity": 100}]
+    assert assets["Mutual Funds"]["holdings"] == [
+        {"name": "Parag Parikh Flexi Cap Fund - Direct Plan - Growth", "units": 25.5}]
+    assert assets["Fixed Deposits"]["holdings"] == [
+        {"bank": "SBI", "investment": 100000.0, "duration": 12, "interest_rate": 7.1}]
+    assert data.user_portfolios["ZZZZZ9999Z"]["assets"]["Stocks"]["holdings"] == [{"name": "TCS", "quantity": 3}]
+
+def test_reimport_updates_and_zero_quantity_removes(resolver):
+    import_holdings(io.StringIO(BROKER), resolver=resolver)
+    version = data.holdings_version("ABCDE1234F")
+    update = "PAN,Symbol,Quantity\nABCDE1234F,RELIANCE,12\nABCDE1234F,GOLDBEES,0\n"
+    stats = import_holdings(io.StringIO(update), resolver=resolver)
+    assert (stats["inserted"], stats["updated"], stats["removed"]) == (0, 1, 1)
+    assets = data.user_portfolios["ABCDE1234F"]["assets"]
+    assert assets["Stocks"]["holdings"] == [{"name": "RELIANCE", "quantity": 12}]
+    assert assets["ETF"]["holdings"] == []
+    assert data.holdings_version("ABCDE1234F") > version
+
+CAS = """PAN,Folio,ISIN,Scheme Name,Date,Units,Balance
+ABCDE1234F,123/45,INF879O01027,PPFAS Flexi Cap,05/04/2024,10,110
+ABCDE1234F,123/45,INF879O01027,PPFAS Flexi Cap,28-Dec-2023,100,100
+ABCDE1234F,123/45,INF879O01027,PPFAS Flexi Cap,2024-06-30,-110,0.000
+ABCDE1234F,999/1,INF179K01YV8,HDFC Large Cap,2024-01-15,40,40
+ABCDE1234F,999/1,INF179K01YV8,HDFC Large Cap,not a date,5,45
+"""
+
+def test_cas_keeps_the_latest_balance_per_scheme(resolver):
+    stats = import_holdings(io.StringIO(CAS), batch_size=2, resolver=resolver)
+    assert stats["skipped"] == 1  # Undated row
+    funds = data.user_portfolios["ABCDE1234F"]["assets"]["Mutual Funds"]["holdings"]
+    # The PPFAS folio was redeemed to zero on the latest date, so it is not held
+    assert funds == [{"name": "HDFC Large Cap Fund - Growth Option - Direct Plan", "units": 40.0}]
+
+def test_statement_dates_accept_iso_and_day_first():
+    parsed = parse_dates(pd.Series(["2024-06-30", "28-Dec-2023", "05/04/2024", "soon"]))
+    assert list(parsed[:3].dt.date.astype(str)) == ["2024-06-30", "2023-12-28", "2024-04-05"]
+    assert pd.isna(parsed[3])
+
+def test_files_without_quantities_are_rejected(resolver):
+    with pytest.raises(ValueError):
+        import_holdings(io.StringIO("PAN,Symbol\nABCDE1234F,TCS\n"), resolver=resolver)
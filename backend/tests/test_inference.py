@@ -0,0 +1,156 @@
+# Exported /predict models evaluated by inference.py against a direct reference computation.
+# The fitted models are small hand-built stand-ins exposing the attributes model_export reads
+# from scikit-learn and Keras, so the round trip runs without either library.
+
+import threading
+import time
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+import inference
+from model_export import export_models
+
+FEATURES = ["rsi", "macd", "volume_ratio"]
+
+def tree(left, right, feature, threshold, value, depth):
+    return SimpleNamespace(tree_=SimpleNamespace(
+        node_count=len(left), children_left=np.array(left), children_right=np.array(right),
+        feature=np.array(feature), threshold=np.array(threshold, dtype=float),
+        value=np.array(value, dtype=float).reshape(-1, 1, 1), max_depth=depth))
+
+STUMP = tree([1, -1, -1], [2, -1, -1], [0, -2, -2], [0.0, -2, -2], [0, 1.0, 3.0], 1)
+DEEP = tree([1, 3, -1, -1, -1], [2, 4, -1, -1, -1], [1, 0, -2, -2, -2], [0.5, -0.25, -2, -2, -2],
+            [0, 0, 5.0, -1.0, 2.0], 2)
+
+def walk(t, row):
+    node = 0
+    while t.children_left[node] != -1:
+        node = t.children_left[node] if row[t.feature[node]] <= t.threshold[node] else t.children_right[node]
+    return t.value[node, 0, 0]
+
+class LSTM:
+    def __init__(self, kernel, recurrent, bias):
+        self.weights = [kernel, recurrent, bias]
+
+    def get_weights(self):
+        return self.weights
+
+    def get_config(self):
+        return {"activation": "tanh", "recurrent_activation": "sigmoid"}
+
+class Dense:
+    def __init__(self, kernel, bias, activation):
+        self.weights, self.activation = [kernel, bias], activation
+
+    def get_weights(self):
+        return self.weights
+
+    def get_config(self):
+        return {"activation": self.activation}
+
+class Dropout:
+    def get_weights(self):
+        return []
+
+@pytest.fixture
+def fitted():
+    rng = np.random.default_rng(11)
+    units = 4
+    pipeline = SimpleNamespace(named_steps={
+        "imputer": SimpleNamespace(statistics_=np.array([50.0, 0.0, 1.0])),
+        "scaler": SimpleNamespace(mean_=np.array([50.0, 0.1, 1.0]), scale_=np.array([10.0, 0.5, 0.2])),
+        "stacking": SimpleNamespace(passthrough=False, final_estimator_=SimpleNamespace(
+            coef_=np.array([0.4, 0.3, 0.2, 0.1]), intercept_=np.array([0.05])), estimators_=[
+            SimpleNamespace(estimators_=[STUMP, DEEP]),
+            SimpleNamespace(estimators_=np.array([[STUMP], [DEEP]], dtype=object),
+                            init_=SimpleNamespace(constant_=np.array([[0.5]])), learning_rate=0.1),
+            SimpleNamespace(kernel="rbf", support_vectors_=rng.normal(size=(3, 3)),
+                            dual_coef_=np.array([[0.7, -0.2, 0.4]]), intercept_=np.array([0.1]), _gamma=0.5),
+            SimpleNamespace(coef_=np.array([0.3, -0.6, 0.2]), intercept_=0.2),
+        ]),
+    })
+    lstm_model = SimpleNamespace(layers=[
+        LSTM(rng.normal(0, 0.5, (3, 4 * units)), rng.normal(0, 0.5, (units, 4 * units)), rng.normal(0, 0.1, 4 * units)),
+        Dropout(),
+        Dense(rng.normal(0, 0.5, (units, 2)), rng.normal(0, 0.1, 2), "relu"),
+        Dense(rng.normal(0, 0.5, (2, 1)), np.array([0.3]), "linear"),
+    ])
+    lstm_scaler = SimpleNamespace(scale_=np.array([0.01, 1.0, 0.5]), min_=np.array([0.0, 0.5, -0.2]))
+    return pipeline, lstm_model, lstm_scaler
+
+def reference(pipeline, lstm_model, lstm_scaler, X):
+    steps = pipeline.named_steps
+    X = np.where(np.isnan(X), steps["imputer"].statistics_, X)
+    Xs = (X - steps["scaler"].mean_) / steps["scaler"].scale_
+    rf, gbr, svr, ridge = steps["stacking"].estimators_
+    outputs = []
+    for row in Xs:
+        forest = np.mean([walk(t.tree_, row) for t in rf.estimators_])
+        boosting = 0.5 + 0.1 * sum(walk(t.tree_, row) for t in gbr.estimators_[:, 0])
+        kernel = np.exp(-svr._gamma * ((svr.support_vectors_ - row) ** 2).sum(axis=1))
+        outputs.append([forest, boosting, kernel @ svr.dual_coef_[0] + svr.intercept_[0], row @ ridge.coef_ + ridge.intercept_])
+    final = steps["stacking"].final_estimator_
+    stacking = np.array(outputs) @ final.coef_ + final.intercept_[0]
+
+    def sigmoid(x):
+        return 1 / (1 + np.exp(-x))
+
+    kernel, _, bias = lstm_model.layers[0].weights
+    units = kernel.shape[1] // 4
+    z = (X * lstm_scaler.scale_ + lstm_scaler.min_) @ kernel + bias  # One step from a zero state
+    i, f, g, o = (z[:, k * units:(k + 1) * units] for k in range(4))
+    h = sigmoid(o) * np.tanh(sigmoid(i) * np.tanh(g))
+    hidden = np.maximum(h @ lstm_model.layers[2].weights[0] + lstm_model.layers[2].weights[1], 0)
+    lstm = (hidden @ lstm_model.layers[3].weights[0] + lstm_model.layers[3].weights[1])[:, 0]
+    return (stacking + lstm) / 2
+
+ROWS = np.array([[45.0, 0.3, 1.1], [62.0, -0.4, 0.8], [50.0, np.nan, 1.5], [38.0, 0.9, np.nan]])
+
+def test_exported_models_match_the_reference(fitted, tmp_path):
+    export_models("TCS.NS", 63, FEATURES, *fitted, model_dir=str(tmp_path), latest_row=ROWS[0])
+    model = inference.get_model("TCS.NS", 63, model_dir=str(tmp_path))
+    assert model.features == FEATURES and model.prediction_period == 63
+    np.testing.assert_allclose(model.latest_row, ROWS[0])
+    np.testing.assert_allclose(model.predict(ROWS), reference(*fitted, ROWS), rtol=1e-5, atol=1e-6)
+    assert inference.get_model("TCS.NS", 63, model_dir=str(tmp_path)) is model  # Cached until the file changes
+
+def test_quantized_exports_stay_close(fitted, tmp_path):
+    expected = reference(*fitted, ROWS)
+    for mode, tolerance in (("float16", 1e-2), ("int8", 5e-2)):
+        path = export_models("TCS.NS", 21, FEATURES, *fitted, quantize=mode, model_dir=str(tmp_path / mode))
+        np.testing.assert_allclose(inference.CompiledModel.load(path).predict(ROWS), expected, atol=tolerance)
+
+def test_missing_or_stale_exports_are_not_served(fitted, tmp_path, monkeypatch):
+    assert inference.get_model("INFY.NS", 63, model_dir=str(tmp_path)) is None
+    export_models("INFY.NS", 63, FEATURES, *fitted, model_dir=str(tmp_path))
+    monkeypatch.setattr(inference, "MODEL_MAX_AGE_DAYS", -1)
+    assert inference.get_model("INFY.NS", 63, model_dir=str(tmp_path)) is None
+
+class CountingModel:
+    def __init__(self, model):
+        self.model, self.batches = model, []
+
+    def predict(self, X):
+        self.batches.append(len(X))
+        time.sleep(0.01)  # Rows keep arriving while a pass runs
+        return self.model.predict(X)
+
+def test_batch_predictor_coalesces_concurrent_rows(fitted, tmp_path):
+    path = export_models("TCS.NS", 63, FEATURES, *fitted, model_dir=str(tmp_path))
+    model = CountingModel(inference.CompiledModel.load(path))
+    predictor = inference.BatchPredictor()
+    rows = np.repeat(ROWS, 10, axis=0)
+    results = [None] * len(rows)
+
+    def call(i):
+        results[i] = predictor.predict(model, rows[i], timeout=5)
+
+    threads = [threading.Thread(target=call, args=(i,)) for i in range(len(rows))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    np.testing.assert_allclose(results, model.model.predict(rows))
+    assert sum(model.batches) == len(rows) and len(model.batches) < len(rows)
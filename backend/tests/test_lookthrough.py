@@ -0,0 +1,102 @@
+# Sparse mutual fund look-through against a dense (schemes x securities) product.
+
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import lookthrough
+from holdings import HOLDING_COLUMNS
+from lookthrough import LookThrough, load_disclosures, summarize
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "fixtures")
+
+@pytest.fixture
+def disclosures():
+    return load_disclosures(os.path.join(FIXTURES_DIR, "fund_disclosures_sample.csv"))
+
+@pytest.fixture
+def matrix(disclosures):
+    return LookThrough(disclosures)
+
+def frame(pan, rows):
+    return pd.DataFrame(rows, columns=HOLDING_COLUMNS).assign(pan=pan)
+
+HOLDINGS = pd.concat([
+    frame("P1", [
+        ("Stocks", "HDFC Bank", "HDFCBANK.NS", 10, 20000.0, None),
+        ("Stocks", "Zomato", "ZOMATO.NS", 50, 5000.0, None),
+        ("Mutual Funds", "Parag Parikh Flexi Cap Fund - Direct Plan - Growth", "^NSEI", 100, 50000.0, None),
+        ("Mutual Funds", "HDFC Large Cap", "^NSEI", 10, 25000.0, None),
+        ("Fixed Deposits", "SBI", None, 0, 10000.0, 12),
+    ]),
+    frame("P2", [
+        ("Mutual Funds", "Example Thematic Opportunities Fund", "^NSEI", 10, 40000.0, None),
+        ("Mutual Funds", "Unknown Small Cap Fund", "^NSEI", 10, 10000.0, None),
+        ("Stocks", "TCS", "TCS.NS", 2, 8000.0, None),
+    ]),
+], ignore_index=True)
+
+def dense_reference(disclosures, holdings, matrix):
+    """values @ W with a dense pivot of the disclosures, plus direct stock values."""
+    keys = disclosures["symbol"].fillna("").str.upper()
+    keys = keys.where(keys != "", disclosures["security"].str.upper())
+    dense = (disclosures.assign(key=keys, scheme=disclosures["scheme_name"].str.lower())
+             .pivot_table(index="scheme", columns="key", values="weight", aggfunc="sum").fillna(0) / 100)
+    expected = {}
+    for row in holdings.itertuples():
+        if row.category == "Mutual Funds":
+            scheme = matrix.scheme_id(row.name)
+            if scheme is None:
+                continue
+            for key, weight in dense.loc[matrix.scheme_keys[scheme]].items():
+                if weight:
+                    cell = expected.setdefault((row.pan, key), [0.0, 0.0])
+                    cell[1] += row.total_value * weight
+        elif row.category == "Stocks":
+            expected.setdefault((row.pan, row.symbol.removesuffix(".NS")), [0.0, 0.0])[0] += row.total_value
+    return expected
+
+def test_exposures_match_a_dense_product(disclosures, matrix):
+    exposures, unmatched = matrix.exposures(HOLDINGS)
+    actual = {(r.pan, r.symbol): [r.direct, r.via_funds] for r in exposures.itertuples()}
+    expected = dense_reference(disclosures, HOLDINGS, matrix)
+    assert actual.keys() == expected.keys()
+    for key, values in expected.items():
+        np.testing.assert_allclose(actual[key], values, err_msg=str(key))
+    assert list(unmatched["name"]) == ["Unknown Small Cap Fund"]
+    assert exposures.set_index(["pan", "symbol"]).loc[("P1", "ZOMATO"), "sector"] == lookthrough.UNCLASSIFIED
+
+def test_scheme_names_match_through_plan_suffixes(disclosures, matrix):
+    securities = disclosures["symbol"].fillna(disclosures["security"]).nunique()
+    assert matrix.shape == (3, securities) and len(matrix.unlisted) == 2
+    ppfas = matrix.scheme_id("Parag Parikh Flexi Cap Fund")
+    assert matrix.scheme_id("parag parikh flexi cap fund - direct plan - growth") == ppfas
+    assert matrix.scheme_id("HDFC Large Cap") == matrix.scheme_id("HDFC Large Cap Fund")
+    assert matrix.scheme_id("Nifty Next 50 Index Fund") is None
+
+def test_sector_weights_skip_debt_cash_and_unclassified(matrix):
+    weights = matrix.exposure_weights(HOLDINGS)
+    sectors = weights[weights["level"] == "sector"]
+    assert not sectors["name"].isin(["Cash & Equivalents", "Government Securities", lookthrough.UNCLASSIFIED]).any()
+
+    p2_it = sectors[(sectors["pan"] == "P2") & (sectors["name"] == "Information Technology")]["weight"].iloc[0]
+    it_share = (18.40 + 16.75 + 11.20 + 8.95 + 7.30 + 6.10) / 100
+    assert np.isclose(p2_it, (40000 * it_share + 8000) / 58000)
+    securities = weights[weights["level"] == "security"]
+    assert "TREPS / REVERSE REPO" in set(securities["name"].str.upper())  # Still reported as a security
+
+def test_summary_reports_overlap_and_coverage(matrix):
+    exposures, unmatched = matrix.exposures(HOLDINGS)
+    reports = summarize(exposures, unmatched, HOLDINGS, top=5)
+    p1, p2 = reports["P1"], reports["P2"]
+    assert len(p1["securities"]) == 5 and p1["securities"][0]["symbol"] == "HDFCBANK"
+    assert [row["symbol"] for row in p1["overlap"]] == ["HDFCBANK"]
+    assert p1["fund_coverage_pct"] == 100.0
+    assert p2["fund_coverage_pct"] == 80.0 and p2["unmatched_funds"] == ["Unknown Small Cap Fund"]
+    assert [row["symbol"] for row in p2["overlap"]] == ["TCS"]
+
+def test_no_disclosures_skips_the_rules(monkeypatch):
+    monkeypatch.setattr(lookthrough, "_lookthrough", LookThrough(load_disclosures("/nonexistent")))
+    assert lookthrough.lookthrough_exposure(HOLDINGS) is None
@@ -0,0 +1,44 @@
+# NSE calendar over the committed holiday file, and the scheduler's daily-job backoff.
+
+import datetime
+
+import market_calendar
+import scheduler
+from market_calendar import IST, is_market_open, is_trading_day, last_session_close, quote_is_fresh
+
+def at(day, hour, minute=0):
+    return datetime.datetime.combine(day, datetime.time(hour, minute), IST)
+
+def test_holiday_file_is_loaded():
+    assert market_calendar.HOLIDAYS
+    assert not is_trading_day(datetime.date(2025, 10, 2))  # Gandhi Jayanti, a Thursday
+    assert not is_market_open(at(datetime.date(2025, 10, 2), 11))
+    assert is_trading_day(datetime.date(2025, 10, 3))
+
+def test_quotes_stay_frozen_over_a_holiday():
+    # Fetched after Wednesday's close, still fresh through the Thursday holiday
+    wednesday, holiday = datetime.date(2025, 10, 1), datetime.date(2025, 10, 2)
+    fetched = at(wednesday, 16).timestamp()
+    assert last_session_close(at(holiday, 12)) == at(wednesday, 15, 30)
+    assert quote_is_fresh(fetched, 60, now=at(holiday, 12))
+    assert not quote_is_fresh(fetched, 60, now=at(datetime.date(2025, 10, 3), 10))
+
+def test_failed_daily_job_backs_off(monkeypatch):
+    clock = {"now": 1_000_000.0}
+    monkeypatch.setattr(scheduler.time, "time", lambda: clock["now"])
+    monkeypatch.setattr(scheduler, "backoff_delay", lambda attempt, base, cap: min(cap, base * 2 ** attempt))
+    calls = []
+
+    def refresh():
+        calls.append(clock["now"])
+        if len(calls) < 3:
+            raise ValueError("NAVAll.txt not published yet")
+
+    jobs = scheduler.RefreshScheduler()
+    published = datetime.datetime.fromtimestamp(clock["now"] + 1, IST)
+    jobs.register_daily(refresh, lambda now: published)
+    for step in range(200):  # 5 s ticks
+        clock["now"] += 5
+        jobs.run_once()
+    assert [t - calls[0] for t in calls] == [0, 60, 180]  # 60 s, then 120 s
+    assert jobs.daily_jobs[0][3] == 0  # Reset after the success
@@ -0,0 +1,64 @@
+# Prometheus text exposition of counters, histograms and Flask request timing.
+
+import pytest
+from flask import Flask
+
+import metrics
+
+@pytest.fixture(autouse=True)
+def enabled(monkeypatch):
+    monkeypatch.setattr(metrics, "METRICS_ENABLED", True)
+
+@pytest.fixture
+def registry(monkeypatch):
+    """A private registry so test metrics do not leak into /metrics."""
+    monkeypatch.setattr(metrics, "_registry", [])
+    return metrics._registry
+
+def test_counter_renders_one_line_per_label_set(registry):
+    counter = metrics.Counter("test_lookups_total", "Lookups", ("cache", "result"))
+    counter.inc(cache="amfi", result="hit")
+    counter.inc(2, cache="amfi", result="hit")
+    counter.inc(cache="quote", result="miss")
+    assert counter.render() == [
+        "# HELP test_lookups_total Lookups",
+        "# TYPE test_lookups_total counter",
+        'test_lookups_total{cache="amfi",result="hit"} 3',
+        'test_lookups_total{cache="quote",result="miss"} 1',
+    ]
+
+def test_histogram_buckets_are_cumulative(registry):
+    histogram = metrics.Histogram("test_seconds", "Latency", ("stage",), buckets=(0.1, 1))
+    for value in (0.05, 0.5, 0.7, 3):
+        histogram.observe(value, stage="parse")
+    assert histogram.render()[2:] == [
+        'test_seconds_bucket{stage="parse",le="0.1"} 1',
+        'test_seconds_bucket{stage="parse",le="1"} 3',
+        'test_seconds_bucket{stage="parse",le="+Inf"} 4',
+        'test_seconds_sum{stage="parse"} 4.25',
+        'test_seconds_count{stage="parse"} 4',
+    ]
+
+def test_disabled_metrics_record_nothing(registry, monkeypatch):
+    histogram = metrics.Histogram("test_disabled_seconds", "Latency")
+    monkeypatch.setattr(metrics, "METRICS_ENABLED", False)
+    with histogram.time():
+        pass
+    assert histogram.values == {}
+
+def test_requests_are_timed_and_exposed(monkeypatch):
+    monkeypatch.setattr(metrics.REQUEST_SECONDS, "values", {})
+    app = Flask(__name__)
+    metrics.init_app(app)
+
+    @app.route("/ping")
+    def ping():
+        return {"ok": True}
+
+    client = app.test_client()
+    assert client.get("/ping").json == {"ok": True}
+    assert ("ping", "GET", "200") in metrics.REQUEST_SECONDS.values
+
+    body = client.get("/metrics").get_data(as_text=True)
+    assert 'invest360_http_request_seconds_count{endpoint="ping",method="GET",status="200"} 1' in body
+    assert "# TYPE invest360_stage_seconds histogram" in body
@@ -0,0 +1,77 @@
+# SnapshotBook over the sample NSE payloads in fixtures/.
+
+import os
+import time
+
+import pytest
+
+from nse_snapshots import SnapshotBook, fixture_fetch
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "fixtures")
+STALE = 5 * 86400  # Older than any market holiday stretch, so stale whether or not NSE is open
+
+@pytest.fixture
+def book():
+    return SnapshotBook(fixture_fetch(FIXTURES_DIR), indices=["NIFTY 50"], ttl=60)
+
+def failing_fetch(calls):
+    def fetch(path, params):
+        calls.append(path)
+        raise ConnectionError("NSE unreachable")
+    return fetch
+
+def test_refresh_prices_index_and_etf_rows(book):
+    assert book.refresh() == 70
+    assert book.price("adaniports") == 1412.6
+    assert book.price("GOLDBEES") == 105.42
+    assert book.price("NIFTY 50") is None  # The index row itself is not a security
+    assert book.errors == {}
+
+def test_failed_source_keeps_its_last_prices(book):
+    book.refresh()
+    fetch = book.fetch
+
+    def etf_down(path, params):
+        if path == "/api/etf":
+            raise ConnectionError("ETF list unavailable")
+        return fetch(path, params)
+
+    book.fetch = etf_down
+    book.refresh(force=True)
+    assert set(book.errors) == {"etf"}
+    assert book.failures == 0
+    assert book.price("GOLDBEES") == 105.42
+
+def test_total_failure_backs_off(book):
+    calls = []
+    book.fetch = failing_fetch(calls)
+    book.refresh()
+    assert book.failures == 1
+    assert book.retry_at == pytest.approx(time.time() + 60, abs=1)
+
+    # Requests inside the backoff window do not hit NSE again
+    assert book.price("GOLDBEES") is None
+    assert len(calls) == 2
+
+    book.retry_at = 0
+    book.price("GOLDBEES")
+    assert book.failures == 2
+    assert book.retry_at == pytest.approx(time.time() + 120, abs=1)
+    assert len(calls) == 4
+
+def test_recovery_resets_backoff(book):
+    fetch = book.fetch
+    book.fetch = failing_fetch([])
+    book.refresh()
+    book.fetch = fetch
+    book.refresh(force=True)
+    assert book.failures == 0 and book.retry_at == 0
+    assert book.price("GOLDBEES") == 105.42
+
+def test_stale_prices_are_not_served(book):
+    book.refresh()
+    book.prices = {symbol: (price, fetched_at - STALE) for symbol, (price, fetched_at) in book.prices.items()}
+    book.fetched_at -= STALE
+    book.fetch = failing_fetch([])
+    assert book.price("GOLDBEES") is None
+    assert book.failures == 1
@@ -0,0 +1,71 @@
+# Shared price polling and per-client valuation deltas.
+
+import threading
+
+from price_stream import PortfolioStream, PriceHub
+
+def portfolio():
+    return {
+        "total_portfolio_value": 3000.0,
+        "assets": {
+            "Stocks": {"total_value": 2000.0, "holdings": [
+                {"name": "TCS", "quantity": 10, "price_per_share": 100.0, "total_value": 1000.0, "allocation": "33.33%"},
+                {"name": "ITC", "quantity": 20, "price_per_share": 50.0, "total_value": 1000.0, "allocation": "33.33%"},
+            ]},
+            "Fixed Deposits": {"total_value": 1000.0, "holdings": [
+                {"bank": "SBI", "total_value": 1000.0, "allocation": "33.33%"},
+            ]},
+        },
+    }
+
+def hub_without_thread(fetch):
+    hub = PriceHub(fetch, interval=3600)
+    hub.thread = threading.current_thread()  # Drive poll_once by hand
+    return hub
+
+def test_each_instrument_is_polled_once_for_all_subscribers():
+    fetched = []
+    prices = {("Stocks", "TCS"): 110.0, ("Stocks", "ITC"): 50.0}
+
+    def fetch(instrument):
+        fetched.append(instrument)
+        return prices[instrument]
+
+    hub = hub_without_thread(fetch)
+    first = hub.subscribe([("Stocks", "TCS"), ("Stocks", "ITC")], {("Stocks", "TCS"): 100.0, ("Stocks", "ITC"): 50.0})
+    second = hub.subscribe([("Stocks", "TCS")], {("Stocks", "TCS"): 100.0})
+    hub.poll_once()
+
+    assert sorted(fetched) == [("Stocks", "ITC"), ("Stocks", "TCS")]
+    assert first.queue.get_nowait() == (("Stocks", "TCS"), 110.0)
+    assert first.queue.empty()  # ITC did not move
+    assert second.queue.get_nowait() == (("Stocks", "TCS"), 110.0)
+
+    hub.poll_once()
+    assert first.queue.empty() and second.queue.empty()
+
+    hub.unsubscribe(first)
+    hub.unsubscribe(second)
+    assert hub.subscribers == {} and hub.prices == {}
+
+def test_late_subscriber_catches_up_with_the_hub():
+    hub = hub_without_thread(lambda instrument: 120.0)
+    hub.subscribe([("Stocks", "TCS")], {("Stocks", "TCS"): 100.0})
+    hub.poll_once()
+    late = hub.subscribe([("Stocks", "TCS")], {("Stocks", "TCS"): 100.0})
+    assert late.queue.get_nowait() == (("Stocks", "TCS"), 120.0)
+
+def test_delta_carries_only_changed_fields():
+    stream = PortfolioStream(portfolio())
+    assert stream.instruments() == [("Stocks", "TCS"), ("Stocks", "ITC")]
+
+    delta = stream.apply({("Stocks", "TCS"): 200.0})
+    assert delta["holdings"] == [{"category": "Stocks", "index": 0, "price_per_share": 200.0, "total_value": 2000.0}]
+    assert delta["categories"] == {"Stocks": 3000.0}
+    assert delta["total_portfolio_value"] == 4000.0
+    assert {(a["category"], a["index"], a["allocation"]) for a in delta["allocations"]} == {
+        ("Stocks", 0, "50.00%"), ("Stocks", 1, "25.00%"), ("Fixed Deposits", 0, "25.00%")}
+
+    assert stream.apply({("Stocks", "TCS"): 200.0}) is None  # Unchanged price
+    assert stream.apply({("Stocks", "INFY"): 10.0}) is None  # Not held
+    assert stream.current_prices() == {("Stocks", "TCS"): 200.0, ("Stocks", "ITC"): 50.0}
@@ -0,0 +1,68 @@
+# Admin-gated request profiling and the stack sampler.
+
+import os
+import threading
+
+import pytest
+from flask import Flask
+
+import profiling
+
+TOKEN = "s3cret"
+
+@pytest.fixture
+def client(monkeypatch, tmp_path):
+    monkeypatch.setattr(profiling, "PROFILE_TOKEN", TOKEN)
+    monkeypatch.setattr(profiling, "PROFILE_DIR", str(tmp_path))
+    monkeypatch.setattr(profiling, "sampler", profiling.StackSampler())
+    app = Flask(__name__)
+    profiling.init_app(app)
+
+    @app.route("/work")
+    def work():
+        return {"total": sum(range(1000))}
+
+    return app.test_client()
+
+def test_profile_header_writes_a_profile(client, tmp_path):
+    response = client.get("/work", headers={"X-Profile": TOKEN})
+    filename = response.headers["X-Profile-File"]
+    assert filename.startswith("work-") and os.path.exists(tmp_path / filename)
+
+def test_wrong_or_query_string_token_is_ignored(client, tmp_path):
+    assert "X-Profile-File" not in client.get("/work", headers={"X-Profile": "guess"}).headers
+    assert "X-Profile-File" not in client.get(f"/work?profile={TOKEN}").headers
+    assert client.get(f"/profiling/sampling?token={TOKEN}").status_code == 403
+    assert os.listdir(tmp_path) == []
+
+def test_no_configured_token_disables_everything(client, monkeypatch):
+    monkeypatch.setattr(profiling, "PROFILE_TOKEN", "")
+    assert "X-Profile-File" not in client.get("/work", headers={"X-Profile": ""}).headers
+    assert client.get("/profiling/flamegraph", headers={"X-Profile-Token": ""}).status_code == 403
+
+def test_sampler_aggregates_stacks_per_endpoint(client):
+    sampler = profiling.sampler
+    ready, release = threading.Event(), threading.Event()
+
+    def serve():
+        sampler.enter("work")
+        ready.set()
+        release.wait(5)
+        sampler.exit()
+
+    thread = threading.Thread(target=serve)
+    thread.start()
+    ready.wait(5)
+    sampler.sample_once()
+    sampler.sample_once()
+    release.set()
+    thread.join()
+
+    status = client.get("/profiling/sampling", headers={"X-Profile-Token": TOKEN}).json
+    assert status["samples"] == 2 and status["endpoints"] == {"work": 2}
+    folded = client.get("/profiling/flamegraph?endpoint=work", headers={"X-Profile-Token": TOKEN}).get_data(as_text=True)
+    line = folded.strip().splitlines()[0]
+    assert line.startswith("work;") and "serve (test_profiling.py:" in line and line.endswith(" 2")
+
+    client.post("/profiling/sampling", json={"reset": True}, headers={"X-Profile-Token": TOKEN})
+    assert sampler.samples == 0 and sampler.stacks == {}
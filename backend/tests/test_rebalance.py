@@ -0,0 +1,52 @@
+# Rebalancer: minimum-turnover trades, lot rounding, cash and bulk runs.
+
+import pytest
+
+from rebalance import rebalance, rebalance_bulk
+
+def make_portfolio():
+    return {"assets": {
+        "Stocks": {"holdings": [
+            {"name": "TCS", "symbol": "TCS.NS", "quantity": 20, "price_per_share": 3000.0, "total_value": 60000.0},
+            {"name": "INFY", "symbol": "INFY.NS", "quantity": 10, "price_per_share": 1500.0, "total_value": 15000.0},
+        ]},
+        "Mutual Funds": {"holdings": [
+            {"name": "Parag Parikh Flexi Cap", "units": 250.0, "nav": 100.0, "total_value": 25000.0},
+        ]},
+    }}
+
+def test_sells_over_weight_and_buys_under_weight_in_whole_lots():
+    plan = rebalance(make_portfolio(), {"stocks": 50, "mutualFunds": 50})
+    trades = {trade["name"]: trade for trade in plan["trades"]}
+    # 25,000 of stocks is sold pro rata to value (TCS 80%, INFY 20%), rounded down to whole shares
+    assert trades["TCS"]["action"] == "SELL" and trades["TCS"]["units"] == 6
+    assert trades["INFY"]["action"] == "SELL" and trades["INFY"]["units"] == 3
+    proceeds = 6 * 3000 + 3 * 1500
+    assert plan["sell_proceeds"] == proceeds
+    # Fund units trade in 0.001 lots and absorb the proceeds
+    assert trades["Parag Parikh Flexi Cap"]["action"] == "BUY"
+    assert plan["buy_amount"] == pytest.approx(proceeds, abs=0.1)
+    assert plan["turnover"] == pytest.approx(plan["sell_proceeds"] + plan["buy_amount"])
+    assert plan["after"]["stocks"] == pytest.approx(52.5, abs=0.01)
+
+def test_on_target_portfolio_has_no_trades():
+    plan = rebalance(make_portfolio(), {"stocks": 75, "mutualFunds": 25})
+    assert plan["trades"] == [] and plan["turnover"] == 0
+
+def test_new_bucket_is_an_amount_only_line():
+    plan = rebalance(make_portfolio(), {"stocks": 60, "mutualFunds": 20, "ETFs": 20}, cash=10000)
+    etf = next(trade for trade in plan["trades"] if trade["bucket"] == "ETFs")
+    assert etf["name"] == "New ETF" and etf["units"] is None and etf["price"] is None
+    assert 0 < etf["amount"] <= 22000  # 20% of 110,000, less what lot rounding left unsold
+    assert plan["buy_amount"] <= 10000 + plan["sell_proceeds"]
+
+def test_bulk_reports_each_failure_once():
+    portfolios = {"A": make_portfolio(), "B": make_portfolio()}
+    plans, errors = rebalance_bulk(portfolios, {"stocks": 50, "mutualFunds": 50})
+    assert set(plans) == {"A", "B"} and errors == {}
+
+    plans, errors = rebalance_bulk(portfolios, {"A": {"stocks": 50, "mutualFunds": 50}})
+    assert set(plans) == {"A"} and errors == {"B": "No target allocation"}
+
+    plans, errors = rebalance_bulk(portfolios, {})
+    assert plans == {} and errors == {"A": "No target allocation", "B": "No target allocation"}
@@ -0,0 +1,144 @@
+# Upstream guard driven against fault_stub.FaultStub: breaker, hedging and rate budget.
+
+import asyncio
+import time
+
+import pytest
+import requests
+
+import metrics
+from fault_stub import FaultStub
+from resilience import UPSTREAM_EVENTS, SharedRateBudget, Upstream, UpstreamUnavailable
+
+@pytest.fixture(autouse=True)
+def metrics_enabled(monkeypatch):
+    monkeypatch.setattr(metrics, "METRICS_ENABLED", True)
+
+@pytest.fixture
+def stub():
+    stub = FaultStub().start()
+    yield stub
+    stub.stop()
+
+def quote_fetch(stub):
+    def fetch(symbol):
+        response = requests.get(f"{stub.url}/api/quote-equity", params={"symbol": symbol}, timeout=5)
+        response.raise_for_status()
+        return response.json()["priceInfo"]["lastPrice"]
+    return fetch
+
+def events(provider, event):
+    return UPSTREAM_EVENTS.values.get((provider, event), 0)
+
+def test_breaker_opens_then_half_opens(stub):
+    guard = Upstream("test_breaker", threshold=3, reset_timeout=0.3)
+    fetch = quote_fetch(stub)
+    stub.set_faults(error_rate=1.0)
+    for _ in range(3):
+        with pytest.raises(requests.HTTPError):
+            guard.call(fetch, "TCS")
+    assert guard.breaker.state == "open"
+    assert events("test_breaker", "open") == 1
+
+    # Open: refused without reaching the provider
+    sent = stub.requests
+    with pytest.raises(UpstreamUnavailable):
+        guard.call(fetch, "TCS")
+    assert guard.call(fetch, "TCS", fallback=lambda: 1.0) == 1.0
+    assert stub.requests == sent
+
+    # Half-open: one probe goes out and a success closes the breaker
+    time.sleep(0.35)
+    assert guard.breaker.state == "half_open"
+    stub.set_faults()
+    assert guard.call(fetch, "TCS") > 0
+    assert guard.breaker.state == "closed"
+    assert stub.requests == sent + 1
+
+def test_failed_probe_reopens(stub):
+    guard = Upstream("test_probe", threshold=1, reset_timeout=0.2)
+    fetch = quote_fetch(stub)
+    stub.set_faults(error_rate=1.0)
+    with pytest.raises(requests.HTTPError):
+        guard.call(fetch, "TCS")
+    time.sleep(0.25)
+    with pytest.raises(requests.HTTPError):
+        guard.call(fetch, "TCS")
+    assert guard.breaker.state == "open"
+
+def test_hedge_answers_a_slow_failure(stub):
+    fast = FaultStub().start()
+    try:
+        guard = Upstream("test_hedge")
+        for _ in range(20):
+            guard.latency.add(0.01)  # p95 of 10 ms: the hedge goes out almost at once
+        stub.set_faults(latency=0.3, error_rate=1.0)
+        targets = iter([quote_fetch(stub), quote_fetch(fast)])
+
+        def fetch(symbol):
+            return next(targets)(symbol)
+
+        assert guard.call(fetch, "TCS", hedge=True) > 0
+        assert stub.requests == 1 and fast.requests == 1
+        assert events("test_hedge", "hedge") == 1
+        assert events("test_hedge", "hedge_win") == 1
+        assert guard.breaker.failures == 0
+    finally:
+        fast.stop()
+
+def test_hedge_cuts_a_slow_first_attempt(stub):
+    fast = FaultStub().start()
+    try:
+        guard = Upstream("test_hedge_tail")
+        for _ in range(20):
+            guard.latency.add(0.01)
+        stub.set_faults(latency=1.5)
+        targets = iter([quote_fetch(stub), quote_fetch(fast)])
+
+        def fetch(symbol):
+            return next(targets)(symbol)
+
+        start = time.perf_counter()
+        assert guard.call(fetch, "TCS", hedge=True) > 0
+        assert time.perf_counter() - start < 0.5  # The duplicate answered; the slow attempt was not awaited
+        assert fast.requests == 1
+        assert events("test_hedge_tail", "hedge_win") == 1
+    finally:
+        fast.stop()
+
+def test_no_hedge_when_first_attempt_is_quick(stub):
+    guard = Upstream("test_no_hedge")  # Default 1 s hedge delay until samples exist
+    assert guard.call(quote_fetch(stub), "TCS", hedge=True) > 0
+    assert stub.requests == 1
+    assert events("test_no_hedge", "hedge") == 0
+
+def test_rate_budget_refuses_without_counting_a_failure(stub):
+    budget = SharedRateBudget({"test_rate": (0.001, 1)}, path=None)
+    guard = Upstream("test_rate", budget)
+    fetch = quote_fetch(stub)
+    assert guard.call(fetch, "TCS") > 0
+    with pytest.raises(UpstreamUnavailable):
+        guard.call(fetch, "TCS")
+    assert guard.call(fetch, "TCS", fallback=lambda: None) is None
+    assert stub.requests == 1
+    assert events("test_rate", "rate_limited") == 2
+    assert guard.breaker.failures == 0
+
+def test_acall_short_circuits_open_breaker(stub):
+    guard = Upstream("test_acall", threshold=2, reset_timeout=30)
+    fetch = quote_fetch(stub)
+
+    async def afetch(symbol):
+        return await asyncio.to_thread(fetch, symbol)
+
+    async def run():
+        assert await guard.acall(afetch, "TCS") > 0
+        stub.set_faults(error_rate=1.0)
+        for _ in range(2):
+            with pytest.raises(requests.HTTPError):
+                await guard.acall(afetch, "TCS")
+        return await guard.acall(afetch, "TCS", fallback=lambda: "cached")
+
+    assert asyncio.run(run()) == "cached"
+    assert guard.breaker.state == "open"
+    assert stub.requests == 3
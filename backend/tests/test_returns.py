@@ -0,0 +1,71 @@
+# Vectorized XIRR and time-weighted returns on known cash flow series.
+
+import datetime
+
+import numpy as np
+
+from returns import holding_returns, npv, pad_flows, time_weighted, to_day, xirr
+
+def flows(*pairs):
+    """(ISO date, amount) pairs -> padded single-row matrices."""
+    days = np.array([to_day(datetime.date.fromisoformat(d)) for d, _ in pairs], dtype=np.int64)
+    return days, np.array([a for _, a in pairs], dtype=float)
+
+def test_xirr_on_known_series():
+    rows = [
+        flows(("2023-01-01", -1000), ("2024-01-01", 1100)),  # 10% over 365 days
+        flows(("2021-01-01", -1000), ("2022-12-31", 1210)),  # 10% a year over 729 days ~ 2 years
+        flows(("2020-01-01", -100), ("2020-04-01", 300)),  # Huge short-period return
+        flows(("2020-01-01", -100), ("2020-06-01", -50)),  # No inflow: undefined
+    ]
+    amounts, times = pad_flows(rows)
+    rates = xirr(amounts, times)
+    assert np.isclose(rates[0], 0.10, atol=1e-9)
+    assert np.isclose(rates[1], 1.21 ** (365 / 729) - 1, atol=1e-9)
+    assert np.isclose(rates[2], 3 ** (365 / 91) - 1, rtol=1e-6)
+    assert np.isnan(rates[3])
+
+def test_xirr_zeroes_npv_on_irregular_flows():
+    days, amounts = flows(("2022-01-15", -50000), ("2022-07-03", -20000), ("2023-02-28", 5000),
+                          ("2023-09-11", -10000), ("2024-10-01", 98000))
+    matrix, times = pad_flows([(days, amounts)])
+    rate = xirr(matrix, times)
+    assert abs(npv(rate, matrix, times)[0]) < 1e-4
+    assert 0.05 < rate[0] < 0.15
+
+def test_batched_rows_match_one_at_a_time():
+    rng = np.random.default_rng(3)
+    rows = []
+    for _ in range(50):
+        n = rng.integers(2, 8)
+        days = np.sort(rng.choice(np.arange(19000, 20500), n, replace=False))
+        amounts = -rng.uniform(100, 1000, n)
+        amounts[-1] = -amounts[:-1].sum() * rng.uniform(0.7, 1.6)
+        rows.append((days, amounts))
+    batched = xirr(*pad_flows(rows))
+    single = np.array([xirr(*pad_flows([row]))[0] for row in rows])
+    np.testing.assert_allclose(batched, single, rtol=1e-7, atol=1e-9)
+
+def test_time_weighted_ignores_flow_timing():
+    # Buy 10 @ 100, buy 10 more @ 200, worth 150 each at the end
+    values_before = np.array([[0.0, 2000.0, 3000.0]])
+    amounts = np.array([[-1000.0, -2000.0, 3000.0]])
+    assert np.isclose(time_weighted(values_before, amounts)[0], 2.0 * 0.75 - 1)
+
+def test_holding_returns_for_transactions_and_fixed_deposits():
+    portfolio = {"assets": {
+        "Stocks": {"holdings": [{"name": "TCS", "total_value": 3000.0, "transactions": [
+            {"date": "2023-07-01", "units": 10, "price": 200},
+            {"date": "2023-01-01", "units": 10, "price": 100},
+        ]}]},
+        "Fixed Deposits": {"holdings": [{"bank": "SBI", "investment": 100000, "duration": 12,
+                                         "start_date": "2023-01-01", "total_value": 107000.0}]},
+        "Government Schemes": {"holdings": [{"scheme": "PPF", "total_value": 5000.0}]},  # No flows
+    }}
+    result = holding_returns(portfolio, today=datetime.date(2024, 1, 1))
+    tcs, fd = result["holdings"]
+    assert (tcs["name"], tcs["invested"], tcs["first_flow"], tcs["twr"]) == ("TCS", 3000.0, "2023-01-01", 50.0)
+    assert tcs["twr_annualized"] == 50.0  # Exactly one year
+    assert fd["xirr"] == 7.0 and fd["final_value"] == 107000.0
+    assert result["portfolio"]["invested"] == 103000.0
+    assert result["portfolio"]["xirr"] is not None
@@ -0,0 +1,102 @@
+# Incremental valuation: dirty tracking, totals, allocations, rebuilds and holdings without a price.
+
+import numpy as np
+import pytest
+
+import data
+import revaluation
+from revaluation import PortfolioValuation, get_valuation
+
+def make_portfolio():
+    return {"assets": {
+        "Stocks": {"holdings": [{"name": "TCS", "quantity": 10}, {"name": "INFY", "quantity": 5},
+                                {"name": "TCS", "quantity": 2}]},
+        "Mutual Funds": {"holdings": [{"name": "Parag Parikh Flexi Cap", "units": 100.0}]},
+        "Fixed Deposits": {"holdings": [{"name": "SBI FD", "amount": 50000}]},
+    }}
+
+def fixed_income_value(category, item):
+    return item["amount"] * 1.1
+
+def prices(tcs=4000.0, infy=1500.0, nav=80.0):
+    return {"Stocks": {"TCS": tcs, "INFY": infy}, "Mutual Funds": {"Parag Parikh Flexi Cap": nav}, "ETF": {}}
+
+@pytest.fixture
+def valuation():
+    return PortfolioValuation(make_portfolio(), 0, fixed_income_value)
+
+def test_first_valuation_sets_values_totals_and_allocations(valuation):
+    assert valuation.apply(prices()) == 4
+    portfolio = valuation.portfolio
+    stocks = portfolio["assets"]["Stocks"]
+    assert [item["total_value"] for item in stocks["holdings"]] == [40000.0, 7500.0, 8000.0]
+    assert stocks["total_value"] == 55500.0
+    assert portfolio["total_portfolio_value"] == pytest.approx(55500 + 8000 + 55000)
+    assert portfolio["assets"]["Fixed Deposits"]["holdings"][0]["allocation"] == "46.41%"
+    assert "price_status" not in portfolio
+
+def test_only_moved_instruments_are_rewritten(valuation):
+    valuation.apply(prices())
+    assert valuation.apply(prices()) == 0
+    assert valuation.apply(prices(tcs=4100.0)) == 2  # Both TCS holdings, nothing else
+    assert valuation.portfolio["assets"]["Stocks"]["total_value"] == 41000 + 7500 + 8200
+
+def test_missing_price_keeps_last_known_value(valuation):
+    valuation.apply(prices())
+    valuation.apply({**prices(), "Stocks": {"TCS": None, "INFY": 1600.0}})
+    portfolio = valuation.portfolio
+    tcs = portfolio["assets"]["Stocks"]["holdings"][0]
+    assert tcs["total_value"] == 40000.0 and tcs["price_status"] == "stale"
+    assert portfolio["price_status"] == {"stale": ["TCS"]}
+    assert portfolio["assets"]["Stocks"]["holdings"][1]["total_value"] == 8000.0
+
+    valuation.apply(prices())
+    assert "price_status" not in tcs and "price_status" not in portfolio
+
+def test_never_priced_instrument_is_left_out_of_totals():
+    portfolio = make_portfolio()
+    portfolio["assets"]["Stocks"]["holdings"][1]["price_per_share"] = 1450.0  # Stored from an earlier run
+    valuation = PortfolioValuation(portfolio, 0, fixed_income_value)
+    valuation.apply({**prices(), "Stocks": {"TCS": None, "INFY": None}})
+    assert portfolio["price_status"] == {"stale": ["INFY"], "unpriced": ["TCS"]}
+    tcs, infy, _ = portfolio["assets"]["Stocks"]["holdings"]
+    assert tcs["total_value"] == 0 and tcs["price_per_share"] is None and tcs["price_status"] == "unpriced"
+    assert infy["total_value"] == 7250.0
+    assert portfolio["total_portfolio_value"] == pytest.approx(7250 + 8000 + 55000)
+
+    # Still unpriced on the next refresh: not mistaken for a last-known price of 0
+    valuation.apply({**prices(), "Stocks": {"TCS": None, "INFY": None}})
+    assert portfolio["price_status"]["unpriced"] == ["TCS"]
+
+def test_allocations_match_a_full_reformat_after_small_moves(valuation):
+    rng = np.random.default_rng(5)
+    for tcs, infy, nav in 4000 * (1 + rng.normal(0, 0.0005, (200, 3))) * [1, 0.375, 0.02]:
+        valuation.apply(prices(tcs, infy, nav))
+        portfolio = valuation.portfolio
+        total = portfolio["total_portfolio_value"]
+        for details in portfolio["assets"].values():
+            for item in details["holdings"]:
+                assert item["allocation"] == f"{item['total_value'] / total * 100:.2f}%"
+    stocks = portfolio["assets"]["Stocks"]["holdings"]
+    assert portfolio["assets"]["Stocks"]["total_value"] == pytest.approx(sum(i["total_value"] for i in stocks))
+
+def test_state_is_rebuilt_when_holdings_change(monkeypatch):
+    monkeypatch.setattr(revaluation, "_valuations", {})
+    monkeypatch.setattr(data, "user_portfolios", {"P1": make_portfolio()})
+    monkeypatch.setattr(data, "_holding_index", {})
+    monkeypatch.setattr(data, "_holdings_versions", {})
+    portfolio = data.user_portfolios["P1"]
+
+    valuation = get_valuation("P1", portfolio, fixed_income_value)
+    valuation.apply(prices())
+    assert get_valuation("P1", portfolio, fixed_income_value) is valuation
+
+    data.upsert_holdings([("P1", "Stocks", {"name": "ITC", "quantity": 100})])
+    rebuilt = get_valuation("P1", portfolio, fixed_income_value)
+    assert rebuilt is not valuation
+    assert "ITC" in rebuilt.instruments()["Stocks"]
+    assert rebuilt.apply({**prices(), "Stocks": {"TCS": 4000.0, "INFY": 1500.0, "ITC": 450.0}}) == 5
+    assert portfolio["assets"]["Stocks"]["total_value"] == 55500.0 + 45000.0
+
+    replaced = make_portfolio()  # A new portfolio object for the PAN
+    assert get_valuation("P1", replaced, fixed_income_value).portfolio is replaced
@@ -0,0 +1,81 @@
+# Rolling covariance in risk.ReturnHistoryCache against a full recompute.
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import risk
+
+SYMBOLS = ["A.NS", "B.NS", risk.NIFTY_SYMBOL]
+
+@pytest.fixture
+def market(monkeypatch):
+    """A price panel served by a fake fetch_close_panel up to market["upto"] rows."""
+    rng = np.random.default_rng(7)
+    days = pd.bdate_range("2023-01-02", periods=400)
+    panel = pd.DataFrame(100 * np.exp(np.cumsum(rng.normal(0, 0.01, (400, 3)), axis=0)), index=days, columns=SYMBOLS)
+    panel.loc[days[:150], "B.NS"] = np.nan  # Listed later
+    panel.loc[days[200:203], "A.NS"] = np.nan  # Missing bars
+    state = {"panel": panel, "upto": 380, "requests": []}
+
+    def fetch(symbols, period="1y"):
+        state["requests"].append((tuple(symbols), period))
+        rows = state["panel"].iloc[:state["upto"]]
+        rows = rows.iloc[-5:] if period == "5d" else rows
+        return rows[[s for s in symbols if s in rows.columns]]
+
+    monkeypatch.setattr(risk, "fetch_close_panel", fetch)
+    return state
+
+def rebuilt(lookback):
+    cache = risk.ReturnHistoryCache(lookback=lookback)
+    cache.ensure(SYMBOLS)
+    return cache
+
+def test_covariance_is_pairwise_complete(market):
+    cache = rebuilt(200)
+    returns = cache.returns
+    assert not (returns == 0).any().any()  # Missing bars are not 0% returns
+    np.testing.assert_allclose(cache.covariance(SYMBOLS), returns.cov().to_numpy())
+    np.testing.assert_allclose(cache.mean_returns(SYMBOLS), returns.mean().to_numpy())
+
+def test_appended_bars_match_a_full_recompute(market):
+    cache = rebuilt(200)
+    market["upto"] = 384
+    cache.last_refresh = 0
+    cache.ensure(["A.NS"])
+    np.testing.assert_allclose(cache.covariance(SYMBOLS), rebuilt(200).covariance(SYMBOLS))
+    assert len(cache.returns) == 200
+
+def test_revised_trailing_bar_replaces_the_cached_one(market):
+    cache = rebuilt(200)
+    panel = market["panel"].copy()
+    panel.iloc[379, 0] *= 1.05  # The close of the last cached session came back revised
+    market["panel"] = panel
+    cache.last_refresh = 0
+    cache.ensure(SYMBOLS)
+    assert cache.closes.iloc[-1, 0] == panel.iloc[379, 0]
+    np.testing.assert_allclose(cache.covariance(SYMBOLS), rebuilt(200).covariance(SYMBOLS))
+
+def test_symbol_without_history_is_not_refetched_every_call(market):
+    cache = rebuilt(200)
+    downloads = len(market["requests"])
+    cache.ensure(SYMBOLS + ["DELISTED.NS"])
+    cache.ensure(SYMBOLS + ["DELISTED.NS"])
+    assert len(market["requests"]) == downloads + 1
+    assert "DELISTED.NS" in cache.failed
+
+    # New bars still come in while the failed symbol waits for its retry
+    market["upto"] = 382
+    cache.last_refresh = 0
+    cache.ensure(SYMBOLS + ["DELISTED.NS"])
+    assert cache.closes.index[-1] == market["panel"].index[381]
+
+def test_portfolio_metrics_use_shared_days(market):
+    cache = rebuilt(200)
+    holdings = pd.DataFrame({"category": ["Stocks", "Stocks"], "name": ["A", "B"],
+                             "symbol": ["A.NS", "B.NS"], "total_value": [1000.0, 500.0]})
+    metrics = risk.portfolio_risk_metrics(holdings, cache=cache)
+    shared = cache.returns[["A.NS", "B.NS"]].dropna()
+    assert metrics["observations"] == len(shared)
+    assert metrics["volatility_daily"] > 0 and metrics["beta"] is not None
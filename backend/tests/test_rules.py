@@ -0,0 +1,62 @@
+# Vectorized recommendation rule engine over the shipped recommendation_rules.json.
+
+import json
+
+import pandas as pd
+import pytest
+
+import rules
+from holdings import HOLDING_COLUMNS
+
+@pytest.fixture
+def engine():
+    with open(rules.RECOMMENDATION_RULES_FILE) as f:
+        config = json.load(f)
+
+    def fund_status(names):
+        return pd.DataFrame({"name": list(names),
+                             "fund_status": ["bad" if "Weak" in n else "good" for n in names],
+                             "fund_reason": ["high_expense_ratio" if "Weak" in n else "" for n in names]})
+
+    return rules.RecommendationEngine(config, fund_status=fund_status)
+
+def frame(pan, rows):
+    return pd.DataFrame(rows, columns=HOLDING_COLUMNS).assign(pan=pan)
+
+CONCENTRATED = [
+    ("Stocks", "HDFC Bank", "HDFCBANK.NS", 10, 50000, None),
+    ("Stocks", "ICICI Bank", "ICICIBANK.NS", 10, 30000, None),
+    ("Mutual Funds", "Weak Fund", "^NSEI", 100, 10000, None),
+    ("Fixed Deposits", "SBI", None, 0, 10000, 4),
+]
+BALANCED = [
+    ("Stocks", "TCS", "TCS.NS", 5, 20000, None),
+    ("Stocks", "ITC", "ITC.NS", 50, 20000, None),
+    ("Mutual Funds", "Good Fund", "^NSEI", 100, 20000, None),
+    ("Mutual Funds", "Other Fund", "^NSEI", 100, 20000, None),
+    ("Fixed Deposits", "HDFC", None, 0, 20000, 24),
+]
+
+def test_each_rule_type_fires(engine):
+    result = engine.evaluate(frame("P1", CONCENTRATED), {"P1": "High Risk"})["P1"]
+    assert result[:2] == engine.tables["risk_level"].query("key == 'High Risk'")["message"].tolist()
+    assert "Stocks constitute over 70% of your portfolio. Diversify by reducing equity exposure." in result
+    assert any(m.startswith("HDFC Bank makes up 50.00%") for m in result)
+    assert any(m.startswith("ICICI Bank makes up 30.00%") for m in result)
+    assert any(m.startswith("The Financials sector is 80.00%") for m in result)
+    assert "Your Fixed Deposits with SBI matures in 4 months. Plan where to reinvest the proceeds." in result
+    assert any(m.startswith("Weak Fund is flagged by the fund screener (high_expense_ratio)") for m in result)
+
+def test_balanced_portfolio_only_gets_risk_advice(engine):
+    result = engine.evaluate(frame("P2", BALANCED), {"P2": "Moderate Risk"})["P2"]
+    assert result == engine.tables["risk_level"].query("key == 'Moderate Risk'")["message"].tolist()
+
+def test_bulk_evaluation_matches_single_portfolios(engine):
+    levels = {"P1": "High Risk", "P2": "Low Risk"}
+    bulk = engine.evaluate(pd.concat([frame("P1", CONCENTRATED), frame("P2", BALANCED)], ignore_index=True), levels)
+    for pan, rows in (("P1", CONCENTRATED), ("P2", BALANCED)):
+        assert bulk[pan] == engine.evaluate(frame(pan, rows), {pan: levels[pan]})[pan]
+
+def test_unknown_rule_type_is_rejected():
+    with pytest.raises(ValueError):
+        rules.RecommendationEngine.compile([{"type": "vibes", "message": "?"}])
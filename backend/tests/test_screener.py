@@ -0,0 +1,48 @@
+# Batched stock screener metrics and ranking.
+
+import numpy as np
+import pandas as pd
+
+import screener
+
+def panel():
+    days = pd.bdate_range("2024-01-01", periods=260)
+    rising = np.linspace(100, 150, 260)
+    falling = np.linspace(200, 120, 260)
+    late = np.r_[np.full(60, np.nan), np.linspace(50, 55, 200)]  # Listed later
+    close = pd.DataFrame({"UP.NS": rising, "DOWN.NS": falling, "LATE.NS": late}, index=days)
+    close.iloc[-1, 0] = np.nan  # Stale last bar for UP
+    return close
+
+def test_metrics_match_a_per_symbol_computation():
+    close = panel()
+    metrics = screener.compute_screen_metrics(close)
+    for symbol in close.columns:
+        series = close[symbol].dropna()
+        assert metrics.loc[symbol, "price"] == series.iloc[-1]
+        start = close[symbol].ffill().iloc[-screener.LOOKBACK_3M:].bfill().iloc[0]
+        assert np.isclose(metrics.loc[symbol, "return_3m"], (series.iloc[-1] / start - 1) * 100)
+        assert np.isclose(metrics.loc[symbol, "max_drawdown"], (series / series.cummax() - 1).min() * 100)
+    assert metrics.loc["DOWN.NS", "below_ma50"] and metrics.loc["DOWN.NS", "below_ma200"]
+    assert not metrics.loc["UP.NS", "below_ma50"]
+
+def test_rank_screen_puts_the_weakest_first():
+    ranked = screener.rank_screen(screener.compute_screen_metrics(panel()))
+    assert ranked.index[0] == "DOWN.NS"
+    assert ranked.loc["DOWN.NS", "status"] == "bad"
+    assert ranked.loc["UP.NS", "status"] == "good"
+    assert list(ranked["score"]) == sorted(ranked["score"], reverse=True)
+
+def test_screen_stocks_reports_missing_symbols(monkeypatch):
+    requests = []
+
+    def fetch(symbols, period="1y"):
+        requests.append(list(symbols))
+        return panel()[["UP.NS", "DOWN.NS"]]
+
+    monkeypatch.setattr(screener, "fetch_close_panel", fetch)
+    result = screener.screen_stocks(["up", "down", "Gone Co"])
+    assert requests == [["UP.NS", "DOWN.NS", "GONECO.NS"]]  # One batched request
+    assert [r["symbol"] for r in result["results"]] == ["DOWN.NS", "UP.NS"]
+    assert [r["rank"] for r in result["results"]] == [1, 2]
+    assert result["missing"] == ["Gone Co"]
@@ -0,0 +1,65 @@
+# Non-blocking upstream I/O in the ASGI serving mode. Needs the async extras (quart,
+# quart-cors, httpx) and server.py's own dependencies, so it is skipped without them.
+
+import asyncio
+import time
+
+import pytest
+
+pytest.importorskip("quart")
+pytest.importorskip("quart_cors")
+pytest.importorskip("ta")
+
+import server
+import server_async
+from resilience import Upstream
+
+LATENCY = 0.2
+
+class SlowResponse:
+    def __init__(self, symbol):
+        self.symbol = symbol
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return {"info": {"symbol": self.symbol}, "priceInfo": {"lastPrice": 100.0}}
+
+class SlowClient:
+    """Stands in for the pooled httpx.AsyncClient: every GET waits LATENCY seconds."""
+    def __init__(self):
+        self.requests = []
+
+    async def get(self, url):
+        self.requests.append(url)
+        await asyncio.sleep(LATENCY)
+        return SlowResponse(url.rsplit("=", 1)[-1])
+
+@pytest.fixture
+def client(monkeypatch):
+    client = SlowClient()
+    guard = Upstream("test_async_nse")  # No shared rate budget
+    monkeypatch.setattr(server_async, "http_client", client)
+    monkeypatch.setattr(server_async, "nse_primed", True)
+    monkeypatch.setattr(server_async, "get_upstream", lambda provider: guard)
+    monkeypatch.setattr(server, "cache", {})
+    return client
+
+def test_concurrent_quotes_overlap(client):
+    symbols = [f"SYM{i}" for i in range(20)]
+
+    async def run():
+        started = time.perf_counter()
+        quotes = await asyncio.gather(*(server_async.get_quote_nse(s) for s in symbols))
+        return quotes, time.perf_counter() - started
+
+    quotes, elapsed = asyncio.run(run())
+    assert [q["info"]["symbol"] for q in quotes] == symbols
+    assert elapsed < LATENCY * 5  # Serially this would take 20 x LATENCY
+
+def test_quotes_are_served_from_the_shared_cache(client):
+    asyncio.run(server_async.get_quote_nse("TCS"))
+    asyncio.run(server_async.get_quote_nse("TCS"))
+    assert len(client.requests) == 1
+    assert server.cache["TCS"]["data"]["priceInfo"]["lastPrice"] == 100.0
@@ -0,0 +1,73 @@
+# Seqlock-guarded shared memory price table.
+
+import os
+import threading
+from multiprocessing import resource_tracker
+
+import pytest
+
+from shared_prices import SharedPriceTable
+
+@pytest.fixture
+def tables():
+    name = f"invest360_test_{os.getpid()}"
+    writer = SharedPriceTable.create(name=name, capacity=4)
+    reader = SharedPriceTable.attach(name=name)
+    # attach() unregistered the segment the writer registered in this same process
+    resource_tracker.register(writer.shm._name, "shared_memory")
+    yield writer, reader
+    reader.close()
+    writer.close()
+
+def test_reader_sees_writes_and_new_symbols(tables):
+    writer, reader = tables
+    assert reader.capacity == 4
+    assert reader.read("TCS") is None
+
+    writer.write("TCS", 3500.5, 1000.0)
+    assert reader.read("TCS") == (3500.5, 1000.0)
+    writer.write("INFY", 1500.0, 1001.0)  # Registered after the reader built its index
+    writer.write("TCS", 3501.0, 1002.0)
+    assert reader.read("INFY") == (1500.0, 1001.0)
+    assert reader.read("TCS") == (3501.0, 1002.0)
+
+def test_registered_but_unwritten_and_torn_slots_read_as_missing(tables):
+    writer, reader = tables
+    writer.register("ITC")
+    assert reader.read("ITC") is None
+
+    writer.write("ITC", 450.0, 1.0)
+    writer.slots[writer.index["ITC"]]["seq"] += 1  # Writer stopped mid-update
+    assert reader.read("ITC") is None
+
+def test_full_table_is_refused(tables):
+    writer, _ = tables
+    for symbol in ("A", "B", "C", "D"):
+        writer.write(symbol, 1.0, 1.0)
+    with pytest.raises(RuntimeError):
+        writer.write("E", 1.0, 1.0)
+
+def test_attach_without_a_refresher_returns_none():
+    assert SharedPriceTable.attach(name=f"invest360_missing_{os.getpid()}") is None
+
+def test_reads_are_never_torn_under_concurrent_writes(tables):
+    writer, reader = tables
+    writer.write("TCS", 0.0, 0.0)
+    done = threading.Event()
+
+    def write():
+        for i in range(1, 20001):
+            writer.write("TCS", float(i), float(i))  # Price and timestamp always match
+        done.set()
+
+    thread = threading.Thread(target=write)
+    thread.start()
+    reads = 0
+    while not done.is_set():
+        value = reader.read("TCS")
+        if value is not None:
+            assert value[0] == value[1]
+            reads += 1
+    thread.join()
+    assert reads > 0
+    assert reader.read("TCS") == (20000.0, 20000.0)
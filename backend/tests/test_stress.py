@@ -0,0 +1,93 @@
+# Scenario library compilation and the holdings x factors x scenarios stress matrix.
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import stress
+from holdings import HOLDING_COLUMNS, NIFTY_SYMBOL
+
+CONFIG = {
+    "scenarios": [
+        {"id": "crash", "name": "Crash", "kind": "historical", "shocks": {"equity": -0.4, "gold": 0.1, "rates": -1.0}},
+        {"id": "rates_up", "name": "Rates up", "shocks": {"rates": 2.0}},
+    ],
+    "grids": [
+        {"id": "grid", "name": "Equity {equity:+.0%} / gold {gold:+.0%}",
+         "axes": {"equity": [-0.2, 0.0, 0.1], "gold": [0.0, 0.1, 0.1]}},
+    ],
+}
+
+def frame(rows):
+    return pd.DataFrame(rows, columns=HOLDING_COLUMNS)
+
+BOOK = [
+    ("Stocks", "TCS", "TCS.NS", 10, 10000.0, None),
+    ("Mutual Funds", "Flexi Cap", NIFTY_SYMBOL, 100, 5000.0, None),
+    ("ETF", "GOLDBEES", "GOLDBEES.NS", 50, 2000.0, None),
+    ("ETF", "NIFTYBEES", "NIFTYBEES.NS", 10, 1000.0, None),
+    ("Fixed Deposits", "SBI", None, 0, 12000.0, 24),
+]
+
+@pytest.fixture
+def library():
+    return stress.ScenarioLibrary(CONFIG)
+
+def test_grids_expand_into_the_cartesian_product(library):
+    assert library.ids[:2] == ["crash", "rates_up"]
+    assert library.ids[2:] == ["grid:equity=-0.2,gold=0", "grid:equity=-0.2,gold=0.1",
+                               "grid:equity=-0.1,gold=0", "grid:equity=-0.1,gold=0.1",
+                               "grid:equity=0,gold=0", "grid:equity=0,gold=0.1"]
+    assert library.names[3] == "Equity -20% / gold +10%"
+    assert library.shocks.shape == (len(stress.FACTORS), 8)
+    assert library.kinds[:2] == ["historical", "hypothetical"]
+
+def test_unknown_factors_and_scenarios_are_rejected(library):
+    with pytest.raises(ValueError):
+        stress.ScenarioLibrary({"scenarios": [{"id": "x", "name": "x", "shocks": {"crypto": -0.5}}]})
+    with pytest.raises(ValueError):
+        library.select(["nope"])
+
+def test_exposures_by_category():
+    matrix = stress.exposures(frame(BOOK), betas={"TCS.NS": 1.2})
+    equity, gold, silver, rates = (matrix[:, stress.FACTORS.index(f)] for f in stress.FACTORS)
+    np.testing.assert_allclose(equity, [12000.0, 5000.0, 0.0, 1000.0, 0.0])
+    np.testing.assert_allclose(gold, [0.0, 0.0, 2000.0, 0.0, 0.0])
+    assert not silver.any()
+    np.testing.assert_allclose(rates, [0.0, 0.0, 0.0, 0.0, -2 * 12000.0 / 100])
+
+def test_run_stress_matches_a_hand_computed_pnl(library):
+    small = frame(BOOK[:1] + BOOK[4:])
+    results = stress.run_stress({"P1": frame(BOOK), "P2": small}, library, ["crash", "rates_up"],
+                                custom=[{"name": "Gold spike", "shocks": {"gold": 0.5}}], detail=["crash"])
+    p1 = {s["id"]: s["pnl"] for s in results["P1"]["scenarios"]}
+    assert p1["crash"] == round(-0.4 * 16000 + 0.1 * 2000 + 1.0 * 240, 2)  # Beta 1 without betas
+    assert p1["rates_up"] == -480.0
+    assert p1["custom_0"] == 1000.0
+    assert results["P1"]["worst"][0] == "crash"
+    assert results["P1"]["total_value"] == 30000.0
+    assert [h["pnl"] for h in results["P1"]["holdings"]["crash"]] == [-4000.0, -2000.0, 200.0, -400.0, 240.0]
+
+    # Stacked evaluation gives each PAN the same result as stressing it alone
+    alone = stress.run_stress({"P2": small}, library, ["crash", "rates_up"],
+                              custom=[{"name": "Gold spike", "shocks": {"gold": 0.5}}], detail=["crash"])
+    assert results["P2"] == alone["P2"]
+    assert results["P2"]["scenarios"][0]["pnl_percent"] == round((-4000 + 240) / 22000 * 100, 2)
+
+class FakeCache:
+    def __init__(self, symbols, cov):
+        self.symbols, self.cov = symbols, np.array(cov)
+
+    def snapshot(self, symbols):
+        return self.symbols, self.cov, None, None
+
+def test_equity_betas_from_the_risk_cache():
+    cache = FakeCache(["TCS.NS", "INFY.NS", NIFTY_SYMBOL],
+                      [[4.0, 1.0, 3.0], [1.0, 2.0, np.nan], [3.0, np.nan, 2.0]])
+    assert stress.equity_betas(frame(BOOK), cache) == {"TCS.NS": 1.5}  # INFY has no overlap with NIFTY
+    assert stress.equity_betas(frame(BOOK), FakeCache(["TCS.NS"], [[1.0]])) == {}
+
+def test_shipped_library_compiles():
+    library = stress.load_library()
+    assert len(library.ids) == len(set(library.ids))
+    assert library.shocks.shape[0] == len(stress.FACTORS)
@@ -0,0 +1,81 @@
+# Columnar valuation history: upserts, delta-encoded files, worker merges and LTTB.
+
+import datetime
+
+import numpy as np
+import pytest
+
+import valuation_history
+from valuation_history import ValuationHistoryStore, ValuationSeries, lttb, to_day
+
+DAY = to_day(datetime.date(2025, 1, 1))
+
+def store_in(directory):
+    return ValuationHistoryStore(directory=str(directory), flush_interval=3600)
+
+def test_upsert_replaces_days_and_aligns_categories():
+    series = ValuationSeries()
+    series.upsert([DAY + 1, DAY], ["Stocks"], [[110.0], [100.0]])
+    series.upsert([DAY + 1, DAY + 2], ["Stocks", "ETF"], [[115.0, 5.0], [120.0, 6.0]])
+    assert series.categories == ["Stocks", "ETF"]
+    assert list(series.days) == [DAY, DAY + 1, DAY + 2]
+    np.testing.assert_array_equal(series.values, [[100.0, 0.0], [115.0, 5.0], [120.0, 6.0]])
+
+def test_delta_encoded_file_round_trips(tmp_path):
+    series = ValuationSeries()
+    series.upsert([DAY, DAY + 3, DAY + 4], ["Stocks", "Fixed Deposits"],
+                  [[1234.56, 50000.0], [1200.01, 50000.0], [1300.99, 50100.5]])
+    series.save(str(tmp_path / "P1.npz"))
+    loaded = ValuationSeries.load(str(tmp_path / "P1.npz"))
+    assert loaded.categories == series.categories
+    np.testing.assert_array_equal(loaded.days, series.days)
+    np.testing.assert_allclose(loaded.values, series.values)
+
+def test_flush_merges_rows_from_other_workers(tmp_path):
+    first, second = store_in(tmp_path), store_in(tmp_path)
+    first.upsert("P1", [DAY], ["Stocks"], [[100.0]])
+    second.upsert("P1", [DAY + 1], ["Stocks"], [[110.0]])
+    assert first.flush() == 1 and second.flush() == 1
+
+    reader = store_in(tmp_path)
+    assert list(reader.get("P1").days) == [DAY, DAY + 1]
+    first.upsert("P1", [DAY + 2], ["Stocks"], [[120.0]])  # Unflushed rows show on top of the file
+    assert list(first.get("P1").days) == [DAY, DAY + 1, DAY + 2]
+
+def test_lttb_keeps_endpoints_and_extremes():
+    x = np.arange(1000, dtype=float)
+    y = np.sin(x / 50)
+    y[437] = 25.0  # Spike
+    keep = lttb(x, y, 50)
+    assert len(keep) == 50
+    assert keep[0] == 0 and keep[-1] == 999 and 437 in keep
+    assert np.all(np.diff(keep) > 0)
+    assert list(lttb(x[:10], y[:10], 50)) == list(range(10))
+
+@pytest.fixture
+def history(tmp_path, monkeypatch):
+    store = store_in(tmp_path)
+    monkeypatch.setattr(valuation_history, "store", store)
+    days = DAY + np.arange(1000)
+    stocks = np.linspace(100, 200, 1000)
+    stocks[500] = 50.0  # Drawdown to 50 from ~150
+    fixed = np.full(1000, 100.0)
+    store.upsert("P1", days, ["Stocks", "Fixed Deposits"], np.column_stack([stocks, fixed]))
+    return days
+
+def test_portfolio_history_downsamples_and_reports_drift(history):
+    result = valuation_history.portfolio_history("P1", max_points=100)
+    assert result["observations"] == 1000 and result["downsampled"]
+    assert len(result["points"]) == 100
+    assert result["points"][0]["date"] == "2025-01-01"
+    assert result["total_return"] == 50.0
+    assert result["points"][-1]["cumulative_return"] == 50.0
+    peak = 100 + np.linspace(100, 200, 1000)[499]
+    assert result["max_drawdown"] == round((150 / peak - 1) * 100, 2)  # Taken from every day, not the kept points
+    assert result["allocation"]["start"] == {"Stocks": 50.0, "Fixed Deposits": 50.0}
+    assert result["allocation"]["drift"]["Stocks"] == round(200 / 300 * 100 - 50, 2)
+
+    window = valuation_history.portfolio_history("P1", start=valuation_history.from_day(history[10]),
+                                                 end=valuation_history.from_day(history[19]))
+    assert window["observations"] == 10 and not window["downsampled"]
+    assert valuation_history.portfolio_history("NOBODY") is None
@@ -0,0 +1,80 @@
+# training.py
+#
+# Training of the /predict ensemble: a stacking regressor (random forest, gradient
+# boosting, SVR and ridge under a linear meta-model) and a small LSTM. scikit-learn and
+# TensorFlow are only imported here, so the API process loads them on the first retrain
+# rather than at startup; serving an exported model (inference.py) needs neither.
+
+import numpy as np
+from sklearn.model_selection import train_test_split
+from sklearn.ensemble import RandomForestRegressor, GradientBoostingRegressor, StackingRegressor
+from sklearn.linear_model import Ridge, LinearRegression
+from sklearn.svm import SVR
+from sklearn.pipeline import Pipeline
+from sklearn.preprocessing import StandardScaler, MinMaxScaler
+from sklearn.impute import SimpleImputer
+from tensorflow.keras.models import Sequential
+from tensorflow.keras.layers import LSTM, Dense, Dropout
+
+from metrics import stage
+
+def create_lstm_model(input_shape):
+    model = Sequential([
+        LSTM(128, return_sequences=True, input_shape=input_shape),
+        Dropout(0.2),
+        LSTM(64, return_sequences=False),
+        Dropout(0.2),
+        Dense(32, activation='relu'),
+        Dense(1, activation='linear')
+    ])
+    model.compile(optimizer='adam', loss='mse')
+    return model
+
+def train_models(X, y):
+    """Fit the stacking pipeline and the LSTM (with its MinMaxScaler) on a training split of (X, y)."""
+    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
+
+    base_models = [
+        ('rf', RandomForestRegressor(n_estimators=100, random_state=42)),
+        ('gbr', GradientBoostingRegressor(random_state=42)),
+        ('svr', SVR()),
+        ('ridge', Ridge())
+    ]
+
+    stacking_reg = StackingRegressor(
+        estimators=base_models,
+        final_estimator=LinearRegression(),
+        cv=5
+    )
+
+    pipeline = Pipeline([
+        ('imputer', SimpleImputer(strategy='median')),
+        ('scaler', StandardScaler()),
+        ('stacking', stacking_reg)
+    ])
+
+    with stage("fit_stacking"):
+        pipeline.fit(X_train, y_train)
+
+    scaler = MinMaxScaler()
+    X_scaled = scaler.fit_transform(X_train)
+    X_lstm = np.reshape(X_scaled, (X_scaled.shape[0], 1, X_scaled.shape[1]))
+
+    lstm_model = create_lstm_model((1, X_scaled.shape[1]))
+    with stage("fit_lstm"):
+        lstm_model.fit(X_lstm, y_train, epochs=50, batch_size=32, verbose=1)
+
+    return pipeline, lstm_model, scaler
+
+def predict(pipeline, lstm_model, scaler, row):
+    """
+    Ensemble prediction for one feature row: both models see the same row, the LSTM
+    through the scaler it was trained with, as the exported model does.
+    """
+    row = np.asarray(row, dtype=float).reshape(1, -1)
+    with stage("predict_stacking"):
+        predicted_growth = pipeline.predict(row)[0]
+    with stage("predict_lstm"):
+        scaled = scaler.transform(row)
+        predicted_lstm = lstm_model.predict(scaled.reshape(1, 1, scaled.shape[1]))[0][0]
+    return (predicted_growth + predicted_lstm) / 2
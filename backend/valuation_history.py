@@ -0,0 +1,301 @@
+# valuation_history.py
+#
+# Daily valuation time series per PAN. Each series is columnar: one int day column and
+# one value column per asset category. On disk (one .npz per PAN in VALUATION_HISTORY_DIR)
+# days are stored as deltas from the first day and values as deltas of paise, which
+# compress to a few bytes per row with savez_compressed.
+#
+# A PAN keeps one row per day (its latest valuation that day). Valuations only update
+# memory; a background thread flushes changed PANs every VALUATION_HISTORY_FLUSH_SECONDS,
+# merging into the file as it is on disk (other workers write the same files) under a
+# per-PAN file lock and replacing it atomically.
+
+import atexit
+import datetime
+import fcntl
+import os
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+from holdings import holdings_frame
+from market_calendar import now_ist
+from risk import history_cache
+
+VALUATION_HISTORY_DIR = os.environ.get(
+    "VALUATION_HISTORY_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "valuation_history"))
+
+FLUSH_INTERVAL = float(os.environ.get("VALUATION_HISTORY_FLUSH_SECONDS", "30"))
+DEFAULT_MAX_POINTS = 500  # Ranges with more daily points are downsampled with LTTB
+EPOCH = datetime.date(1970, 1, 1)
+
+def to_day(date):
+    return (date - EPOCH).days
+
+def from_day(day):
+    return EPOCH + datetime.timedelta(days=int(day))
+
+class ValuationSeries:
+    """Daily category values for one PAN, kept sorted by day."""
+
+    def __init__(self, categories=(), days=None, values=None):
+        self.categories = list(categories)
+        self.days = days if days is not None else np.zeros(0, dtype=np.int64)
+        self.values = values if values is not None else np.zeros((0, len(self.categories)))
+
+    def _align(self, categories):
+        """Add value columns for categories this series has not seen yet."""
+        new = [c for c in categories if c not in self.categories]
+        if new:
+            self.categories += new
+            self.values = np.hstack([self.values, np.zeros((len(self.days), len(new)))])
+        return [self.categories.index(c) for c in categories]
+
+    def upsert(self, days, categories, values):
+        """Insert or replace rows (days x categories); later rows win on duplicate days."""
+        columns = self._align(categories)
+        rows = np.zeros((len(days), len(self.categories)))
+        rows[:, columns] = values
+
+        days = np.asarray(days, dtype=np.int64)
+        all_days = np.concatenate([self.days, days])
+        all_values = np.vstack([self.values, rows])
+        # Keep the last occurrence of every day, then sort by day
+        _, last = np.unique(all_days[::-1], return_index=True)
+        keep = len(all_days) - 1 - last
+        self.days = all_days[keep]
+        self.values = all_values[keep]
+
+    def slice(self, start=None, end=None):
+        lo = 0 if start is None else np.searchsorted(self.days, to_day(start), side="left")
+        hi = len(self.days) if end is None else np.searchsorted(self.days, to_day(end), side="right")
+        return self.days[lo:hi], self.values[lo:hi]
+
+    # Columnar, delta-encoded persistence
+    def save(self, path):
+        paise = np.round(self.values * 100).astype(np.int64)
+        np.savez_compressed(
+            path,
+            categories=np.array(self.categories),
+            first_day=self.days[:1],
+            day_deltas=np.diff(self.days).astype(np.int32),
+            first_values=paise[:1],
+            value_deltas=np.diff(paise, axis=0),
+        )
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            days = np.concatenate([data["first_day"], data["first_day"] + np.cumsum(data["day_deltas"])])
+            paise = np.vstack([data["first_values"], data["first_values"] + np.cumsum(data["value_deltas"], axis=0)])
+            return cls(data["categories"].tolist(), days.astype(np.int64), paise / 100)
+
+class ValuationHistoryStore:
+    def __init__(self, directory=VALUATION_HISTORY_DIR, flush_interval=FLUSH_INTERVAL):
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self.series = {}  # pan -> series loaded from disk, plus the unflushed rows
+        self.mtimes = {}  # pan -> st_mtime_ns of the file the series was loaded from
+        self.pending = {}  # pan -> ValuationSeries of rows not yet on disk
+        self.lock = threading.Lock()
+        self.flusher = None
+
+    def path(self, pan):
+        return os.path.join(self.directory, f"{pan}.npz")
+
+    def _current(self, pan):
+        """The PAN's series, reloaded when another worker has rewritten its file. Call with self.lock held."""
+        path = self.path(pan)
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except OSError:
+            mtime = None
+        series = self.series.get(pan)
+        if series is None or mtime != self.mtimes.get(pan):
+            series = ValuationSeries.load(path) if mtime is not None else ValuationSeries()
+            pending = self.pending.get(pan)
+            if pending is not None:
+                series.upsert(pending.days, pending.categories, pending.values)
+            self.series[pan] = series
+            self.mtimes[pan] = mtime
+        return series
+
+    def get(self, pan):
+        with self.lock:
+            return self._current(pan)
+
+    def upsert(self, pan, days, categories, values):
+        """Insert or replace rows in memory; they reach disk with the next flush."""
+        with self.lock:
+            self._current(pan).upsert(days, categories, values)
+            self.pending.setdefault(pan, ValuationSeries()).upsert(days, categories, values)
+            if self.flusher is None:
+                self.flusher = threading.Thread(target=self._run, name="valuation-history", daemon=True)
+                self.flusher.start()
+                atexit.register(self.flush)
+
+    def _run(self):
+        while True:
+            time.sleep(self.flush_interval)
+            self.flush()
+
+    def flush(self, pan=None):
+        """Write the unflushed rows of one PAN (or all). Returns the number of PANs written."""
+        with self.lock:
+            pans = [pan] if pan is not None else list(self.pending)
+            batches = {p: self.pending.pop(p) for p in pans if p in self.pending}
+        written = 0
+        for p, rows in batches.items():
+            try:
+                self._write(p, rows)
+                written += 1
+            except Exception as e:
+                print(f"Error writing valuation history for {p}: {e}")
+                with self.lock:  # Retried with the next flush; rows recorded since then win
+                    newer = self.pending.get(p)
+                    if newer is not None:
+                        rows.upsert(newer.days, newer.categories, newer.values)
+                    self.pending[p] = rows
+        return written
+
+    def _write(self, pan, rows):
+        """Merge rows into the file on disk under a per-PAN file lock and swap it in atomically."""
+        os.makedirs(self.directory, exist_ok=True)
+        path = self.path(pan)
+        with open(path + ".lock", "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)  # Released when the file is closed
+            series = ValuationSeries.load(path) if os.path.exists(path) else ValuationSeries()
+            series.upsert(rows.days, rows.categories, rows.values)
+            tmp = path + ".tmp.npz"
+            series.save(tmp)
+            os.replace(tmp, path)  # Readers never see a half-written file
+        with self.lock:
+            self.series.pop(pan, None)  # Reloaded from the merged file on next use
+
+store = ValuationHistoryStore()
+
+def category_totals(portfolio):
+    categories = list(portfolio["assets"])
+    totals = [portfolio["assets"][c].get("total_value", 0) or 0 for c in categories]
+    return categories, np.array([totals], dtype=float)
+
+def record_snapshot(pan, portfolio, day=None):
+    """Store a valued portfolio as the snapshot for its day (the latest valuation of a day wins)."""
+    categories, totals = category_totals(portfolio)
+    store.upsert(pan, [to_day(day or now_ist().date())], categories, totals)
+
+def backfill_values(portfolio, closes):
+    """
+    Reconstruct daily category values from price histories, assuming today's quantities
+    were held throughout. Market holdings scale their current value by price / latest
+    price of their series; fixed income holdings keep their current value.
+    Returns (days, categories, values).
+    """
+    holdings = holdings_frame(portfolio)
+    categories = list(dict.fromkeys(holdings["category"]))
+    closes = closes.ffill().bfill()
+    relative = closes / closes.iloc[-1]
+    priced = holdings["symbol"].isin(relative.columns)
+
+    # (symbols x categories) matrix of current market value, so one matmul values every day
+    exposure = (holdings[priced].pivot_table(index="symbol", columns="category", values="total_value", aggfunc="sum")
+                .reindex(columns=categories).fillna(0))
+    market = relative[exposure.index].to_numpy() @ exposure.to_numpy()
+    fixed = holdings[~priced].groupby("category")["total_value"].sum().reindex(categories).fillna(0).to_numpy()
+
+    days = np.array([to_day(d.date()) for d in closes.index], dtype=np.int64)
+    return days, categories, market + fixed
+
+def backfill(portfolios, closes=None):
+    """
+    Backfill the history of many valued portfolios ({pan: portfolio}) at once. Price
+    histories come from the risk engine's cache (about two years) unless a closes panel
+    (dates x Yahoo symbols) is given; all symbols are requested in one batch.
+    """
+    if closes is None:
+        symbols = set()
+        for portfolio in portfolios.values():
+            symbols.update(holdings_frame(portfolio)["symbol"].dropna())
+        history_cache.ensure(sorted(symbols))
+        closes = history_cache.closes
+    if closes.empty:
+        return 0
+
+    filled = 0
+    for pan, portfolio in portfolios.items():
+        days, categories, values = backfill_values(portfolio, closes)
+        # Existing recorded snapshots take precedence over reconstructed values
+        recorded = store.get(pan).days
+        new = ~np.isin(days, recorded)
+        store.upsert(pan, days[new], categories, values[new])
+        filled += int(new.sum())
+    return filled
+
+def lttb(x, y, threshold):
+    """Largest-Triangle-Three-Buckets downsampling; returns the indices of the kept points."""
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+
+    edges = np.linspace(1, n - 1, threshold - 1).astype(int)
+    selected = np.zeros(threshold, dtype=int)
+    selected[-1] = n - 1
+    a = 0
+    for i in range(threshold - 2):
+        lo, hi = edges[i], edges[i + 1]
+        # Average of the next bucket (the last point for the final bucket)
+        next_lo, next_hi = (edges[i + 1], edges[i + 2]) if i + 2 < len(edges) else (n - 1, n)
+        avg_x, avg_y = x[next_lo:next_hi].mean(), y[next_lo:next_hi].mean()
+        area = np.abs((x[a] - avg_x) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (avg_y - y[a]))
+        a = lo + int(np.argmax(area))
+        selected[i + 1] = a
+    return selected
+
+def allocation(categories, row):
+    total = row.sum()
+    return {c: round(float(v / total * 100), 2) if total > 0 else 0.0 for c, v in zip(categories, row)}
+
+def max_drawdown(totals):
+    peaks = np.maximum.accumulate(totals)
+    drawdowns = np.divide(totals, peaks, out=np.ones(len(totals)), where=peaks > 0) - 1
+    return round(float(drawdowns.min() * 100), 2)
+
+def portfolio_history(pan, start=None, end=None, max_points=DEFAULT_MAX_POINTS):
+    """Value, returns and allocation drift for a PAN over [start, end] (datetime.date or None)."""
+    series = store.get(pan)
+    days, values = series.slice(start, end)
+    if len(days) == 0:
+        return None
+
+    totals = values.sum(axis=1)
+    daily_returns = np.zeros(len(totals))
+    daily_returns[1:] = np.divide(totals[1:] - totals[:-1], totals[:-1],
+                                  out=np.zeros(len(totals) - 1), where=totals[:-1] > 0)
+
+    keep = lttb(days.astype(float), totals, max_points)
+    points = pd.DataFrame(values[keep].round(2), columns=series.categories)
+    points.insert(0, "total_value", totals[keep].round(2))
+    points.insert(0, "date", [from_day(d).isoformat() for d in days[keep]])
+    # Cumulative return from the start of the range to each point, so gaps from downsampling do not matter
+    points["cumulative_return"] = ((totals[keep] / totals[0] - 1) * 100).round(2) if totals[0] > 0 else 0.0
+
+    start_allocation = allocation(series.categories, values[0])
+    end_allocation = allocation(series.categories, values[-1])
+    return {
+        "pan": pan,
+        "start": from_day(days[0]).isoformat(),
+        "end": from_day(days[-1]).isoformat(),
+        "observations": int(len(days)),
+        "downsampled": bool(len(keep) < len(days)),
+        "points": points.to_dict(orient="records"),
+        "total_return": round(float((totals[-1] / totals[0] - 1) * 100), 2) if totals[0] > 0 else None,
+        "volatility_daily": round(float(daily_returns[1:].std() * 100), 4) if len(totals) > 2 else None,
+        "max_drawdown": max_drawdown(totals),
+        "allocation": {
+            "start": start_allocation,
+            "end": end_allocation,
+            "drift": {c: round(end_allocation[c] - start_allocation[c], 2) for c in series.categories},
+        },
+    }